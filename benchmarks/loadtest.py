@@ -0,0 +1,302 @@
+"""
+Нагрузочный прогон API: каталог, корзина, оформление заказов на "горячие" товары и платежи.
+
+    python -m benchmarks.loadtest --products 2000 --users 50 --concurrency 8 --output bench.json
+
+Перед прогоном база пересоздается и заполняется заново, поэтому результаты
+разных коммитов можно сравнивать между собой (diff JSON-отчетов).
+Для каждого сценария считаются p50/p95/p99 задержки, пропускная способность,
+количество SQL-запросов на запрос, а для оформления заказов - перепродажи и дедлоки.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from goods_app.models import Brand, Category, Product  # noqa: E402
+from orders_app.models import Order, OrderItem  # noqa: E402
+from user_app.models import User  # noqa: E402
+
+# Настоящие дедлоки и конфликты сериализации (Postgres) считаются отдельно
+# от таймаута блокировки SQLite - это разные проблемы
+DEADLOCK_ERRORS = ('deadlock', 'could not serialize')
+DATABASE_LOCKED_ERRORS = ('database is locked',)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--hot-skus', type=int, default=3, help='Сколько товаров разбирают одновременно')
+    parser.add_argument('--hot-stock', type=int, default=50, help='Остаток каждого горячего товара')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='-', help='Файл для JSON-отчета, "-" - stdout')
+    return parser.parse_args(argv)
+
+
+def reset_database():
+    database = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite' and os.path.exists(database):
+        connection.close()
+        os.remove(database)
+        call_command('migrate', verbosity=0)
+    else:
+        call_command('migrate', verbosity=0)
+        call_command('flush', interactive=False, verbosity=0)
+
+
+def seed(args, rng):
+    categories = Category.objects.bulk_create(
+        [Category(slug=f'category-{i}', name=f'Категория {i}') for i in range(20)]
+    )
+    brands = Brand.objects.bulk_create(
+        [Brand(slug=f'brand-{i}', name=f'Бренд {i}', description='') for i in range(20)]
+    )
+    Product.objects.bulk_create(
+        [
+            Product(
+                slug=f'product-{i}', name=f'Товар {i}', description=f'Описание товара {i}',
+                price=round(rng.uniform(1, 500), 2), discount_price=rng.choice([0, 5, 10, 25]),
+                quantity=rng.randint(0, 1000), category=rng.choice(categories), brand=rng.choice(brands),
+                image='Product_images/me.jpg',
+            )
+            for i in range(args.products)
+        ],
+        batch_size=1000,
+    )
+    users = User.objects.bulk_create([User(email=f'bench{i}@example.com') for i in range(args.users)])
+
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    hot_ids = product_ids[:args.hot_skus]
+    Product.objects.filter(pk__in=hot_ids).update(quantity=args.hot_stock)
+
+    orders = Order.objects.bulk_create(
+        [Order(user=user, total_price=Decimal('100.00')) for user in users for _ in range(5)]
+    )
+    return {
+        'users': list(User.objects.order_by('pk')),
+        'product_ids': product_ids,
+        'hot_ids': hot_ids,
+        'order_ids': [(order.user_id, order.pk) for order in orders],
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return round(ordered[index], 3)
+
+
+class Scenario:
+    """Гоняет make_request в пуле потоков, у каждого потока свой клиент и свое соединение с БД"""
+
+    def __init__(self, name, make_request, data, args):
+        self.name = name
+        self.make_request = make_request
+        self.data = data
+        self.args = args
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.queries = []
+        self.statuses = Counter()
+        self.deadlocks = 0
+        self.database_locked = 0
+        self.errors = 0
+
+    def client(self, index):
+        if not hasattr(self.local, 'client'):
+            self.local.client = APIClient()
+            self.local.rng = random.Random(self.args.seed + index)
+        return self.local.client, self.local.rng
+
+    def call(self, index):
+        client, rng = self.client(index)
+        started = time.perf_counter()
+        status = None
+        try:
+            with CaptureQueriesContext(connection) as context:
+                status = self.make_request(client, rng, self.data)
+        except Exception as e:
+            message = str(e).lower()
+            with self.lock:
+                if any(marker in message for marker in DEADLOCK_ERRORS):
+                    self.deadlocks += 1
+                elif any(marker in message for marker in DATABASE_LOCKED_ERRORS):
+                    self.database_locked += 1
+                else:
+                    self.errors += 1
+            return
+        finally:
+            if status is None:
+                connection.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.latencies.append(elapsed)
+            self.queries.append(len(context.captured_queries))
+            self.statuses[status] += 1
+
+    def run(self):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            list(pool.map(self.call, range(self.args.requests)))
+        duration = time.perf_counter() - started
+
+        completed = len(self.latencies)
+        return {
+            'requests': self.args.requests,
+            'completed': completed,
+            'errors': self.errors,
+            'deadlocks': self.deadlocks,
+            'database_locked': self.database_locked,
+            'statuses': {str(code): count for code, count in sorted(self.statuses.items())},
+            'duration_s': round(duration, 3),
+            'throughput_rps': round(completed / duration, 2) if duration else None,
+            'latency_ms': {
+                'p50': percentile(self.latencies, 0.50),
+                'p95': percentile(self.latencies, 0.95),
+                'p99': percentile(self.latencies, 0.99),
+                'mean': round(statistics.fmean(self.latencies), 3) if self.latencies else None,
+                'max': round(max(self.latencies), 3) if self.latencies else None,
+            },
+            'queries_per_request': {
+                'mean': round(statistics.fmean(self.queries), 2) if self.queries else None,
+                'max': max(self.queries) if self.queries else None,
+            },
+        }
+
+
+def catalog_list(client, rng, data):
+    params = rng.choice([
+        '',
+        '?ordering=price',
+        f'?category={rng.randint(1, 20)}&in_stock=true',
+        '?min_price=100&max_price=300&expand=brand,category',
+    ])
+    return client.get('/api/products/' + params, HTTP_ACCEPT='application/json').status_code
+
+
+def cart_mutation(client, rng, data):
+    client.force_authenticate(rng.choice(data['users']))
+    product_id = rng.choice(data['product_ids'])
+    if rng.random() < 0.7:
+        url, payload = '/api/cart/add/', {'product': product_id, 'quantity': rng.randint(1, 3)}
+    else:
+        url, payload = '/api/cart/remove/', {'product': product_id}
+    return client.post(url, payload, format='json', HTTP_ACCEPT='application/json').status_code
+
+
+def checkout_hot(client, rng, data):
+    client.force_authenticate(rng.choice(data['users']))
+    payload = {'items': [{'product': rng.choice(data['hot_ids']), 'quantity': 1}]}
+    return client.post('/api/order/checkout/', payload, format='json', HTTP_ACCEPT='application/json').status_code
+
+
+def payment_create(client, rng, data):
+    user_id, order_id = rng.choice(data['order_ids'])
+    payload = {
+        'transition_id': f'bench-{order_id}-{rng.getrandbits(64):x}',
+        'user': user_id,
+        'order': order_id,
+        'amount': '100.00',
+        'currency': 'USD',
+    }
+    client.force_authenticate(User(pk=user_id))
+    return client.post('/api/payment/', payload, format='json', HTTP_ACCEPT='application/json').status_code
+
+
+SCENARIOS = [
+    ('catalog_list', catalog_list),
+    ('cart_mutations', cart_mutation),
+    ('checkout_hot_skus', checkout_hot),
+    ('payment_create', payment_create),
+]
+
+
+def stock_integrity(args, data):
+    """Перепродажа: продано больше начального остатка или остаток ушел в минус"""
+    sold = (
+        OrderItem.objects.filter(product_id__in=data['hot_ids'])
+        .aggregate(total=Sum('quantity'))['total'] or 0
+    )
+    remaining = Product.objects.filter(pk__in=data['hot_ids']).aggregate(total=Sum('quantity'))['total'] or 0
+    initial = args.hot_stock * len(data['hot_ids'])
+    return {
+        'initial_stock': initial,
+        'sold': sold,
+        'remaining': remaining,
+        'oversold': max(0, sold - initial),
+        'negative_stock_products': Product.objects.filter(pk__in=data['hot_ids'], quantity__lt=0).count(),
+        'stock_mismatch': initial - sold - remaining,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    reset_database()
+    data = seed(args, rng)
+    connections.close_all()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'cache': django.conf.settings.CACHES['default']['BACKEND'],
+            'params': vars(args),
+        },
+        'scenarios': {},
+    }
+    for name, make_request in SCENARIOS:
+        report['scenarios'][name] = Scenario(name, make_request, data, args).run()
+
+    checkout_report = report['scenarios']['checkout_hot_skus']
+    report['integrity'] = stock_integrity(args, data)
+    report['integrity']['deadlocks'] = checkout_report['deadlocks']
+    report['integrity']['database_locked'] = checkout_report['database_locked']
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    return 0 if report['integrity']['oversold'] == 0 and report['integrity']['stock_mismatch'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
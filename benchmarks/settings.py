@@ -0,0 +1,55 @@
+"""
+Настройки для нагрузочных прогонов (benchmarks/loadtest.py).
+
+По умолчанию - отдельный файл SQLite во временной папке и кэш в памяти процесса.
+BENCH_DB=postgres берет сервер и учетные данные из POSTGRES_* (.env), а базу - из
+BENCH_POSTGRES_DB: прогон очищает ее целиком, поэтому база приложения не подходит.
+BENCH_REDIS_URL включает настоящий Redis вместо locmem.
+"""
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+from kdmMarket.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+if os.getenv('BENCH_DB') == 'postgres':
+    BENCH_POSTGRES_DB = os.getenv('BENCH_POSTGRES_DB')
+    if not BENCH_POSTGRES_DB or BENCH_POSTGRES_DB == os.getenv('POSTGRES_DB'):
+        raise ImproperlyConfigured('Для BENCH_DB=postgres задайте BENCH_POSTGRES_DB, отличную от POSTGRES_DB')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': BENCH_POSTGRES_DB,
+            'USER': os.getenv('POSTGRES_USER'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
+            'HOST': os.getenv('POSTGRES_HOST'),
+            'PORT': os.getenv('POSTGRES_PORT'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('BENCH_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'kdm_bench.sqlite3')),
+            # IMMEDIATE: транзакция сразу берет блокировку записи и ждет ее до timeout,
+            # а не падает с "database is locked" при попытке повысить блокировку чтения
+            'OPTIONS': {'timeout': 30, 'transaction_mode': 'IMMEDIATE'},
+        }
+    }
+
+if os.getenv('BENCH_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('BENCH_REDIS_URL'),
+            'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+        }
+    }
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+CELERY_TASK_ALWAYS_EAGER = True
@@ -0,0 +1,147 @@
+"""
+Прогон сценария входа по коду: запрос кода -> проверка кода -> фоновые задачи (письма, журнал).
+
+    BENCH_REDIS_URL=redis://localhost:6379/15 python -m benchmarks.verification_flow --signups 500
+
+Нужен настоящий Redis (коды, очередь писем и журнал лежат в нем), письма уходят
+в locmem-бэкенд. Считаются сообщения в брокер Celery на одну регистрацию,
+SQL-запросы и задержки по шагам.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+from benchmarks.loadtest import git_commit, percentile, reset_database  # noqa: E402
+
+from celery.app.task import Task  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.core import mail  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings  # noqa: E402
+from django_redis import get_redis_connection  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from user_app.models import SMSVerification  # noqa: E402
+from user_app.services.validation_code import code_key  # noqa: E402
+from user_app.tasks import drain_email_outbox, flush_verification_audit  # noqa: E402
+
+published = Counter()
+_apply_async = Task.apply_async
+
+
+def counting_apply_async(self, *args, **kwargs):
+    published[self.name] += 1
+    return _apply_async(self, *args, **kwargs)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--signups', type=int, default=200)
+    parser.add_argument('--with-rate-limit', action='store_true', help='Не отключать лимит отправки кодов')
+    parser.add_argument('--output', default='-')
+    return parser.parse_args(argv)
+
+
+def summary(values):
+    if not values:
+        return None
+    return {
+        'p50': percentile(values, 0.50), 'p95': percentile(values, 0.95), 'p99': percentile(values, 0.99),
+        'mean': round(statistics.fmean(values), 3),
+    }
+
+
+def timed(callable_):
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as context:
+        result = callable_()
+    return result, (time.perf_counter() - started) * 1000, len(context.captured_queries)
+
+
+def run(args):
+    client = APIClient()
+    steps = {name: {'latency_ms': [], 'queries': []} for name in ('request_code', 'verify_code')}
+    statuses = Counter()
+
+    started = time.perf_counter()
+    for i in range(args.signups):
+        email = f'bench{i}@example.com'
+
+        response, elapsed, queries = timed(lambda: client.post('/api/user-sign/', {'email': email}, format='json'))
+        statuses[f'request_code_{response.status_code}'] += 1
+        steps['request_code']['latency_ms'].append(elapsed)
+        steps['request_code']['queries'].append(queries)
+
+        code = get_redis_connection('default').get(code_key(email))
+        if code is None:
+            continue
+        response, elapsed, queries = timed(
+            lambda: client.post('/api/user-verify/', {'email': email, 'code': code.decode()}, format='json')
+        )
+        statuses[f'verify_code_{response.status_code}'] += 1
+        steps['verify_code']['latency_ms'].append(elapsed)
+        steps['verify_code']['queries'].append(queries)
+    flow_duration = time.perf_counter() - started
+
+    messages_before = sum(published.values())
+    (drain, drain_ms, drain_queries) = timed(drain_email_outbox)
+    (audit, audit_ms, audit_queries) = timed(flush_verification_audit)
+    background_messages = sum(published.values()) - messages_before
+
+    return {
+        'meta': {'commit': git_commit(), 'database': connection.vendor, 'params': vars(args)},
+        'signups': args.signups,
+        'throughput_signups_per_s': round(args.signups / flow_duration, 2),
+        'statuses': dict(statuses),
+        'broker_messages': {
+            'total': messages_before,
+            'per_signup': round(messages_before / args.signups, 3),
+            'by_task': dict(published),
+            'background': background_messages,
+        },
+        'steps': {
+            name: {'latency_ms': summary(data['latency_ms']),
+                   'queries_per_request': summary(data['queries'])}
+            for name, data in steps.items()
+        },
+        'background': {
+            'drain_email_outbox': {'stats': drain, 'duration_ms': round(drain_ms, 3), 'queries': drain_queries,
+                                   'emails_in_outbox_backend': len(mail.outbox)},
+            'flush_verification_audit': {'events': audit, 'duration_ms': round(audit_ms, 3),
+                                         'queries': audit_queries, 'rows': SMSVerification.objects.count()},
+        },
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if 'RedisCache' not in settings.CACHES['default']['BACKEND']:
+        sys.exit('Нужен Redis: задайте BENCH_REDIS_URL')
+
+    reset_database()
+    get_redis_connection('default').flushdb()
+    Task.apply_async = counting_apply_async
+    mail.outbox = []
+
+    overrides = {'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend'}
+    if not args.with_rate_limit:
+        overrides['VERIFICATION_CODE_RATE_LIMITS'] = []
+    with override_settings(**overrides):
+        report = run(args)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
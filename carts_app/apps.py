@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CartsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'carts_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
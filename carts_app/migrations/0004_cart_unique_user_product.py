@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_lines(apps, schema_editor):
+    Cart = apps.get_model('carts_app', 'Cart')
+    duplicates = (
+        Cart.objects.values('user_id', 'product_id')
+        .annotate(lines=Count('id'), first_id=Min('id'), total=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for row in duplicates:
+        lines = Cart.objects.filter(user_id=row['user_id'], product_id=row['product_id'])
+        lines.exclude(id=row['first_id']).delete()
+        lines.filter(id=row['first_id']).update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts_app', '0003_initial'),
+        ('goods_app', '0006_attribute_facet'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_cart_user_product'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts_app', '0004_cart_unique_user_product'),
+        ('goods_app', '0006_attribute_facet'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', '-created_at'], name='cart_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favourites',
+            index=models.Index(fields=['user', '-created_at'], name='favourites_user_created_idx'),
+        ),
+    ]
@@ -12,9 +12,24 @@ class Cart(models.Model):
     quantity = models.IntegerField(default = 1,verbose_name = "Количество")
     created_at = models.DateTimeField(auto_now_add = True)
 
+    class Meta:
+        constraints = [
+            # Одна строка на товар: повторное добавление увеличивает quantity
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_user_product'),
+        ]
+        indexes = [
+            # Корзина пользователя, новые сверху (CartView.cursor_ordering)
+            models.Index(fields=['user', '-created_at'], name='cart_user_created_idx'),
+        ]
+
 class Favourites (models.Model):
     user = models.ForeignKey(User, on_delete = models.CASCADE,verbose_name ="Фаворит Пользователя")
     session_key = models.CharField(max_length=40,verbose_name =" Ключ Сессии",blank =True,null = True)
     product =models.ForeignKey(Product, on_delete=models.CASCADE,verbose_name = "Товар/Продукт")
     created_at = models.DateTimeField(auto_now_add = True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='favourites_user_created_idx'),
+        ]
+
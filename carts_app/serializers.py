@@ -1,14 +1,42 @@
 from rest_framework import serializers
+
+from goods_app.models import Product
+from kdmMarket.expand import ExpandableSerializerMixin
 from .models import Cart
 from .models import Favourites
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'product': 'goods_app.serializers.ProductSerializer',
+    }
+
     class Meta:
         model = Cart
         fields = '__all__'
+        # Владельца задает UserScopedQuerysetMixin.scope_owner
+        read_only_fields = ['user']
+        # Повторное добавление товара - это upsert в CartView.perform_create/perform_update, а не ошибка
+        validators = []
 
 
-class FavouritesSerializer(serializers.ModelSerializer):
+class FavouritesSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'product': 'goods_app.serializers.ProductSerializer',
+    }
+
     class Meta:
         model = Favourites
         fields = '__all__'
+        read_only_fields = ['user']
+
+
+class CartItemInputSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    quantity = serializers.IntegerField(min_value=1, required=False)
+
+
+class CartSummarySerializer(serializers.Serializer):
+    items = serializers.IntegerField()
+    subtotal = serializers.FloatField()
+    discount = serializers.FloatField()
+    total = serializers.FloatField()
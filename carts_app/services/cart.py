@@ -0,0 +1,113 @@
+import logging
+import uuid
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from carts_app.models import Cart
+from goods_app.services.price_index import final_price_expression
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_TIMEOUT = 15 * 60
+SUMMARY_KEY = 'cart_{}_summary'
+# Версия сводки: любое изменение корзины или цен ее товаров ставит новую. Сводка хранится вместе с версией,
+# для которой посчитана, поэтому чтение - один get_many, а запоздалая запись пересчета не будет прочитана
+SUMMARY_VERSION_KEY = 'cart_{}_version'
+
+
+def to_cents(value):
+    return int(round(value * 100))
+
+
+def add_to_cart(user, product, quantity=1):
+    """Добавляет товар или увеличивает количество уже лежащего в корзине (upsert)"""
+    with transaction.atomic():
+        updated = Cart.objects.filter(user=user, product=product).update(quantity=F('quantity') + quantity)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    Cart.objects.create(user=user, product=product, quantity=quantity)
+            except IntegrityError:
+                # Строку успели создать параллельным запросом
+                Cart.objects.filter(user=user, product=product).update(quantity=F('quantity') + quantity)
+    transaction.on_commit(lambda: invalidate_cart_summary(user.pk))
+    return Cart.objects.get(user=user, product=product)
+
+
+def remove_from_cart(user, product, quantity=None):
+    """Уменьшает количество товара (или убирает строку целиком), возвращает сколько убрано"""
+    with transaction.atomic():
+        line = Cart.objects.select_for_update().filter(user=user, product=product).first()
+        if line is None:
+            return 0
+        if quantity is None or quantity >= line.quantity:
+            removed = line.quantity
+            line.delete()
+        else:
+            removed = quantity
+            Cart.objects.filter(pk=line.pk).update(quantity=F('quantity') - quantity)
+    transaction.on_commit(lambda: invalidate_cart_summary(user.pk))
+    return removed
+
+
+def invalidate_cart_summaries(user_ids):
+    versions = {SUMMARY_VERSION_KEY.format(user_id): uuid.uuid4().hex for user_id in set(user_ids)}
+    if not versions:
+        return
+    try:
+        cache.set_many(versions, None)
+    except Exception as e:
+        logger.warning('Не удалось сбросить сводку корзины: %s', e)
+
+
+def invalidate_cart_summary(user_id):
+    invalidate_cart_summaries([user_id])
+
+
+def get_cart_summary(user_id):
+    """
+    Количество товаров, сумма и скидка корзины. Цены берутся на момент чтения: закэшированная
+    сводка действует, пока не сменилась версия (изменение корзины или цены товара в ней).
+    """
+    version_key, summary_key = SUMMARY_VERSION_KEY.format(user_id), SUMMARY_KEY.format(user_id)
+    version = values = None
+    try:
+        cached = cache.get_many([version_key, summary_key])
+        version, values = cached.get(version_key), cached.get(summary_key)
+        if version is None:
+            # Версию вытеснили или ее еще не было - заводим новую, старая сводка с ней не совпадет
+            cache.add(version_key, uuid.uuid4().hex, None)
+            version = cache.get(version_key)
+    except Exception as e:
+        logger.warning('Кэш корзины недоступен: %s', e)
+
+    if values is None or version is None or values['version'] != version:
+        values = _summary_from_db(user_id)
+        if version is not None:
+            try:
+                cache.set(summary_key, {**values, 'version': version}, SUMMARY_TIMEOUT)
+            except Exception as e:
+                logger.warning('Не удалось сохранить сводку корзины: %s', e)
+
+    return {
+        'items': values['items'],
+        'subtotal': values['subtotal'] / 100,
+        'discount': values['discount'] / 100,
+        'total': (values['subtotal'] - values['discount']) / 100,
+    }
+
+
+def _summary_from_db(user_id):
+    totals = Cart.objects.filter(user_id=user_id).aggregate(
+        items=Sum('quantity'),
+        subtotal=Sum(F('quantity') * F('product__price')),
+        total=Sum(F('quantity') * final_price_expression('product__')),
+    )
+    subtotal = to_cents(totals['subtotal'] or 0)
+    return {
+        'items': totals['items'] or 0,
+        'subtotal': subtotal,
+        'discount': subtotal - to_cents(totals['total'] or 0),
+    }
@@ -0,0 +1,130 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django_redis import get_redis_connection
+
+from carts_app.models import Cart
+from carts_app.services.cart import invalidate_cart_summary, to_cents
+from goods_app.models import Product
+from goods_app.services.price_index import compute_final_price
+
+logger = logging.getLogger(__name__)
+
+# Корзина гостя: Redis hash {product_id: quantity} по ключу сессии
+GUEST_CART_KEY = 'guest_cart:{}'
+GUEST_CART_TIMEOUT = 7 * 24 * 60 * 60
+
+# Уменьшает количество или удаляет поле целиком, возвращает сколько убрано
+REMOVE_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if current == 0 then
+    return 0
+end
+local quantity = tonumber(ARGV[2])
+if quantity <= 0 or quantity >= current then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    return current
+end
+redis.call('HINCRBY', KEYS[1], ARGV[1], -quantity)
+return quantity
+"""
+
+
+def guest_cart_key(session_key):
+    return GUEST_CART_KEY.format(session_key)
+
+
+def add_guest_item(session_key, product_id, quantity=1):
+    key = guest_cart_key(session_key)
+    pipe = get_redis_connection('default').pipeline()
+    pipe.hincrby(key, product_id, quantity)
+    pipe.expire(key, GUEST_CART_TIMEOUT)
+    new_quantity, _ = pipe.execute()
+    return new_quantity
+
+
+def remove_guest_item(session_key, product_id, quantity=None):
+    redis = get_redis_connection('default')
+    return redis.eval(REMOVE_SCRIPT, 1, guest_cart_key(session_key), product_id, quantity or 0)
+
+
+def get_guest_cart(session_key):
+    items = get_redis_connection('default').hgetall(guest_cart_key(session_key))
+    return {int(product_id): int(quantity) for product_id, quantity in items.items()}
+
+
+def get_guest_cart_summary(session_key):
+    """Та же сводка, что и у корзины пользователя; цены читаются из БД, записи нет"""
+    items = get_guest_cart(session_key)
+    subtotal = discount = 0
+    for product in Product.objects.filter(pk__in=items).only('price', 'discount_price', 'is_on_sale'):
+        quantity = items[product.pk]
+        price = to_cents(product.price)
+        subtotal += price * quantity
+        discount += (price - to_cents(compute_final_price(product))) * quantity
+    return {
+        'items': sum(items.values()),
+        'subtotal': subtotal / 100,
+        'discount': discount / 100,
+        'total': (subtotal - discount) / 100,
+    }
+
+
+def release_guest_items(session_key, items):
+    """Убирает из корзины гостя перенесенные количества; добавленное после чтения остается"""
+    key = guest_cart_key(session_key)
+    pipe = get_redis_connection('default').pipeline()
+    for product_id, quantity in items.items():
+        pipe.eval(REMOVE_SCRIPT, 1, key, product_id, quantity)
+    pipe.execute()
+
+
+def _release_after_commit(session_key, items):
+    try:
+        release_guest_items(session_key, items)
+    except Exception as e:
+        logger.warning('Не удалось очистить корзину гостя %s: %s', session_key, e)
+
+
+def merge_guest_cart(session_key, user):
+    """
+    Переносит корзину гостя в корзину пользователя при входе, возвращает число позиций.
+    Корзина гостя очищается только после коммита: при откате она остается в Redis.
+    """
+    if not session_key:
+        return 0
+    try:
+        items = get_guest_cart(session_key)
+    except Exception as e:
+        logger.warning('Не удалось прочитать корзину гостя %s: %s', session_key, e)
+        return 0
+    if not items:
+        return 0
+
+    with transaction.atomic():
+        pending = dict(items)
+        existing = list(Cart.objects.select_for_update().filter(user=user, product_id__in=pending))
+        for line in existing:
+            line.quantity += pending.pop(line.product_id)
+        Cart.objects.bulk_update(existing, ['quantity'])
+
+        product_ids = list(Product.objects.filter(pk__in=pending).values_list('pk', flat=True))
+        try:
+            with transaction.atomic():
+                Cart.objects.bulk_create([
+                    Cart(user=user, product_id=product_id, quantity=pending[product_id]) for product_id in product_ids
+                ])
+        except IntegrityError:
+            # Строку успели создать параллельным add_to_cart - добавляем к ней по одной
+            for product_id in product_ids:
+                updated = Cart.objects.filter(user=user, product_id=product_id).update(
+                    quantity=F('quantity') + pending[product_id]
+                )
+                if not updated:
+                    Cart.objects.create(user=user, product_id=product_id, quantity=pending[product_id])
+        merged = len(existing) + len(product_ids)
+
+        transaction.on_commit(lambda: _release_after_commit(session_key, items))
+        transaction.on_commit(lambda: invalidate_cart_summary(user.pk))
+    return merged
@@ -0,0 +1,13 @@
+from django.dispatch import receiver
+
+from carts_app.models import Cart
+from carts_app.services.cart import invalidate_cart_summaries
+from goods_app.services.price_index import final_prices_changed
+
+
+@receiver(final_prices_changed)
+def invalidate_summaries_with_products(sender, product_ids, **kwargs):
+    # Сводка корзины хранит суммы по ценам на момент расчета
+    invalidate_cart_summaries(
+        Cart.objects.filter(product_id__in=product_ids).values_list('user_id', flat=True).distinct()
+    )
@@ -1,3 +1,221 @@
-from django.test import TestCase
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+
+from carts_app.models import Cart
+from carts_app.services.cart import SUMMARY_KEY, add_to_cart, get_cart_summary
+from carts_app.services.guest_cart import add_guest_item, get_guest_cart, merge_guest_cart
+from goods_app.models import Product, Category, Brand
+from kdmMarket.testing import FAKE_REDIS_CACHES, LOCMEM_CACHES, fakeredis
+from user_app.models import User
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CartScopingTests(TestCase):
+    """В корзину пишет только ее владелец, анонимный клиент - только в корзину гостя"""
+
+    def setUp(self):
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.product = Product.objects.create(
+            name='Товар', description='', price=10, category=category, brand=brand, image='a.jpg',
+        )
+        self.alice = User.objects.create_user(email='alice@example.com')
+        self.bob = User.objects.create_user(email='bob@example.com')
+
+    def test_anonymous_cannot_write_into_user_cart(self):
+        response = APIClient().post('/api/cart/', {'user': self.alice.pk, 'product': self.product.pk}, format='json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_create_uses_current_user(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+
+        response = client.post('/api/cart/', {'product': self.product.pk}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['user'], self.bob.pk)
+        self.assertEqual(Cart.objects.get().user, self.bob)
+
+    def test_user_in_payload_is_ignored(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+
+        response = client.post('/api/cart/', {'user': self.alice.pk, 'product': self.product.pk}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Cart.objects.get().user, self.bob)
+
+    def test_staff_update_keeps_owner(self):
+        line = Cart.objects.create(user=self.alice, product=self.product)
+        staff = User.objects.create_user(email='staff@example.com')
+        staff.is_staff = True
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        response = client.patch(f'/api/cart/{line.pk}/', {'quantity': 3}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        line.refresh_from_db()
+        self.assertEqual((line.user, line.quantity), (self.alice, 3))
+
+    def test_foreign_cart_line_is_not_found(self):
+        line = Cart.objects.create(user=self.alice, product=self.product)
+        client = APIClient()
+        client.force_authenticate(self.bob)
+
+        self.assertEqual(client.patch(f'/api/cart/{line.pk}/', {'quantity': 5}, format='json').status_code, 404)
+        self.assertEqual(client.delete(f'/api/cart/{line.pk}/').status_code, 404)
+        line.refresh_from_db()
+        self.assertEqual(line.quantity, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CartUpdateTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.first, self.second = [
+            Product.objects.create(name=f'Товар {i}', description='', price=10, category=category, brand=brand,
+                                   image='a.jpg')
+            for i in range(2)
+        ]
+        self.user = User.objects.create_user(email='buyer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_patch_to_product_already_in_cart_merges_lines(self):
+        Cart.objects.create(user=self.user, product=self.first, quantity=2)
+        line = Cart.objects.create(user=self.user, product=self.second, quantity=3)
+
+        response = self.client.patch(f'/api/cart/{line.pk}/', {'product': self.first.pk}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Cart.objects.values_list('product', 'quantity')), [(self.first.pk, 5)])
+        self.assertEqual(response.json()['quantity'], 5)
+
+    def test_summary_follows_update(self):
+        line = Cart.objects.create(user=self.user, product=self.first, quantity=1)
+        self.assertEqual(self.client.get('/api/cart/summary/').json()['items'], 1)
+
+        self.client.patch(f'/api/cart/{line.pk}/', {'quantity': 4}, format='json')
+
+        self.assertEqual(self.client.get('/api/cart/summary/').json()['items'], 4)
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES)
+class CartSummaryTests(TestCase):
+    """Сводка корзины читается из кэша одним запросом и пересчитывается при смене цен"""
+
+    def setUp(self):
+        get_redis_connection('default').flushdb()
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.product = Product.objects.create(
+            name='Товар', description='', price=10, category=category, brand=brand, image='a.jpg',
+        )
+        self.user = User.objects.create_user(email='buyer@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            add_to_cart(self.user, self.product, 2)
+
+    def test_cached_summary_is_single_cache_read(self):
+        get_cart_summary(self.user.pk)
+
+        with patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                patch.object(cache, 'get', wraps=cache.get) as get, self.assertNumQueries(0):
+            summary = get_cart_summary(self.user.pk)
+
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(get.call_count, 0)
+        self.assertEqual(summary['total'], 20)
+
+    def test_price_change_invalidates_summary(self):
+        get_cart_summary(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.is_on_sale = True
+            self.product.discount_price = 50
+            self.product.save()
+
+        summary = get_cart_summary(self.user.pk)
+        self.assertEqual((summary['subtotal'], summary['discount'], summary['total']), (20, 10, 10))
+
+    def test_bulk_price_update_invalidates_summary(self):
+        get_cart_summary(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(price=15)
+
+        self.assertEqual(get_cart_summary(self.user.pk)['total'], 30)
+
+    def test_late_recompute_is_not_read(self):
+        summary_key = SUMMARY_KEY.format(self.user.pk)
+        get_cart_summary(self.user.pk)
+        stale = cache.get(summary_key)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            add_to_cart(self.user, self.product, 1)
+        # Пересчет, начатый до изменения корзины, записался после него
+        cache.set(summary_key, stale)
+
+        self.assertEqual(get_cart_summary(self.user.pk)['items'], 3)
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES)
+class GuestCartMergeTests(TestCase):
+    """Перенос корзины гостя при входе"""
+
+    def setUp(self):
+        get_redis_connection('default').flushdb()
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.first, self.second = [
+            Product.objects.create(name=f'Товар {i}', description='', price=10, category=category, brand=brand,
+                                   image='a.jpg')
+            for i in range(2)
+        ]
+        self.user = User.objects.create_user(email='buyer@example.com')
+
+    def test_merge_adds_to_existing_lines_and_clears_guest_cart(self):
+        Cart.objects.create(user=self.user, product=self.first, quantity=2)
+        add_guest_item('session', self.first.pk, 3)
+        add_guest_item('session', self.second.pk, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            merged = merge_guest_cart('session', self.user)
+
+        self.assertEqual(merged, 2)
+        self.assertEqual(
+            dict(Cart.objects.filter(user=self.user).values_list('product', 'quantity')),
+            {self.first.pk: 5, self.second.pk: 1},
+        )
+        self.assertEqual(get_guest_cart('session'), {})
+
+    def test_guest_cart_kept_until_commit(self):
+        add_guest_item('session', self.first.pk, 2)
+
+        with self.captureOnCommitCallbacks(execute=False):
+            merge_guest_cart('session', self.user)
+
+        self.assertEqual(get_guest_cart('session'), {self.first.pk: 2})
+
+    def test_items_added_during_merge_are_kept(self):
+        add_guest_item('session', self.first.pk, 2)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            merge_guest_cart('session', self.user)
+        add_guest_item('session', self.first.pk, 1)
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(get_guest_cart('session'), {self.first.pk: 1})
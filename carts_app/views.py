@@ -1,9 +1,17 @@
+from django.db import IntegrityError, transaction
 from django.shortcuts import render
 from drf_spectacular.utils import OpenApiResponse, OpenApiExample, extend_schema, OpenApiParameter, extend_schema_view
-from rest_framework import viewsets
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
 
 from carts_app.models import Cart, Favourites
-from carts_app.serializers import CartSerializer, FavouritesSerializer
+from carts_app.serializers import CartSerializer, FavouritesSerializer, CartItemInputSerializer, CartSummarySerializer
+from carts_app.services.cart import add_to_cart, remove_from_cart, get_cart_summary, invalidate_cart_summary
+from carts_app.services.guest_cart import add_guest_item, remove_guest_item, get_guest_cart_summary
+from kdmMarket.expand import ExpandQuerysetMixin
+from kdmMarket.scoping import UserScopedQuerysetMixin
 
 #SWAGGER-> CartView
 
@@ -68,10 +76,109 @@ from carts_app.serializers import CartSerializer, FavouritesSerializer
         }
     )
 )
-class CartView(viewsets.ModelViewSet):
+class CartView(UserScopedQuerysetMixin, ExpandQuerysetMixin, viewsets.ModelViewSet):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     filterset_fields = ['id', 'user']
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = '-created_at'
+
+    def perform_create(self, serializer):
+        self.scope_owner(serializer)
+        data = serializer.validated_data
+        serializer.instance = add_to_cart(data['user'], data['product'], data.get('quantity', 1))
+
+    def perform_update(self, serializer):
+        self.scope_owner(serializer)
+        line_id = serializer.instance.pk
+        try:
+            with transaction.atomic():
+                instance = serializer.save()
+        except IntegrityError:
+            # Товар уже лежит в корзине: переносим количество в его строку, эту удаляем
+            data = serializer.validated_data
+            with transaction.atomic():
+                line = Cart.objects.select_for_update().get(pk=line_id)
+                line.delete()
+                instance = add_to_cart(data.get('user', line.user), data['product'],
+                                       data.get('quantity', line.quantity))
+            serializer.instance = instance
+        invalidate_cart_summary(instance.user_id)
+
+    def perform_destroy(self, instance):
+        remove_from_cart(instance.user, instance.product)
+
+    def get_session_key(self, request):
+        # Для гостя корзина живет в Redis по ключу сессии, сессию создаем при первом обращении
+        if not request.session.session_key:
+            request.session.save()
+        return request.session.session_key
+
+    @extend_schema(
+        summary='Добавить товар в корзину',
+        description='Добавляет товар в корзину или увеличивает его количество. '
+                    'Корзина гостя хранится в Redis и переносится в корзину пользователя при входе.',
+        request=CartItemInputSerializer,
+        responses={200: CartSerializer},
+    )
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def add(self, request):
+        serializer = CartItemInputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = serializer.validated_data['product']
+        quantity = serializer.validated_data.get('quantity', 1)
+
+        if not request.user.is_authenticated:
+            try:
+                new_quantity = add_guest_item(self.get_session_key(request), product.pk, quantity)
+            except Exception:
+                return Response({'error': 'Корзина временно недоступна'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            return Response({'product': product.pk, 'quantity': new_quantity})
+
+        line = add_to_cart(request.user, product, quantity)
+        return Response(CartSerializer(line, context=self.get_serializer_context()).data)
+
+    @extend_schema(
+        summary='Убрать товар из корзины',
+        description='Уменьшает количество товара на quantity, без quantity убирает товар целиком.',
+        request=CartItemInputSerializer,
+        responses={200: CartSummarySerializer},
+    )
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def remove(self, request):
+        serializer = CartItemInputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = serializer.validated_data['product']
+        quantity = serializer.validated_data.get('quantity')
+
+        if not request.user.is_authenticated:
+            session_key = self.get_session_key(request)
+            try:
+                removed = remove_guest_item(session_key, product.pk, quantity)
+                summary = get_guest_cart_summary(session_key)
+            except Exception:
+                return Response({'error': 'Корзина временно недоступна'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        else:
+            removed = remove_from_cart(request.user, product, quantity)
+            summary = get_cart_summary(request.user.pk)
+
+        if not removed:
+            return Response({'error': 'Товара нет в корзине'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(summary)
+
+    @extend_schema(
+        summary='Сводка корзины',
+        description='Количество товаров, сумма, скидка и итог корзины текущего пользователя или гостя.',
+        responses={200: CartSummarySerializer},
+    )
+    @action(detail=False, methods=['get'], pagination_class=None, filter_backends=[], permission_classes=[AllowAny])
+    def summary(self, request):
+        if not request.user.is_authenticated:
+            try:
+                return Response(get_guest_cart_summary(self.get_session_key(request)))
+            except Exception:
+                return Response({'error': 'Корзина временно недоступна'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(get_cart_summary(request.user.pk))
 
 #SWAGGER->FavouritesView
 
@@ -130,8 +237,10 @@ class CartView(viewsets.ModelViewSet):
         }
     )
 )
-class FavouritesView(viewsets.ModelViewSet):
+class FavouritesView(UserScopedQuerysetMixin, ExpandQuerysetMixin, viewsets.ModelViewSet):
     queryset = Favourites.objects.all()
     serializer_class = FavouritesSerializer
     filterset_fields = ['id', 'user', 'product']
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = '-created_at'
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GoodsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'goods_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
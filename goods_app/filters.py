@@ -1,5 +1,53 @@
 import django_filters
-from goods_app.models import ProductAttribute
+from rest_framework.exceptions import ValidationError
+
+from goods_app.models import Product, ProductAttribute
+from goods_app.services.facets import filter_by_attributes, parse_attribute_filters
+from goods_app.services.price_index import final_price_expression
+
+
+class AttributeValuesFilter(django_filters.BaseCSVFilter, django_filters.CharFilter):
+    pass
+
+
+class ProductFilter(django_filters.FilterSet):
+    category = django_filters.NumberFilter(field_name='category_id')
+    brand = django_filters.NumberFilter(field_name='brand_id')
+    category_slug = django_filters.CharFilter(field_name='category__slug')
+    brand_slug = django_filters.CharFilter(field_name='brand__slug')
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    min_final_price = django_filters.NumberFilter(method='filter_final_price')
+    max_final_price = django_filters.NumberFilter(method='filter_final_price')
+    is_on_sale = django_filters.BooleanFilter(field_name='is_on_sale')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+    attr = AttributeValuesFilter(method='filter_attributes')
+
+    class Meta:
+        model = Product
+        fields = ['category', 'brand', 'category_slug', 'brand_slug', 'is_on_sale']
+
+    def filter_final_price(self, queryset, name, value):
+        queryset = queryset.alias(computed_final_price=final_price_expression())
+        if name == 'min_final_price':
+            # Цена со скидкой не больше обычной цены, поэтому условие по price
+            # сужает выборку индексом до вычисления выражения
+            return queryset.filter(price__gte=value, computed_final_price__gte=value)
+        return queryset.filter(computed_final_price__lte=value)
+
+    def filter_in_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(quantity__gt=0)
+        return queryset.filter(quantity__lte=0)
+
+    def filter_attributes(self, queryset, name, value):
+        # ?attr=1:red,2:42 - пересечение posting-листов фасетов вместо JOIN по ProductAttribute
+        try:
+            attribute_filters = parse_attribute_filters(value)
+        except ValueError as e:
+            raise ValidationError({'attr': str(e)})
+        return filter_by_attributes(queryset, attribute_filters)
+
 
 class ProductAttributeFilter(django_filters.FilterSet):
     product = django_filters.NumberFilter(field_name='product__id')
@@ -0,0 +1,77 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from kdmMarket.images import IMAGE_FIELDS, render_variants, store_variants
+
+
+def read_image(field_file):
+    with field_file.open('rb') as f:
+        return f.read()
+
+
+class Command(BaseCommand):
+    help = 'Нарезает превью для уже загруженных изображений (можно продолжить с чекпоинта)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='*', default=list(IMAGE_FIELDS), help='Например goods_app.Product')
+        parser.add_argument('--chunk-size', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--checkpoint', default='image_variants_checkpoint.json')
+        parser.add_argument('--resume', action='store_true', help='Продолжить с последнего чекпоинта')
+        parser.add_argument('--force', action='store_true', help='Пересоздать превью и там, где они уже есть')
+
+    def handle(self, *args, **options):
+        checkpoint = {}
+        if options['resume'] and os.path.exists(options['checkpoint']):
+            with open(options['checkpoint'], encoding='utf-8') as f:
+                checkpoint = json.load(f)
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for label in options['models']:
+                model = apps.get_model(label)
+                for image_field, variants_field in IMAGE_FIELDS[label]:
+                    key = f'{label}.{image_field}'
+                    done, failed = self.backfill(pool, model, image_field, variants_field, key, checkpoint, options)
+                    self.stdout.write(self.style.SUCCESS(f'{key}: готово {done}, ошибок {failed}'))
+
+    def backfill(self, pool, model, image_field, variants_field, key, checkpoint, options):
+        queryset = model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+        if not options['force']:
+            queryset = queryset.filter(**{variants_field: {}})
+        queryset = queryset.order_by('pk')
+
+        done = failed = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=checkpoint.get(key, 0))[:options['chunk_size']])
+            if not chunk:
+                return done, failed
+
+            sources = {}
+            for instance in chunk:
+                try:
+                    sources[instance.pk] = read_image(getattr(instance, image_field))
+                except OSError as e:
+                    self.stderr.write(f'{key}#{instance.pk}: не удалось прочитать файл: {e}')
+            futures = {pk: pool.submit(render_variants, data) for pk, data in sources.items()}
+
+            for instance in chunk:
+                future = futures.get(instance.pk)
+                if future is None:
+                    failed += 1
+                    continue
+                try:
+                    store_variants(instance, image_field, variants_field, future.result())
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{key}#{instance.pk}: {e}')
+
+            checkpoint[key] = chunk[-1].pk
+            tmp_path = f"{options['checkpoint']}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint, f)
+            os.replace(tmp_path, options['checkpoint'])
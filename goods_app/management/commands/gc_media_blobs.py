@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from goods_app.services.media_gc import collect_garbage, recount_blobs
+
+
+class Command(BaseCommand):
+    help = 'Удаляет blob-файлы медиа, на которые не осталось ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24, help='Не трогать blob\'ы моложе этого срока')
+        parser.add_argument('--recount', action='store_true', help='Сначала пересчитать ссылки по всем ImageField')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            changed = recount_blobs(dry_run=options['dry_run'])
+            self.stdout.write(f'Исправлено счетчиков ссылок: {changed}')
+        deleted, freed = collect_garbage(timedelta(hours=options['grace_hours']), dry_run=options['dry_run'])
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} blob\'ов: {deleted}, {freed / 1024 / 1024:.1f} МБ'))
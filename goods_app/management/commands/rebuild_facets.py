@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from goods_app.services.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает posting-листы фасетов из ProductAttribute'
+
+    def handle(self, *args, **options):
+        total = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f'Готово, фасетов: {total}'))
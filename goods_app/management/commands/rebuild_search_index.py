@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from goods_app.models import Product
+from goods_app.services.search import reindex_queryset
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает поисковый индекс товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = reindex_queryset(Product.objects.all(), chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Готово, проиндексировано товаров: {total}'))
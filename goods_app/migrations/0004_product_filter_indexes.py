@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods_app', '0003_alter_brand_logo_alter_category_image'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attribute',
+            name='type_attribute',
+            field=models.CharField(max_length=100, verbose_name='Тип Атрибута'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='discount_price',
+            field=models.FloatField(default=0.0, verbose_name='Скидка (%)'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='is_on_sale',
+            field=models.BooleanField(default=True, verbose_name='На продаже'),
+        ),
+        migrations.AlterField(
+            model_name='productreview',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='Product_Review_images/', verbose_name='Изображение продукта'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_on_sale', 'price'], name='product_sale_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_on_sale', 'price'], name='product_cat_sale_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', 'is_on_sale', 'price'], name='product_brand_sale_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['category', 'price'], name='product_in_stock_price_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# DDL и заполнение индекса записаны здесь, а не берутся из goods_app.services.search:
+# правки сервиса не должны менять то, что делает уже примененная миграция.
+# Документ собирается так же, как build_document: описание, бренд, категория, значения атрибутов.
+SQLITE_FORWARD = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS goods_app_product_fts '
+    'USING fts5(name, document, tokenize="unicode61 remove_diacritics 2")',
+    """
+    INSERT INTO goods_app_productsearchdocument (product_id, name, document)
+    SELECT p.id, p.name, RTRIM(
+        COALESCE(NULLIF(p.description, '') || ' ', '')
+        || COALESCE(NULLIF(b.name, '') || ' ', '')
+        || COALESCE(NULLIF(c.name, '') || ' ', '')
+        || COALESCE((SELECT group_concat(a.value, ' ') FROM goods_app_productattribute a
+                     WHERE a.product_id = p.id AND a.value <> ''), ''),
+        ' ')
+    FROM goods_app_product p
+    JOIN goods_app_brand b ON b.id = p.brand_id
+    JOIN goods_app_category c ON c.id = p.category_id
+    """,
+    'INSERT INTO goods_app_product_fts (rowid, name, document) '
+    'SELECT product_id, name, document FROM goods_app_productsearchdocument',
+]
+SQLITE_REVERSE = ['DROP TABLE IF EXISTS goods_app_product_fts']
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', document), 'B')"
+)
+POSTGRES_FORWARD = [
+    f'CREATE INDEX IF NOT EXISTS goods_search_document_gin ON goods_app_productsearchdocument '
+    f'USING GIN (({POSTGRES_VECTOR}))',
+    "CREATE INDEX IF NOT EXISTS goods_search_name_gin ON goods_app_productsearchdocument "
+    "USING GIN ((to_tsvector('simple', name)))",
+    """
+    INSERT INTO goods_app_productsearchdocument (product_id, name, document)
+    SELECT p.id, p.name, concat_ws(
+        ' ', NULLIF(p.description, ''), NULLIF(b.name, ''), NULLIF(c.name, ''),
+        (SELECT string_agg(a.value, ' ' ORDER BY a.id) FROM goods_app_productattribute a
+         WHERE a.product_id = p.id AND a.value <> ''))
+    FROM goods_app_product p
+    JOIN goods_app_brand b ON b.id = p.brand_id
+    JOIN goods_app_category c ON c.id = p.category_id
+    """,
+]
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS goods_search_document_gin',
+    'DROP INDEX IF EXISTS goods_search_name_gin',
+]
+
+# Для остальных СУБД индекса нет, документы заполняет команда rebuild_search_index
+STATEMENTS = {
+    'sqlite': (SQLITE_FORWARD, SQLITE_REVERSE),
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_REVERSE),
+}
+
+
+def create_search_index(apps, schema_editor):
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ([], []))[0]:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ([], []))[1]:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods_app', '0004_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='goods_app.product')),
+                ('name', models.CharField(max_length=25, verbose_name='Название')),
+                ('document', models.TextField(verbose_name='Текст для поиска')),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
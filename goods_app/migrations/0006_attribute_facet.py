@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods_app', '0005_product_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributeFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=100, verbose_name='Значение')),
+                ('product_ids', models.BinaryField(verbose_name='Id товаров')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество товаров')),
+                ('attribute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='goods_app.attribute')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('attribute', 'value'), name='unique_attribute_facet')],
+            },
+        ),
+    ]
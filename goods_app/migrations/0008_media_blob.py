@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:17
+
+import kdmMarket.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods_app', '0007_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='Размер')),
+                ('refcount', models.IntegerField(default=0, verbose_name='Количество ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=kdmMarket.storage.get_content_storage, upload_to='Brand_logo/', verbose_name='Лого Бренда'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=kdmMarket.storage.get_content_storage, upload_to='Category_images/', verbose_name='Изображение категории'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(storage=kdmMarket.storage.get_content_storage, upload_to='Product_images/', verbose_name='Изображение категории'),
+        ),
+        migrations.AlterField(
+            model_name='productreview',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=kdmMarket.storage.get_content_storage, upload_to='Product_Review_images/', verbose_name='Изображение продукта'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods_app', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productattribute',
+            index=models.Index(fields=['attribute', 'value', 'product'], name='product_attr_value_idx'),
+        ),
+    ]
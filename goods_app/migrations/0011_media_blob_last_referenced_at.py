@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods_app', '0010_product_attribute_value_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='last_referenced_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последнее обращение'),
+        ),
+    ]
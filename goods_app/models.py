@@ -1,15 +1,25 @@
-from django.core.cache import cache
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.auth import get_user_model
 
+from kdmMarket.conditional import bump_versions_on_commit
+from kdmMarket.response_cache import purge_tags_on_commit
+from kdmMarket.storage import get_content_storage
+
+from .services.catalog_cache import product_cache_tags, PRODUCT_LIST_FIELDS
+from .services.price_index import compute_final_price, get_final_prices, invalidate_final_prices_on_commit, PRICE_FIELDS
+from .services.search import index_products, SEARCH_FIELDS
+
 User = get_user_model()
 
 
 class Category(models.Model):
     slug = models.SlugField(max_length=25, verbose_name="url")
     name = models.CharField(max_length=25, verbose_name="Название")
-    image = models.ImageField(upload_to="Category_images/", null=True, blank=True, verbose_name="Изображение категории")
+    image = models.ImageField(upload_to="Category_images/", storage=get_content_storage, null=True, blank=True, verbose_name="Изображение категории")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Превью изображения")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     def __str__(self):
         return self.name
@@ -18,13 +28,71 @@ class Category(models.Model):
 class Brand(models.Model):
     slug = models.SlugField(max_length=25, verbose_name="url")
     name = models.CharField(max_length=25, verbose_name="Название")
-    logo = models.ImageField(upload_to="Brand_logo/", null=True, blank=True, verbose_name="Лого Бренда")
+    logo = models.ImageField(upload_to="Brand_logo/", storage=get_content_storage, null=True, blank=True, verbose_name="Лого Бренда")
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Превью логотипа")
     description = models.TextField(verbose_name="Описание")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    Массовые update()/bulk_update() не вызывают сигналы save и не трогают auto_now,
+    поэтому updated_at, сброс кэша цен и ответов каталога, версии для ETag
+    и переиндексацию поиска делаем здесь.
+    """
+
+    def update(self, *, touched=None, **kwargs):
+        """
+        touched - затронутые строки, если вызывающий их уже знает (например, заблокировал select_for_update):
+        список pk, а при изменении quantity - {pk: (остаток до, остаток после)}. Тогда лишних SELECT нет.
+        """
+        kwargs.setdefault('updated_at', timezone.now())
+        stock_before = None
+        if touched is None and 'quantity' in kwargs:
+            stock_before = dict(self.values_list('pk', 'quantity'))
+        elif touched is None:
+            touched = list(self.values_list('pk', flat=True))
+        product_ids = list(touched if stock_before is None else stock_before)
+        rows = super().update(**kwargs)
+        if not rows:
+            return rows
+        lists = not PRODUCT_LIST_FIELDS.isdisjoint(kwargs)
+        if not lists and 'quantity' in kwargs:
+            if stock_before is not None:
+                touched = self._stock_after(stock_before)
+            lists = any((before > 0) != (after > 0) for before, after in touched.values())
+        self._after_update(product_ids, kwargs, lists)
+        return rows
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        lists = not PRODUCT_LIST_FIELDS.isdisjoint(fields) or 'quantity' in fields
+        self._after_update([obj.pk for obj in objs], fields, lists)
+        return rows
+
+    def _stock_after(self, stock_before):
+        # Списание остатка (checkout) не сбрасывает весь каталог: списки ?in_stock= меняются,
+        # только если товар закончился или снова появился
+        stock_after = dict(
+            self.model._base_manager.filter(pk__in=list(stock_before)).values_list('pk', 'quantity')
+        )
+        return {pk: (quantity, stock_after.get(pk, quantity)) for pk, quantity in stock_before.items()}
+
+    def _after_update(self, product_ids, fields, lists):
+        if not product_ids:
+            return
+        purge_tags_on_commit(product_cache_tags(product_ids, lists=lists))
+        # Версия списка для ETag меняется всегда: на странице списка виден и остаток товара
+        bump_versions_on_commit(product_cache_tags(product_ids))
+        if not PRICE_FIELDS.isdisjoint(fields):
+            invalidate_final_prices_on_commit(product_ids)
+        if not SEARCH_FIELDS.isdisjoint(fields):
+            index_products(product_ids)
+
+
 class Product(models.Model):
     slug = models.SlugField(max_length=25, verbose_name="url")
     name = models.CharField(max_length=25, verbose_name="Название")
@@ -35,21 +103,31 @@ class Product(models.Model):
     price = models.FloatField(default=0.0, verbose_name="Цена")
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to="Product_images/", verbose_name="Изображение категории")
+    image = models.ImageField(upload_to="Product_images/", storage=get_content_storage, verbose_name="Изображение категории")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Превью изображения")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Индексы под типовые комбинации фильтров ProductFilter
+            models.Index(fields=['is_on_sale', 'price'], name='product_sale_price_idx'),
+            models.Index(fields=['category', 'is_on_sale', 'price'], name='product_cat_sale_price_idx'),
+            models.Index(fields=['brand', 'is_on_sale', 'price'], name='product_brand_sale_price_idx'),
+            models.Index(
+                fields=['category', 'price'], condition=models.Q(quantity__gt=0),
+                name='product_in_stock_price_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
     def final_price(self):
-        cache_k = f'product_{self.id}_final_price'
-        price = cache.get(cache_k)
-
-        if price is None:
-            discount = self.discount_price / 100
-            price = round(self.price * (1 - discount), 2) if self.is_on_sale else self.price
-            cache.set(cache_k, price, 60 * 60)
-
-        return price
+        if self.pk is None:
+            return compute_final_price(self)
+        return get_final_prices([self])[self.pk]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -57,11 +135,41 @@ class Product(models.Model):
         super().save(*args, **kwargs)
 
 
+class ProductSearchDocument(models.Model):
+    """
+    Денормализованный текст товара для полнотекстового поиска.
+    Поверх него строится индекс (FTS5 в SQLite, GIN по tsvector в Postgres).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.CharField(max_length=25, verbose_name="Название")
+    document = models.TextField(verbose_name="Текст для поиска")
+
+    def __str__(self):
+        return self.name
+
+
+class MediaBlob(models.Model):
+    """
+    Файл в контентно-адресуемом хранилище (kdmMarket.storage) и число ссылок на него
+    из ImageField и превью. Blob'ы без ссылок удаляет gc_media_blobs.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name="Путь")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Размер")
+    refcount = models.IntegerField(default=0, verbose_name="Количество ссылок")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Последняя загрузка того же содержимого или изменение ссылок: от нее gc_media_blobs отсчитывает grace
+    last_referenced_at = models.DateTimeField(default=timezone.now, verbose_name="Последнее обращение")
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+
 class ProductReview(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     comment = models.CharField(max_length=150, verbose_name="Комментарии")
-    image = models.ImageField(upload_to="Product_Review_images/", null=True, blank=True, verbose_name="Изображение продукта")
+    image = models.ImageField(upload_to="Product_Review_images/", storage=get_content_storage, null=True, blank=True, verbose_name="Изображение продукта")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Превью изображения")
 
     def __str__(self):
         return f"{self.user.username} — {self.product.name}"
@@ -80,5 +188,30 @@ class ProductAttribute(models.Model):
     attribute = models.ForeignKey(Attribute, on_delete=models.CASCADE)
     value = models.CharField(max_length=100, verbose_name="Значение продукта")
 
+    class Meta:
+        indexes = [
+            # Фильтр ?attr= и подсчет фасетов: подзапрос по (атрибут, значение) отдает id товаров из индекса
+            models.Index(fields=['attribute', 'value', 'product'], name='product_attr_value_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} — {self.attribute.name}: {self.value}"
+
+
+class AttributeFacet(models.Model):
+    """
+    Posting-лист фасета: отсортированный массив id товаров для пары (атрибут, значение).
+    Поддерживается сигналами ProductAttribute, полная пересборка - rebuild_facets.
+    """
+    attribute = models.ForeignKey(Attribute, on_delete=models.CASCADE)
+    value = models.CharField(max_length=100, verbose_name="Значение")
+    product_ids = models.BinaryField(verbose_name="Id товаров")
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество товаров")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['attribute', 'value'], name='unique_attribute_facet'),
+        ]
+
+    def __str__(self):
+        return f"{self.attribute_id}: {self.value} ({self.count})"
@@ -1,41 +1,83 @@
 from rest_framework import serializers
+
+from kdmMarket.expand import ExpandableSerializerMixin
+from kdmMarket.images import ImageSrcsetField
 from .models import Product
 from .models import Brand
 from .models import Category
 from .models import ProductReview
 from .models import Attribute
 from .models import ProductAttribute
+from .services.price_index import compute_final_price, get_final_prices
+
+
+
+class ProductListSerializer(serializers.ListSerializer):
+    """Достает итоговые цены всей страницы одним запросом к кэшу"""
 
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, 'all') else data)
+        self.context['final_prices'] = get_final_prices(products)
+        return super().to_representation(products)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    final_price = serializers.SerializerMethodField()
+    image_srcset = ImageSrcsetField(source='image_variants')
+    expandable_fields = {
+        'brand': 'goods_app.serializers.BrandSerializer',
+        'category': 'goods_app.serializers.CategorySerializer',
+    }
+
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['image_variants']
+        list_serializer_class = ProductListSerializer
+
+    def get_final_price(self, obj):
+        prices = self.context.get('final_prices', {})
+        if obj.pk in prices:
+            return prices[obj.pk]
+        # Вложенный товар (?expand=product) - поля уже загружены, считаем без запросов
+        return compute_final_price(obj)
 
 
 class BrandSerializer(serializers.ModelSerializer):
+    logo_srcset = ImageSrcsetField(image_field='logo', source='logo_variants')
+
     class Meta:
         model = Brand
-        fields = '__all__'
+        exclude = ['logo_variants']
 
 
 class CategorySerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image_variants')
+
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ['image_variants']
+
+class ProductReviewSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image_variants')
+    expandable_fields = {
+        'product': ProductSerializer,
+    }
 
-class ProductReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductReview
-        fields = '__all__'
+        exclude = ['image_variants']
 
 class AttributeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attribute
         fields = '__all__'
 
-class ProductAttributeSerializer(serializers.ModelSerializer):
+class ProductAttributeSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'product': ProductSerializer,
+        'attribute': AttributeSerializer,
+    }
+
     class Meta:
         model = ProductAttribute
         fields = '__all__'
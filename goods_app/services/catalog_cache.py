@@ -0,0 +1,32 @@
+# Теги кэша ответов каталога (kdmMarket.response_cache) и ресурсы версий для ETag (kdmMarket.conditional):
+# '<модель>_<id>' и '<модель>_list'
+
+# Поля, по которым фильтруется список товаров: их изменение может добавить товар в список,
+# где его не было. Остальные изменения затрагивают только записи с тегом 'product_<id>'
+# (страницы списка помечены тегами всех своих товаров)
+PRODUCT_LIST_FIELDS = {'price', 'discount_price', 'is_on_sale', 'category', 'category_id', 'brand', 'brand_id'}
+
+
+def product_cache_tags(product_ids, lists=True):
+    tags = [f'product_{pk}' for pk in product_ids]
+    if lists:
+        tags.append('product_list')
+    return tags
+
+
+def catalog_cache_tags(instance, created=False, deleted=False):
+    """
+    Теги, которые нужно сбросить после сохранения или удаления бренда, категории или атрибута.
+    Списки сбрасываются, только если запись появилась или исчезла.
+    """
+    prefix = instance._meta.model_name
+    tags = [f'{prefix}_{instance.pk}']
+    if created or deleted:
+        tags.append(f'{prefix}_list')
+    return tags
+
+
+def catalog_version_resources(instance):
+    # Версия списка меняется при любом изменении записи: она может быть вложена в товары (?expand=)
+    prefix = instance._meta.model_name
+    return [f'{prefix}_{instance.pk}', f'{prefix}_list']
@@ -0,0 +1,172 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+# Списки id товаров хранятся как отсортированные массивы int64
+POSTING_TYPECODE = 'q'
+# Больше стольких товаров не передаем списком в pk__in (лимит параметров SQLite - 999),
+# а фильтруем подзапросами по индексу ProductAttribute
+POSTING_FILTER_LIMIT = 900
+
+
+def encode_posting(product_ids):
+    return array(POSTING_TYPECODE, sorted(set(product_ids))).tobytes()
+
+
+def decode_posting(data):
+    posting = array(POSTING_TYPECODE)
+    posting.frombytes(bytes(data))
+    return posting
+
+
+def parse_attribute_filters(values):
+    """['1:red', '2:42'] -> {1: {'red'}, 2: {'42'}}"""
+    filters = defaultdict(set)
+    for item in values:
+        attribute_id, sep, value = item.partition(':')
+        if not sep or not attribute_id.strip().isdigit():
+            raise ValueError(f'Некорректный фильтр атрибута: {item}')
+        filters[int(attribute_id)].add(value.strip())
+    return dict(filters)
+
+
+def posting_contains(posting, product_id):
+    index = bisect_left(posting, product_id)
+    return index < len(posting) and posting[index] == product_id
+
+
+def filter_by_attributes(queryset, attribute_filters, limit=POSTING_FILTER_LIMIT):
+    """
+    Товары, подходящие под все атрибуты сразу.
+    Значения одного атрибута объединяются (ИЛИ), разные атрибуты пересекаются (И).
+    Пересечение считается по posting-листам: кандидаты берутся из самого узкого атрибута
+    и проверяются бинарным поиском в отсортированных листах остальных. Если кандидатов
+    больше limit, пересекает БД подзапросами (filter_by_attributes_sql).
+    """
+    from goods_app.models import AttributeFacet
+
+    condition = Q()
+    for attribute_id, values in attribute_filters.items():
+        condition |= Q(attribute_id=attribute_id, value__in=values)
+
+    totals = defaultdict(int)
+    for attribute_id, count in AttributeFacet.objects.filter(condition).values_list('attribute_id', 'count'):
+        totals[attribute_id] += count
+    if len(totals) < len(attribute_filters):
+        return queryset.none()
+    narrowest = min(totals, key=totals.get)
+    if totals[narrowest] > limit:
+        return filter_by_attributes_sql(queryset, attribute_filters)
+
+    postings = defaultdict(list)
+    for attribute_id, data in AttributeFacet.objects.filter(condition).values_list('attribute_id', 'product_ids'):
+        postings[attribute_id].append(decode_posting(data))
+    candidates = set().union(*postings.pop(narrowest))
+    for attribute_postings in postings.values():
+        candidates = {
+            product_id for product_id in candidates
+            if any(posting_contains(posting, product_id) for posting in attribute_postings)
+        }
+        if not candidates:
+            return queryset.none()
+    return queryset.filter(pk__in=sorted(candidates))
+
+
+def filter_by_attributes_sql(queryset, attribute_filters):
+    """Тот же фильтр подзапросом на атрибут - для широких фасетов, чьи id не стоит выгружать в Python"""
+    from goods_app.models import ProductAttribute
+
+    for attribute_id, values in attribute_filters.items():
+        matching = ProductAttribute.objects.filter(attribute_id=attribute_id, value__in=values)
+        queryset = queryset.filter(pk__in=matching.values('product_id'))
+    return queryset
+
+
+def facet_counts(queryset=None):
+    """
+    {attribute_id: {value: количество товаров}}.
+    Без фильтров счетчики берутся из AttributeFacet.count, posting-листы не читаются.
+    Для отфильтрованного queryset - один GROUP BY по ProductAttribute с подзапросом товаров.
+    """
+    from goods_app.models import AttributeFacet, ProductAttribute
+
+    if queryset is None:
+        rows = AttributeFacet.objects.filter(count__gt=0).values_list('attribute_id', 'value', 'count')
+    else:
+        rows = (
+            ProductAttribute.objects.filter(product__in=queryset.order_by().values('pk'))
+            .values_list('attribute_id', 'value')
+            .annotate(count=Count('product_id', distinct=True))
+            .order_by()
+        )
+    counts = defaultdict(dict)
+    for attribute_id, value, count in rows:
+        counts[attribute_id][value] = count
+    return dict(counts)
+
+
+@transaction.atomic
+def add_to_facet(attribute_id, value, product_id):
+    from goods_app.models import AttributeFacet
+
+    facet, created = AttributeFacet.objects.select_for_update().get_or_create(
+        attribute_id=attribute_id, value=value,
+        defaults={'product_ids': encode_posting([product_id]), 'count': 1},
+    )
+    if created:
+        return
+    # Массив уже отсортирован: вставка на место без пересортировки
+    posting = decode_posting(facet.product_ids)
+    if posting_contains(posting, product_id):
+        return
+    posting.insert(bisect_left(posting, product_id), product_id)
+    facet.product_ids = posting.tobytes()
+    facet.count = len(posting)
+    facet.save(update_fields=['product_ids', 'count'])
+
+
+@transaction.atomic
+def remove_from_facet(attribute_id, value, product_id):
+    from goods_app.models import AttributeFacet, ProductAttribute
+
+    # У товара может быть несколько одинаковых записей атрибута
+    if ProductAttribute.objects.filter(product_id=product_id, attribute_id=attribute_id, value=value).exists():
+        return
+    facet = AttributeFacet.objects.select_for_update().filter(attribute_id=attribute_id, value=value).first()
+    if facet is None:
+        return
+    posting = decode_posting(facet.product_ids)
+    if not posting_contains(posting, product_id):
+        return
+    del posting[bisect_left(posting, product_id)]
+    if not posting:
+        facet.delete()
+        return
+    facet.product_ids = posting.tobytes()
+    facet.count = len(posting)
+    facet.save(update_fields=['product_ids', 'count'])
+
+
+@transaction.atomic
+def rebuild_facets():
+    """Полная пересборка posting-листов из ProductAttribute"""
+    from goods_app.models import AttributeFacet, ProductAttribute
+
+    postings = defaultdict(set)
+    rows = ProductAttribute.objects.values_list('attribute_id', 'value', 'product_id').order_by()
+    for attribute_id, value, product_id in rows.iterator(chunk_size=5000):
+        postings[(attribute_id, value)].add(product_id)
+
+    AttributeFacet.objects.all().delete()
+    AttributeFacet.objects.bulk_create(
+        [
+            AttributeFacet(attribute_id=attribute_id, value=value,
+                           product_ids=encode_posting(product_ids), count=len(product_ids))
+            for (attribute_id, value), product_ids in postings.items()
+        ],
+        batch_size=1000,
+    )
+    return len(postings)
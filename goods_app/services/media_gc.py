@@ -0,0 +1,61 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.utils import timezone
+
+from kdmMarket.images import IMAGE_FIELDS
+from kdmMarket.storage import content_storage, is_blob
+
+from goods_app.models import MediaBlob
+
+CHUNK_SIZE = 1000
+
+
+def count_blob_references():
+    """Mark: обходит все ImageField и их превью и считает ссылки на каждый blob"""
+    counts = Counter()
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        for image_field, variants_field in fields:
+            rows = model.objects.values_list(image_field, variants_field).iterator(chunk_size=CHUNK_SIZE)
+            for name, variants in rows:
+                counts[name] += 1
+                for variant in (variants or {}).get('variants', []):
+                    counts[variant['name']] += 1
+    return Counter({name: count for name, count in counts.items() if is_blob(name)})
+
+
+def recount_blobs(dry_run=False):
+    """Пересчитывает refcount с нуля, исправляя расхождения после сбоев или массовых update()"""
+    counts = count_blob_references()
+    changed = []
+    for blob in MediaBlob.objects.only('id', 'name', 'refcount').iterator(chunk_size=CHUNK_SIZE):
+        refcount = counts.get(blob.name, 0)
+        if blob.refcount != refcount:
+            blob.refcount = refcount
+            changed.append(blob)
+    if not dry_run:
+        MediaBlob.objects.bulk_update(changed, ['refcount'], batch_size=CHUNK_SIZE)
+    return len(changed)
+
+
+def collect_garbage(grace=timedelta(hours=24), dry_run=False):
+    """
+    Sweep: удаляет blob'ы без ссылок, к которым не обращались дольше grace. Недавние пропускаются:
+    файл (в том числе давно загруженный и сейчас загруженный повторно) уже сохранен хранилищем,
+    но запись, которая на него сошлется, могла еще не закоммититься.
+    """
+    candidates = MediaBlob.objects.filter(refcount__lte=0, last_referenced_at__lt=timezone.now() - grace)
+    deleted = freed = 0
+    for blob in candidates.iterator(chunk_size=CHUNK_SIZE):
+        deleted += 1
+        freed += blob.size
+        if dry_run:
+            continue
+        # Между выборкой и удалением на blob мог появиться новый владелец
+        if MediaBlob.objects.filter(
+            pk=blob.pk, refcount__lte=0, last_referenced_at__lt=timezone.now() - grace,
+        ).delete()[0]:
+            content_storage.delete_blob(blob.name)
+    return deleted, freed
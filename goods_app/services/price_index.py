@@ -0,0 +1,109 @@
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Round
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+PRICE_CACHE_KEY = 'product_{}_final_price'
+PRICE_CACHE_TIMEOUT = 60 * 60
+
+# Поля, изменение которых меняет итоговую цену товара
+PRICE_FIELDS = {'price', 'discount_price', 'is_on_sale'}
+
+# Отправляется после коммита изменения цен (product_ids) - для кэшей, посчитанных из цен товаров
+final_prices_changed = Signal()
+
+
+def price_cache_key(product_id):
+    return PRICE_CACHE_KEY.format(product_id)
+
+
+def compute_final_price(product):
+    """Итоговая цена товара с учетом скидки (без обращения к кэшу)"""
+    if not product.is_on_sale:
+        return product.price
+    discount = product.discount_price / 100
+    return round(product.price * (1 - discount), 2)
+
+
+def final_price_expression(prefix=''):
+    """
+    То же самое, что compute_final_price, но в виде выражения для annotate().
+    prefix - путь до товара из связанной модели, например 'product__'.
+    """
+    return Case(
+        When(
+            **{f'{prefix}is_on_sale': True},
+            then=Round(F(f'{prefix}price') * (Value(1.0) - F(f'{prefix}discount_price') / Value(100.0)), 2),
+        ),
+        default=F(f'{prefix}price'),
+        output_field=FloatField(),
+    )
+
+
+def get_final_prices(products):
+    """
+    Возвращает {product_id: final_price} для всех товаров за один запрос к Redis.
+    Промахи досчитываются по уже загруженным объектам и записываются одним set_many.
+    Если Redis недоступен, цены считаются в БД через final_price_expression().
+    """
+    products = [product for product in products if product.pk is not None]
+    if not products:
+        return {}
+
+    keys = {price_cache_key(product.pk): product for product in products}
+    try:
+        cached = cache.get_many(list(keys))
+    except Exception as e:
+        logger.warning('Кэш цен недоступен, считаем цены в БД: %s', e)
+        return _final_prices_from_db([product.pk for product in products])
+
+    prices = {}
+    missing = {}
+    for key, product in keys.items():
+        if key in cached:
+            prices[product.pk] = cached[key]
+        else:
+            price = compute_final_price(product)
+            prices[product.pk] = price
+            missing[key] = price
+
+    if missing:
+        try:
+            cache.set_many(missing, PRICE_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning('Не удалось сохранить цены в кэш: %s', e)
+
+    return prices
+
+
+def _final_prices_from_db(product_ids):
+    from goods_app.models import Product
+
+    return dict(
+        Product.objects.filter(pk__in=product_ids)
+        .annotate(computed_final_price=final_price_expression())
+        .values_list('pk', 'computed_final_price')
+    )
+
+
+def invalidate_final_prices(product_ids):
+    """Сбрасывает закэшированные цены (после save/delete или массового update)"""
+    keys = [price_cache_key(product_id) for product_id in product_ids]
+    if not keys:
+        return
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning('Не удалось сбросить кэш цен: %s', e)
+    final_prices_changed.send(sender=None, product_ids=product_ids)
+
+
+def invalidate_final_prices_on_commit(product_ids):
+    # До коммита параллельный запрос успел бы закэшировать старую цену
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: invalidate_final_prices(product_ids))
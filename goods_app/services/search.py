@@ -0,0 +1,196 @@
+import logging
+import re
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'goods_app_product_fts'
+# Вес названия товара относительно остального текста при ранжировании
+NAME_WEIGHT = 10.0
+MAX_QUERY_TOKENS = 10
+
+# Поля Product, которые попадают в поисковый документ
+SEARCH_FIELDS = {'name', 'description', 'brand', 'brand_id', 'category', 'category_id'}
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())[:MAX_QUERY_TOKENS]
+
+
+class SQLiteFTSBackend:
+    """Локальный индекс на SQLite FTS5 (rowid = id товара), таблицу создает миграция 0005"""
+
+    def index(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, document) VALUES (%s, %s, %s)', rows)
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+    def search(self, tokens, limit, offset):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {NAME_WEIGHT}, 1.0) LIMIT %s OFFSET %s',
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def autocomplete(self, tokens, limit):
+        match = 'name : ' + ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {NAME_WEIGHT}, 1.0) LIMIT %s',
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """
+    tsvector + GIN поверх таблицы ProductSearchDocument (индексы создает миграция 0005).
+    Выражения в запросах должны совпадать с выражениями индексов.
+    """
+    table = 'goods_app_productsearchdocument'
+    vector = (
+        "setweight(to_tsvector('simple', name), 'A') || "
+        "setweight(to_tsvector('simple', document), 'B')"
+    )
+    name_vector = "to_tsvector('simple', name)"
+
+    def index(self, rows):
+        # Документы уже сохранены в ProductSearchDocument, GIN обновляется сам
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def _tsquery(self, tokens):
+        return ' & '.join(f'{token}:*' for token in tokens)
+
+    def search(self, tokens, limit, offset):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table}, to_tsquery('simple', %s) query "
+                f"WHERE ({self.vector}) @@ query "
+                f"ORDER BY ts_rank_cd({self.vector}, query) DESC, product_id LIMIT %s OFFSET %s",
+                [self._tsquery(tokens), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def autocomplete(self, tokens, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table}, to_tsquery('simple', %s) query "
+                f"WHERE ({self.name_vector}) @@ query "
+                f"ORDER BY ts_rank_cd({self.name_vector}, query) DESC, product_id LIMIT %s",
+                [self._tsquery(tokens), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    """Для остальных СУБД: простой поиск по подстроке без ранжирования"""
+
+    def index(self, rows):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def _documents(self, fields, tokens):
+        from django.db.models import Q
+        from goods_app.models import ProductSearchDocument
+
+        queryset = ProductSearchDocument.objects.all()
+        for token in tokens:
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f'{field}__icontains': token})
+            queryset = queryset.filter(condition)
+        return queryset.order_by('product_id').values_list('product_id', flat=True)
+
+    def search(self, tokens, limit, offset):
+        return list(self._documents(['name', 'document'], tokens)[offset:offset + limit])
+
+    def autocomplete(self, tokens, limit):
+        return list(self._documents(['name'], tokens)[:limit])
+
+
+def get_backend():
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+def build_document(product):
+    """Текст для поиска: описание, бренд, категория и значения атрибутов"""
+    parts = [product.description, product.brand.name, product.category.name]
+    parts.extend(attribute.value for attribute in product.productattribute_set.all())
+    return ' '.join(part for part in parts if part)
+
+
+def index_products(product_ids):
+    """Пересобирает поисковые документы для указанных товаров"""
+    from goods_app.models import Product, ProductSearchDocument
+
+    products = (
+        Product.objects.filter(pk__in=product_ids)
+        .select_related('brand', 'category')
+        .prefetch_related('productattribute_set')
+    )
+    documents = [
+        ProductSearchDocument(product_id=product.pk, name=product.name, document=build_document(product))
+        for product in products
+    ]
+    if not documents:
+        return
+    ProductSearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['name', 'document'],
+    )
+    get_backend().index([(doc.product_id, doc.name, doc.document) for doc in documents])
+
+
+def reindex_queryset(queryset, chunk_size=1000):
+    """Переиндексирует товары из queryset порциями по диапазонам id, возвращает их количество"""
+    last_id = 0
+    total = 0
+    while True:
+        product_ids = list(
+            queryset.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not product_ids:
+            return total
+        index_products(product_ids)
+        last_id = product_ids[-1]
+        total += len(product_ids)
+
+
+def remove_products(product_ids):
+    get_backend().remove(list(product_ids))
+
+
+def search_products(query, limit=20, offset=0):
+    """Id товаров по релевантности"""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    return get_backend().search(tokens, limit, offset)
+
+
+def autocomplete_products(prefix, limit=10):
+    tokens = tokenize(prefix)
+    if not tokens:
+        return []
+    return get_backend().autocomplete(tokens, limit)
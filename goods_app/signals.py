@@ -0,0 +1,134 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from kdmMarket.images import remember_image_names, image_saved, image_deleted
+from kdmMarket.conditional import bump_versions_on_commit, delete_versions_on_commit
+from kdmMarket.response_cache import purge_tags_on_commit
+from .models import Product, ProductAttribute, Brand, Category, ProductReview, Attribute
+from .services.catalog_cache import (
+    catalog_cache_tags, catalog_version_resources, product_cache_tags, PRODUCT_LIST_FIELDS,
+)
+from .services.facets import add_to_facet, remove_from_facet
+from .services.price_index import invalidate_final_prices_on_commit
+from .services.search import index_products, remove_products
+from .tasks import reindex_products_by
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_price(sender, instance, **kwargs):
+    invalidate_final_prices_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def purge_product_responses(sender, instance, update_fields=None, **kwargs):
+    # Списки сбрасываем, если товар появился/исчез или сохранены поля, по которым они фильтруются
+    lists = update_fields is None or not (PRODUCT_LIST_FIELDS | {'quantity'}).isdisjoint(update_fields)
+    purge_tags_on_commit(product_cache_tags([instance.pk], lists=lists))
+    if kwargs['signal'] is post_delete:
+        delete_versions_on_commit([f'product_{instance.pk}'])
+        bump_versions_on_commit(['product_list'])
+    else:
+        bump_versions_on_commit(product_cache_tags([instance.pk]))
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Attribute)
+def purge_catalog_responses(sender, instance, created=False, **kwargs):
+    deleted = kwargs['signal'] is post_delete
+    purge_tags_on_commit(catalog_cache_tags(instance, created=created, deleted=deleted))
+    resource, list_resource = catalog_version_resources(instance)
+    if deleted:
+        delete_versions_on_commit([resource])
+        bump_versions_on_commit([list_resource])
+    else:
+        bump_versions_on_commit([resource, list_resource])
+
+
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+def purge_product_facets(sender, instance, **kwargs):
+    # Атрибуты меняют фасеты и результаты фильтров списка товаров
+    purge_tags_on_commit(['product_list'])
+    bump_versions_on_commit(['product_list'])
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+def index_product_attributes(sender, instance, raw=False, **kwargs):
+    # После коммита: при каскадном удалении товара атрибуты удаляются раньше него
+    if not raw:
+        product_id = instance.product_id
+        transaction.on_commit(lambda: index_products([product_id]))
+
+
+@receiver(post_init, sender=Brand)
+@receiver(post_init, sender=Category)
+def remember_catalog_name(sender, instance, **kwargs):
+    # Через __dict__, чтобы не подгружать отложенное поле (.only()/.defer())
+    instance._original_name = instance.__dict__.get('name')
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def reindex_related_products(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # Название бренда/категории входит в поисковый документ каждого товара; остальные поля - нет.
+    # Переиндексация всех товаров - задачей после коммита, а не внутри запроса админки
+    if raw or created or (update_fields is not None and 'name' not in update_fields):
+        return
+    original_name = getattr(instance, '_original_name', None)
+    instance._original_name = instance.name
+    if original_name == instance.name:
+        return
+    lookup = 'brand' if sender is Brand else 'category'
+    pk = instance.pk
+    transaction.on_commit(lambda: reindex_products_by.delay(lookup, pk))
+
+
+@receiver(post_init, sender=ProductAttribute)
+def remember_facet_key(sender, instance, **kwargs):
+    instance._facet_key = (instance.attribute_id, instance.value, instance.product_id)
+
+
+@receiver(post_save, sender=ProductAttribute)
+def update_facets(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    new_key = (instance.attribute_id, instance.value, instance.product_id)
+    old_key = getattr(instance, '_facet_key', None)
+    if not created and old_key == new_key:
+        # Атрибут сохранен без смены значения - posting-лист не трогаем и не блокируем
+        return
+    if not created and old_key:
+        remove_from_facet(*old_key)
+    add_to_facet(*new_key)
+    instance._facet_key = new_key
+
+
+@receiver(post_delete, sender=ProductAttribute)
+def remove_facet(sender, instance, **kwargs):
+    remove_from_facet(instance.attribute_id, instance.value, instance.product_id)
+
+
+# Изображения: учет ссылок на blob'ы и нарезка превью задачей generate_image_variants после смены файла
+for model in (Product, Category, Brand, ProductReview):
+    post_init.connect(remember_image_names, sender=model, dispatch_uid=f'remember_images_{model.__name__}')
+    post_save.connect(image_saved, sender=model, dispatch_uid=f'image_saved_{model.__name__}')
+    pre_delete.connect(image_deleted, sender=model, dispatch_uid=f'image_deleted_{model.__name__}')
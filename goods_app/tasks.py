@@ -0,0 +1,39 @@
+import logging
+
+from celery import shared_task
+
+from django.apps import apps
+
+from kdmMarket.conditional import bump_versions
+from kdmMarket.images import generate_variants
+from kdmMarket.response_cache import purge_tags
+
+from .models import Product
+from .services.search import reindex_queryset
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_image_variants(model_label, pk, image_field):
+    try:
+        result = generate_variants(model_label, pk, image_field)
+    except OSError as e:
+        # Файла нет или это не изображение (Pillow поднимает UnidentifiedImageError, наследника OSError)
+        logger.warning(f'Не удалось нарезать превью для {model_label}#{pk}.{image_field}: {e}')
+        return False
+    if result:
+        # Превью записываются через update() в обход сигналов save - srcset в кэше ответов и ETag устарели
+        model_name = apps.get_model(model_label)._meta.model_name
+        purge_tags([f'{model_name}_{pk}'])
+        bump_versions([f'{model_name}_{pk}', f'{model_name}_list'])
+        logger.info(f"Превью для {model_label}#{pk}.{image_field}: {len(result['variants'])}")
+    return bool(result)
+
+
+@shared_task
+def reindex_products_by(lookup, pk):
+    """Переиндексирует товары бренда или категории после смены названия (lookup - 'brand' или 'category')"""
+    total = reindex_queryset(Product.objects.filter(**{lookup: pk}))
+    logger.info(f'Переиндексировано товаров ({lookup}={pk}): {total}')
+    return total
@@ -1,3 +1,528 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient, APIRequestFactory
+
+from kdmMarket.images import store_variants
+from kdmMarket.storage import content_storage
+from kdmMarket.response_cache import purge_tags
+from kdmMarket.testing import FAKE_REDIS_CACHES, LOCMEM_CACHES, fakeredis
+
+from .models import Product, Category, Brand, Attribute, ProductAttribute, MediaBlob, ProductSearchDocument
+from .services.facets import filter_by_attributes
+from .services.price_index import get_final_prices
+from .services.media_gc import collect_garbage
+from .views import ProductView
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductExpandQueryCountTests(TestCase):
+    """Количество SQL-запросов на список не зависит от размера страницы"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.attribute = Attribute.objects.create(name='color', type_attribute='str')
+
+    def create_products(self, count):
+        for i in range(count):
+            category = Category.objects.create(slug=f'c{i}', name=f'Категория {i}')
+            brand = Brand.objects.create(slug=f'b{i}', name=f'Бренд {i}', description='')
+            product = Product.objects.create(
+                name=f'Товар {i}', description='', price=100, category=category, brand=brand, image='a.jpg',
+            )
+            ProductAttribute.objects.create(product=product, attribute=self.attribute, value='red')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def assert_constant_queries(self, url):
+        self.create_products(2)
+        small, _ = self.count_queries(url)
+        self.create_products(10)
+        large, data = self.count_queries(url)
+        self.assertEqual(small, large)
+        return data
+
+    def test_products_expand_brand_category(self):
+        data = self.assert_constant_queries('/api/products/?expand=brand,category')
+        product = data['results'][0]
+        self.assertEqual(product['brand']['name'], product['name'].replace('Товар', 'Бренд'))
+        self.assertIn('slug', product['category'])
+
+    def test_product_attributes_expand_product(self):
+        data = self.assert_constant_queries('/api/productAttribute/?expand=product,attribute,brand')
+        item = data['results'][0]
+        self.assertEqual(item['attribute']['name'], 'color')
+        self.assertIn('name', item['product']['brand'])
+
+    def test_without_expand_returns_ids(self):
+        self.create_products(1)
+        _, data = self.count_queries('/api/products/')
+        self.assertIsInstance(data['results'][0]['brand'], int)
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES)
+class CatalogUpdateInvalidationTests(TestCase):
+    """UPDATE без сигналов save сбрасывает ровно затронутые записи кэша каталога"""
+
+    def setUp(self):
+        get_redis_connection('default').flushdb()
+        self.client = APIClient()
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.product = Product.objects.create(
+            name='Товар', description='', price=100, quantity=2, category=category, brand=brand, image='a.jpg',
+        )
+
+    def get(self, url):
+        return self.client.get(url, HTTP_ACCEPT='application/json')
+
+    def sell(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(quantity=F('quantity') - quantity)
+
+    def test_stock_decrement_keeps_unrelated_lists(self):
+        self.get('/api/products/')
+        self.get('/api/products/?in_stock=false')
+
+        self.sell(1)
+
+        response = self.get('/api/products/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['quantity'], 1)
+        self.assertEqual(self.get('/api/products/?in_stock=false')['X-Cache'], 'HIT')
+
+    def test_stored_variants_purge_brand_responses(self):
+        brand = self.product.brand
+        self.get(f'/api/brand/{brand.pk}/')
+        self.assertEqual(self.get(f'/api/brand/{brand.pk}/')['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            store_variants(brand, 'logo', 'logo_variants', [])
+
+        response = self.get(f'/api/brand/{brand.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_response_built_during_purge_is_not_stored(self):
+        class PurgedWhileBuildingView(ProductView):
+            def list_uncached(self, request, *args, **kwargs):
+                response = super().list_uncached(request, *args, **kwargs)
+                # Товар изменился, пока строился ответ
+                purge_tags(['product_list'])
+                return response
+
+        request = APIRequestFactory().get('/api/products/', HTTP_ACCEPT='application/json')
+        response = PurgedWhileBuildingView.as_view({'get': 'list'})(request)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        self.assertEqual(self.get('/api/products/')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/products/')['X-Cache'], 'HIT')
+
+    def test_sold_out_product_enters_out_of_stock_list(self):
+        self.get('/api/products/?in_stock=false')
+
+        self.sell(2)
+
+        response = self.get('/api/products/?in_stock=false')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.product.pk])
+
+    def test_known_touched_rows_skip_extra_selects(self):
+        self.get('/api/products/?in_stock=false')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                Product.objects.filter(pk=self.product.pk).update(
+                    quantity=F('quantity') - 2, touched={self.product.pk: (2, 0)},
+                )
+
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['UPDATE'])
+        self.assertEqual(self.get('/api/products/?in_stock=false')['X-Cache'], 'MISS')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FinalPriceCacheTests(TestCase):
+    """Итоговые цены читаются из кэша пачкой, при недоступном кэше - из БД"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {i}', description='', price=100, discount_price=10, is_on_sale=bool(i),
+                category=category, brand=brand, image='a.jpg',
+            )
+            for i in range(3)
+        ]
+
+    def test_prices_are_batched_through_get_many_and_set_many(self):
+        with patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            first = get_final_prices(self.products)
+            second = get_final_prices(self.products)
+
+        self.assertEqual(get_many.call_count, 2)
+        self.assertEqual(set_many.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(sorted(first.values()), [90, 90, 100])
+
+    def test_cache_failure_falls_back_to_database(self):
+        with patch.object(cache, 'get_many', side_effect=ConnectionError), \
+                self.assertNumQueries(1), self.assertLogs('goods_app.services.price_index', 'WARNING'):
+            prices = get_final_prices(self.products)
+
+        self.assertEqual(prices, {product.pk: (90 if product.is_on_sale else 100) for product in self.products})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductFacetTests(TestCase):
+    """Фильтр ?attr= и счетчики фасетов"""
+
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.color = Attribute.objects.create(name='color', type_attribute='str')
+        self.size = Attribute.objects.create(name='size', type_attribute='str')
+        self.products = []
+        for color, size, on_sale in [('red', '42', True), ('red', '44', True), ('blue', '42', False)]:
+            product = Product.objects.create(
+                name=f'Товар {color} {size}', description='', price=100, is_on_sale=on_sale,
+                category=category, brand=brand, image='a.jpg',
+            )
+            ProductAttribute.objects.create(product=product, attribute=self.color, value=color)
+            ProductAttribute.objects.create(product=product, attribute=self.size, value=size)
+            self.products.append(product)
+
+    def get(self, url):
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_attribute_filters_intersect(self):
+        data = self.get(f'/api/products/?attr={self.color.pk}:red,{self.color.pk}:blue,{self.size.pk}:42')
+
+        self.assertEqual(
+            sorted(item['id'] for item in data['results']), [self.products[0].pk, self.products[2].pk],
+        )
+
+    def test_facet_counts_without_filters(self):
+        facets = self.get('/api/products/?facets=1')['facets']
+
+        self.assertEqual(facets[str(self.color.pk)], {'red': 2, 'blue': 1})
+        self.assertEqual(facets[str(self.size.pk)], {'42': 2, '44': 1})
+
+    def test_facet_counts_follow_filters(self):
+        facets = self.get('/api/products/?facets=1&is_on_sale=true')['facets']
+
+        self.assertEqual(facets[str(self.color.pk)], {'red': 2})
+        self.assertEqual(facets[str(self.size.pk)], {'42': 1, '44': 1})
+
+    def result_ids(self, url):
+        return sorted(item['id'] for item in self.get(url)['results'])
+
+    def test_filter_follows_attribute_changes(self):
+        attribute = ProductAttribute.objects.get(product=self.products[0], attribute=self.color)
+        attribute.value = 'blue'
+        attribute.save()
+        ProductAttribute.objects.get(product=self.products[2], attribute=self.size).delete()
+
+        self.assertEqual(self.result_ids(f'/api/products/?attr={self.color.pk}:red'), [self.products[1].pk])
+        self.assertEqual(
+            self.result_ids(f'/api/products/?attr={self.color.pk}:blue'), [self.products[0].pk, self.products[2].pk],
+        )
+        self.assertEqual(
+            self.result_ids(f'/api/products/?attr={self.color.pk}:blue,{self.size.pk}:42'), [self.products[0].pk],
+        )
+
+    def test_unknown_value_returns_nothing(self):
+        self.assertEqual(self.result_ids(f'/api/products/?attr={self.color.pk}:green'), [])
+
+    def test_sql_fallback_matches_postings(self):
+        attribute_filters = {self.color.pk: {'red', 'blue'}, self.size.pk: {'42'}}
+
+        by_postings = filter_by_attributes(Product.objects.all(), attribute_filters)
+        by_sql = filter_by_attributes(Product.objects.all(), attribute_filters, limit=0)
+
+        expected = [self.products[0].pk, self.products[2].pk]
+        self.assertEqual(sorted(by_postings.values_list('pk', flat=True)), expected)
+        self.assertEqual(sorted(by_sql.values_list('pk', flat=True)), expected)
+
+
+class MediaGarbageCollectionTests(TestCase):
+    """Grace period сборщика blob'ов отсчитывается от последнего обращения, а не от создания"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self):
+        return content_storage.save('Product_images/a.jpg', ContentFile(b'image'))
+
+    def age_blob(self, name):
+        long_ago = timezone.now() - timedelta(days=7)
+        MediaBlob.objects.filter(name=name).update(created_at=long_ago, last_referenced_at=long_ago)
+
+    def test_old_unreferenced_blob_is_deleted(self):
+        name = self.upload()
+        self.age_blob(name)
+
+        self.assertEqual(collect_garbage()[0], 1)
+
+        self.assertFalse(content_storage.exists(name))
+
+    def test_reupload_of_old_blob_restarts_grace(self):
+        name = self.upload()
+        self.age_blob(name)
+
+        self.assertEqual(self.upload(), name)
+
+        self.assertEqual(collect_garbage()[0], 0)
+        self.assertTrue(content_storage.exists(name))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BrandRenameReindexTests(TestCase):
+    """Товары бренда переиндексируются только при смене его названия"""
+
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(slug='c', name='Обувь')
+        self.brand = Brand.objects.create(slug='b', name='Nike', description='')
+        self.product = Product.objects.create(
+            name='Кроссовки', description='', price=10, category=category, brand=self.brand, image='a.jpg',
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/products/search/', {'q': query}, HTTP_ACCEPT='application/json')
+        return [item['id'] for item in response.json()['results']]
+
+    def test_rename_reindexes_products(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.name = 'Adidas'
+            self.brand.save()
+
+        self.assertEqual(self.search('adidas'), [self.product.pk])
+        self.assertEqual(self.search('nike'), [])
+
+    def test_other_fields_do_not_reindex(self):
+        ProductSearchDocument.objects.filter(product=self.product).update(document='старый документ')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.description = 'Новое описание'
+            self.brand.save()
+
+        self.assertEqual(ProductSearchDocument.objects.get(product=self.product).document, 'старый документ')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductSearchTests(TestCase):
+    """Ранжирование поиска и автодополнение по началу названия"""
+
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(slug='c', name='Обувь')
+        brand = Brand.objects.create(slug='b', name='Nike', description='')
+        self.by_description = Product.objects.create(
+            name='Футболка', description='Под кроссовки', price=10, category=category, brand=brand, image='a.jpg',
+        )
+        self.by_name = Product.objects.create(
+            name='Кроссовки беговые', description='', price=10, category=category, brand=brand, image='a.jpg',
+        )
+
+    def get(self, url, query):
+        return self.client.get(url, {'q': query}, HTTP_ACCEPT='application/json')
+
+    def test_name_match_ranks_first(self):
+        response = self.get('/api/products/search/', 'кроссовки')
+
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.by_name.pk, self.by_description.pk])
+
+    def test_search_matches_token_prefix_and_brand(self):
+        self.assertEqual(len(self.get('/api/products/search/', 'крос').json()['results']), 2)
+        self.assertEqual(len(self.get('/api/products/search/', 'nike').json()['results']), 2)
+
+    def test_autocomplete_matches_name_prefix_only(self):
+        response = self.get('/api/products/autocomplete/', 'крос')
+
+        self.assertEqual(response.json(), [{'id': self.by_name.pk, 'name': 'Кроссовки беговые'}])
+
+    def test_empty_query_is_rejected(self):
+        self.assertEqual(self.get('/api/products/search/', ' ').status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductPaginationTests(TestCase):
+    """Курсорная пагинация: страницы не сдвигаются от новых записей, количество - только по запросу"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(slug='c', name='Категория')
+        self.brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.products = [self.create_product(price) for price in (30, 10, 50, 20, 40)]
+
+    def create_product(self, price):
+        return Product.objects.create(
+            name=f'Товар {price}', description='', price=price, category=self.category, brand=self.brand,
+            image='a.jpg',
+        )
+
+    def get(self, url, **params):
+        return self.client.get(url, params, HTTP_ACCEPT='application/json').json()
+
+    def test_insert_between_pages_does_not_shift_next_page(self):
+        first = self.get('/api/products/', page_size=2)
+        self.create_product(60)
+
+        second = self.get(first['next'])
+
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(ids, sorted((product.pk for product in self.products), reverse=True)[:4])
+
+    def test_walks_all_rows_by_price(self):
+        prices = []
+        page = self.get('/api/products/', page_size=2, ordering='price')
+        while True:
+            prices += [float(item['price']) for item in page['results']]
+            if not page['next']:
+                break
+            page = self.get(page['next'])
+
+        self.assertEqual(prices, [10, 20, 30, 40, 50])
+
+    def test_count_only_when_requested(self):
+        self.assertNotIn('count', self.get('/api/products/'))
+        self.assertEqual(self.get('/api/products/', with_count='true')['count'], 5)
+        self.assertEqual(self.get('/api/products/', with_count='true', max_price=20)['count'], 2)
+
+    def test_unknown_ordering_falls_back_to_default(self):
+        ids = [item['id'] for item in self.get('/api/products/', ordering='description')['results']]
+
+        self.assertEqual(ids, sorted((product.pk for product in self.products), reverse=True))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductFilterTests(TestCase):
+    """Фильтры по итоговой цене и остатку считаются в БД"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+
+        def create(price, discount, on_sale, quantity):
+            return Product.objects.create(
+                name=f'Товар {price}', description='', price=price, discount_price=discount, is_on_sale=on_sale,
+                quantity=quantity, category=category, brand=brand, image='a.jpg',
+            )
+
+        self.discounted = create(100, 50, True, 0)
+        self.regular = create(80, 50, False, 3)
+        self.cheap = create(60, 0, True, 1)
+
+    def ids(self, **params):
+        response = self.client.get('/api/products/', params, HTTP_ACCEPT='application/json')
+        return [item['id'] for item in response.json()['results']]
+
+    def test_final_price_bounds_use_discount(self):
+        self.assertCountEqual(self.ids(max_final_price=60), [self.discounted.pk, self.cheap.pk])
+        self.assertEqual(self.ids(min_final_price=70), [self.regular.pk])
+
+    def test_in_stock(self):
+        self.assertCountEqual(self.ids(in_stock='true'), [self.regular.pk, self.cheap.pk])
+        self.assertEqual(self.ids(in_stock='false'), [self.discounted.pk])
+
+    def test_filters_combine_with_price_ordering(self):
+        self.assertEqual(self.ids(ordering='price'), [self.cheap.pk, self.regular.pk, self.discounted.pk])
+        self.assertEqual(self.ids(ordering='-price', in_stock='true'), [self.regular.pk, self.cheap.pk])
+        self.assertEqual(self.ids(max_final_price=60, in_stock='true'), [self.cheap.pk])
+
+
+@override_settings(MEDIA_ACCEL_REDIRECT_PREFIX=None)
+class MediaServingTests(TestCase):
+    """Отдача медиа: диапазоны байт, условные запросы и пути вне MEDIA_ROOT"""
+
+    content = b'0123456789'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media_root, 'Product_images'))
+        with open(os.path.join(media_root, 'Product_images', 'a.txt'), 'wb') as f:
+            f.write(self.content)
+
+    def get(self, path='Product_images/a.txt', **headers):
+        return self.client.get(f'/media/{path}', headers=headers)
+
+    def test_full_file_with_validators(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+
+    def test_byte_range(self):
+        response = self.get(Range='bytes=2-5')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+
+    def test_suffix_range(self):
+        response = self.get(Range='bytes=-3')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+
+    def test_range_past_end_is_not_satisfiable(self):
+        response = self.get(Range='bytes=10-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_stale_if_range_returns_whole_file(self):
+        response = self.get(Range='bytes=2-5', **{'If-Range': '"other"'})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()['ETag']
+
+        response = self.get(**{'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_path_outside_media_root_is_not_found(self):
+        self.assertEqual(self.get('../settings.py').status_code, 404)
+        self.assertEqual(self.get('Product_images/%2e%2e/%2e%2e/manage.py').status_code, 404)
+        self.assertEqual(self.get('Product_images').status_code, 404)
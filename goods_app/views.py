@@ -1,25 +1,40 @@
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample, OpenApiResponse
-from rest_framework import viewsets
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .filters import ProductAttributeFilter
+from kdmMarket.conditional import ConditionalGetMixin
+from kdmMarket.expand import ExpandQuerysetMixin
+from kdmMarket.response_cache import ResponseCacheMixin
+from .filters import ProductAttributeFilter, ProductFilter
 from .models import Product, Category, Brand, ProductReview, Attribute, ProductAttribute
 from .serializers import ProductSerializer, CategorySerializer, BrandSerializer, ProductReviewSerializer, \
     AttributeSerializer, ProductAttributeSerializer
+from .services.facets import facet_counts
+from .services.search import search_products, autocomplete_products
 
 #SWAGGER-> ProductView
 
 @extend_schema_view(
     list=extend_schema(
         summary="Список товаров",
-        description="Возвращает список всех товаров с возможностью фильтрации по категории, бренду,цене  и активности .",
+        description="Возвращает список всех товаров с возможностью фильтрации по категории, бренду, цене, скидке и наличию.",
         parameters=[
             OpenApiParameter(name='category', description="Фильтр по ID категории", required=False, type=int),
             OpenApiParameter(name='brand', description="Фильтр по ID бренда", required=False, type=int),
+            OpenApiParameter(name='category_slug', description="Фильтр по url категории", required=False, type=str),
+            OpenApiParameter(name='brand_slug', description="Фильтр по url бренда", required=False, type=str),
             OpenApiParameter(name='min_price', description="Минимальная цена", required=False, type=float),
             OpenApiParameter(name='max_price', description="Максимальная цена", required=False, type=float),
-            OpenApiParameter(name='is_active', description='Активен ли товар', required=False, type=bool),
+            OpenApiParameter(name='min_final_price', description="Минимальная цена с учетом скидки", required=False, type=float),
+            OpenApiParameter(name='max_final_price', description="Максимальная цена с учетом скидки", required=False, type=float),
+            OpenApiParameter(name='is_on_sale', description='Товар на продаже', required=False, type=bool),
+            OpenApiParameter(name='in_stock', description='Товар есть в наличии', required=False, type=bool),
+            OpenApiParameter(name='attr', description='Фильтр по атрибутам: id_атрибута:значение через запятую (1:red,2:42)', required=False, type=str),
+            OpenApiParameter(name='facets', description='Добавить в ответ количество товаров по каждому значению атрибутов', required=False, type=bool),
+            OpenApiParameter(name='expand', description='Вложить связанные объекты вместо id: brand,category', required=False, type=str),
         ],
         responses={
             200: ProductSerializer(many=True),
@@ -100,11 +115,92 @@ from .serializers import ProductSerializer, CategorySerializer, BrandSerializer,
     )
 )
 
-class ProductView(viewsets.ModelViewSet):
+class ProductView(ConditionalGetMixin, ResponseCacheMixin, ExpandQuerysetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['category', 'brand','min_price','max_price', 'is_active']
+    filterset_class = ProductFilter
+    search_page_size = 20
+    autocomplete_limit = 10
+    response_cache_prefix = 'product'
+
+    def get_version_resources(self):
+        # Бренды и категории попадают в ответ через ?expand= и фильтры по slug
+        related = ['brand_list', 'category_list']
+        if self.action == 'list':
+            return ['product_list', *related]
+        return [f'product_{self.kwargs[self.lookup_field]}', *related]
+
+    def get_cache_tags(self, data):
+        # Товар показывает бренд и категорию (id или целиком при ?expand=)
+        tags = super().get_cache_tags(data)
+        for item in self.cached_items(data):
+            for field in ('brand', 'category'):
+                related = item.get(field)
+                if isinstance(related, dict):
+                    related = related.get('id')
+                if related is not None:
+                    tags.append(f'{field}_{related}')
+        return tags
+
+    def list_uncached(self, request, *args, **kwargs):
+        response = super().list_uncached(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('1', 'true', 'True'):
+            # Без фильтров - готовые счетчики фасетов, иначе подсчет в БД по отфильтрованным товарам
+            queryset = self.filter_queryset(self.get_queryset())
+            response.data['facets'] = facet_counts(queryset if queryset.query.has_filters() else None)
+        return response
+
+    @extend_schema(
+        summary="Поиск товаров",
+        description="Полнотекстовый поиск по названию, описанию, бренду, категории и атрибутам. Результаты отсортированы по релевантности.",
+        parameters=[
+            OpenApiParameter(name='q', description="Поисковый запрос", required=True, type=str),
+            OpenApiParameter(name='page', description="Номер страницы", required=False, type=int),
+        ],
+        responses={200: ProductSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'], url_path='search', filter_backends=[], pagination_class=None)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Параметр q обязателен'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+        except ValueError:
+            return Response({'error': 'Некорректный номер страницы'}, status=status.HTTP_400_BAD_REQUEST)
+
+        offset = (page - 1) * self.search_page_size
+        product_ids = search_products(query, limit=self.search_page_size + 1, offset=offset)
+        has_next = len(product_ids) > self.search_page_size
+        product_ids = product_ids[:self.search_page_size]
+
+        products = Product.objects.in_bulk(product_ids)
+        serializer = self.get_serializer([products[pk] for pk in product_ids if pk in products], many=True)
+
+        url = request.build_absolute_uri()
+        previous = None
+        if page > 1:
+            previous = replace_query_param(url, 'page', page - 1) if page > 2 else remove_query_param(url, 'page')
+        return Response({
+            'next': replace_query_param(url, 'page', page + 1) if has_next else None,
+            'previous': previous,
+            'results': serializer.data,
+        })
+
+    @extend_schema(
+        summary="Автодополнение названий товаров",
+        description="Подсказки по началу названия товара.",
+        parameters=[
+            OpenApiParameter(name='q', description="Начало названия", required=True, type=str),
+        ],
+        responses={200: OpenApiResponse(description="Список {id, name}")},
+    )
+    @action(detail=False, methods=['get'], url_path='autocomplete', filter_backends=[], pagination_class=None)
+    def autocomplete(self, request):
+        product_ids = autocomplete_products(request.query_params.get('q', ''), limit=self.autocomplete_limit)
+        names = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'name'))
+        return Response([{'id': pk, 'name': names[pk]} for pk in product_ids if pk in names])
 
 
 # SWAGGER-> ProductReviewView
@@ -196,8 +292,8 @@ class ProductView(viewsets.ModelViewSet):
     )
 )
 
-class ProductReviewView(viewsets.ModelViewSet):
-    queryset = ProductReview.objects.all()
+class ProductReviewView(ExpandQuerysetMixin, viewsets.ModelViewSet):
+    queryset = ProductReview.objects.select_related('user', 'product')
     serializer_class = ProductReviewSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['product', 'user', 'rating']
@@ -290,10 +386,16 @@ class ProductReviewView(viewsets.ModelViewSet):
     )
 )
 
-class CategoryView(viewsets.ModelViewSet):
+class CategoryView(ConditionalGetMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filter_backends = [DjangoFilterBackend]
+    response_cache_prefix = 'category'
+
+    def get_version_resources(self):
+        if self.action == 'list':
+            return ['category_list']
+        return [f'category_{self.kwargs[self.lookup_field]}']
 
 #SWAGGER-> BrandView
 @extend_schema_view(
@@ -379,9 +481,10 @@ class CategoryView(viewsets.ModelViewSet):
     )
 )
 
-class BrandView(viewsets.ModelViewSet):
+class BrandView(ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
+    response_cache_prefix = 'brand'
 
 
 
@@ -469,9 +572,10 @@ class BrandView(viewsets.ModelViewSet):
         },
     ),
 )
-class AttributeView(viewsets.ModelViewSet):
+class AttributeView(ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Attribute.objects.all()
     serializer_class = AttributeSerializer
+    response_cache_prefix = 'attribute'
 
 
 # SWAGGER-> ProductAttributeView
@@ -484,6 +588,7 @@ class AttributeView(viewsets.ModelViewSet):
             OpenApiParameter(name='attribute', description='ID атрибута', required=False, type=int),
             OpenApiParameter(name='product_name', description='Название товара (поиск)', required=False, type=str),
             OpenApiParameter(name='is_value_empty', description='Пустое значение', required=False, type=bool),
+            OpenApiParameter(name='expand', description='Вложить связанные объекты вместо id: product,attribute', required=False, type=str),
         ],
         responses={
             200: AttributeSerializer(many=True),
@@ -608,8 +713,8 @@ class AttributeView(viewsets.ModelViewSet):
         }
     )
 )
-class ProductAttributeView(viewsets.ModelViewSet):
-    queryset = ProductAttribute.objects.all()
+class ProductAttributeView(ExpandQuerysetMixin, viewsets.ModelViewSet):
+    queryset = ProductAttribute.objects.select_related('product', 'attribute')
     serializer_class = ProductAttributeSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = ProductAttributeFilter
\ No newline at end of file
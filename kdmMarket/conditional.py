@@ -0,0 +1,128 @@
+import logging
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import salted_hmac
+from django.utils.http import http_date
+from django_redis import get_redis_connection
+from rest_framework import status
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_VERSION_KEY = 'resource_version_{}'
+
+
+def new_version(timestamp=None):
+    """
+    Версия ресурса: случайный токен и время изменения. Токен, а не число, чтобы после
+    сброса Redis новая версия не совпала со старым ETag у клиента.
+    """
+    timestamp = timestamp or timezone.now()
+    return f'{uuid.uuid4().hex}:{int(timestamp.timestamp())}'
+
+
+def bump_versions(resources, timestamp=None):
+    """Новая версия для каждого ресурса ('product_5', 'product_list', ...)"""
+    version = new_version(timestamp)
+    try:
+        pipe = get_redis_connection('default').pipeline()
+        for resource in set(resources):
+            pipe.set(RESOURCE_VERSION_KEY.format(resource), version)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f'Не удалось обновить версии {resources}: {e}')
+
+
+def delete_versions(resources):
+    """Удаленный объект теряет версию: без нее условный запрос дойдет до обработчика и получит 404"""
+    try:
+        get_redis_connection('default').delete(*[RESOURCE_VERSION_KEY.format(resource) for resource in resources])
+    except Exception as e:
+        logger.warning(f'Не удалось удалить версии {resources}: {e}')
+
+
+def bump_versions_on_commit(resources, timestamp=None):
+    resources = list(resources)
+    transaction.on_commit(lambda: bump_versions(resources, timestamp))
+
+
+def delete_versions_on_commit(resources):
+    resources = list(resources)
+    transaction.on_commit(lambda: delete_versions(resources))
+
+
+def get_versions(resources):
+    """
+    Текущие версии ресурсов или None, если хотя бы одной нет. Путь чтения версии не создает,
+    иначе любой клиент мог бы заводить ключи под произвольные id.
+    """
+    values = get_redis_connection('default').mget([RESOURCE_VERSION_KEY.format(resource) for resource in resources])
+    if any(value is None for value in values):
+        return None
+    return [value.decode() for value in values]
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для list/retrieve по версиям ресурсов из get_version_resources().
+    Версии хранятся в Redis и обновляются сигналами при сохранении моделей (bump_versions),
+    поэтому If-None-Match/If-Modified-Since получают 304 без выборки списка и сериализатора;
+    для retrieve сначала проверяется, что объект существует и доступен.
+    Для вьюсетов с данными пользователя (conditional_per_user) ETag зависит и от пользователя.
+    """
+    conditional_per_user = False
+
+    def get_version_resources(self):
+        """Список ресурсов для текущего action или None, если условные запросы не нужны"""
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+    def get_etag(self, request, versions):
+        value = '|'.join(versions)
+        if self.conditional_per_user:
+            value = f'{value}|{request.user.pk}'
+        # Weak: тело зависит от рендерера и параметров запроса, а не только от данных
+        return f'W/"{salted_hmac("conditional_get", value).hexdigest()[:32]}"'
+
+    def is_conditional(self, request):
+        return 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        resources = self.get_version_resources()
+        if not resources or request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        try:
+            versions = get_versions(resources)
+        except Exception as e:
+            logger.warning(f'Версии ресурсов недоступны: {e}')
+            return handler(request, *args, **kwargs)
+        if versions is None:
+            return handler(request, *args, **kwargs)
+
+        etag = self.get_etag(request, versions)
+        last_modified = max(int(version.rsplit(':', 1)[1]) for version in versions)
+        response = None
+        if self.is_conditional(request):
+            if self.action == 'retrieve':
+                # 304 только для объекта, который существует и доступен пользователю (иначе 404)
+                self.get_object()
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Клиент хранит ответ, но каждый раз перепроверяет его по ETag
+        patch_cache_control(response, no_cache=True)
+        if self.conditional_per_user:
+            patch_cache_control(response, private=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,76 @@
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+
+EXPAND_QUERY_PARAM = 'expand'
+MAX_EXPAND_DEPTH = 3
+
+
+def get_expand_fields(request):
+    """?expand=brand,category -> {'brand', 'category'} (только для чтения)"""
+    if request is None or request.method not in SAFE_METHODS:
+        return set()
+    value = request.query_params.get(EXPAND_QUERY_PARAM, '')
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def resolve_serializer(serializer_class):
+    if isinstance(serializer_class, str):
+        return import_string(serializer_class)
+    return serializer_class
+
+
+class ExpandableSerializerMixin:
+    """
+    Подменяет FK-поля из expandable_fields вложенными сериализаторами,
+    если они перечислены в ?expand=. Сериализаторы можно указывать строкой,
+    чтобы не получить циклический импорт между приложениями.
+    """
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in get_expand_fields(self.context.get('request')) & set(self.expandable_fields):
+            fields[name] = resolve_serializer(self.expandable_fields[name])(read_only=True)
+        return fields
+
+
+def plan_related(serializer_class, model, expand, prefix='', depth=0):
+    """
+    Список путей для select_related/prefetch_related под запрошенные ?expand=,
+    включая вложенные сериализаторы (например product -> product__brand).
+    """
+    select, prefetch = [], []
+    if depth >= MAX_EXPAND_DEPTH:
+        return select, prefetch
+    for name in expand & set(getattr(serializer_class, 'expandable_fields', {})):
+        field = model._meta.get_field(name)
+        path = prefix + name
+        nested_select, nested_prefetch = plan_related(
+            resolve_serializer(serializer_class.expandable_fields[name]),
+            field.related_model, expand, prefix=path + '__', depth=depth + 1,
+        )
+        if field.many_to_one or field.one_to_one:
+            select.append(path)
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+        else:
+            # Все, что ниже множественной связи, догружается через prefetch
+            prefetch.append(path)
+            prefetch.extend(nested_select + nested_prefetch)
+    return select, prefetch
+
+
+class ExpandQuerysetMixin:
+    """Добавляет к queryset вьюсета select_related/prefetch_related под ?expand="""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expand = get_expand_fields(self.request)
+        if not expand:
+            return queryset
+        select, prefetch = plan_related(self.get_serializer_class(), queryset.model, expand)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
@@ -0,0 +1,192 @@
+import hashlib
+import io
+import os
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+from rest_framework import serializers
+
+from kdmMarket.conditional import bump_versions_on_commit
+from kdmMarket.response_cache import purge_tags_on_commit
+from kdmMarket.storage import release_blobs, retain_blobs
+
+# Ширины превью (px): карточка в списке, страница товара, крупный просмотр
+VARIANT_WIDTHS = (160, 480, 960)
+# Порядок важен: клиент берет первый поддерживаемый формат
+VARIANT_FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)] + ['jpeg']
+SAVE_OPTIONS = {
+    'avif': {'quality': 50},
+    'webp': {'quality': 80, 'method': 4},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+VARIANTS_DIR = 'variants'
+
+# Модель -> [(поле изображения, поле с вариантами)]
+IMAGE_FIELDS = {
+    'goods_app.Product': [('image', 'image_variants')],
+    'goods_app.Category': [('image', 'image_variants')],
+    'goods_app.Brand': [('logo', 'logo_variants')],
+    'goods_app.ProductReview': [('image', 'image_variants')],
+    'user_app.User': [('image', 'image_variants')],
+}
+
+
+def render_variants(data):
+    """
+    Нарезает превью из байтов исходника: [(ширина, формат, байты)].
+    Чистая функция без Django - ее можно отдавать в ProcessPoolExecutor.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+
+    variants = []
+    widths = [width for width in VARIANT_WIDTHS if width < image.width] or [image.width]
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for fmt in VARIANT_FORMATS:
+            frame = resized.convert('RGBA' if has_alpha and fmt != 'jpeg' else 'RGB')
+            buffer = io.BytesIO()
+            frame.save(buffer, fmt.upper(), **SAVE_OPTIONS[fmt])
+            variants.append((width, fmt, buffer.getvalue()))
+    return variants
+
+
+def variant_name(source_name, data, width, fmt):
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f'{VARIANTS_DIR}/{os.path.dirname(source_name)}/{stem}-{digest}-{width}w.{ext}'
+
+
+def update_variants_field(model, pk, variants_field, value):
+    """
+    Пишет превью одним UPDATE без сигналов save. Поэтому кэш ответов и версии для ETag
+    сбрасываем сами - теми же тегами '<модель>_<id>' и '<модель>_list', что и сигналы каталога.
+    """
+    model.objects.filter(pk=pk).update(**{variants_field: value})
+    resource = f'{model._meta.model_name}_{pk}'
+    purge_tags_on_commit([resource])
+    bump_versions_on_commit([resource, f'{model._meta.model_name}_list'])
+
+
+def store_variants(instance, image_field, variants_field, rendered):
+    """Сохраняет превью в хранилище поля и записывает их список в JSON-поле без сигналов save"""
+    field_file = getattr(instance, image_field)
+    storage = field_file.storage
+    stored = []
+    for width, fmt, data in rendered:
+        name = storage.save(variant_name(field_file.name, data, width, fmt), ContentFile(data))
+        stored.append({'width': width, 'format': fmt, 'name': name})
+
+    old = getattr(instance, variants_field) or {}
+    value = {'source': field_file.name, 'variants': stored}
+    update_variants_field(type(instance), instance.pk, variants_field, value)
+    setattr(instance, variants_field, value)
+
+    old_names = [variant['name'] for variant in old.get('variants', [])]
+    retain_blobs([variant['name'] for variant in stored])
+    release_blobs(old_names)
+    keep = {variant['name'] for variant in stored}
+    for name in old_names:
+        if name not in keep:
+            storage.delete(name)
+    return value
+
+
+def generate_variants(model_label, pk, image_field):
+    model = apps.get_model(model_label)
+    variants_field = dict(IMAGE_FIELDS[model_label])[image_field]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return None
+    field_file = getattr(instance, image_field)
+    if not field_file:
+        if getattr(instance, variants_field):
+            update_variants_field(model, pk, variants_field, {})
+        return None
+    with field_file.open('rb') as f:
+        data = f.read()
+    return store_variants(instance, image_field, variants_field, render_variants(data))
+
+
+class ImageSrcsetField(serializers.ReadOnlyField):
+    """
+    Превью в виде srcset по форматам:
+    {'avif': 'url 160w, url 480w', 'webp': '...', 'jpeg': '...'}
+    """
+
+    def __init__(self, image_field='image', **kwargs):
+        self.image_field = image_field
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        variants = (value or {}).get('variants')
+        if not variants:
+            return None
+        request = self.context.get('request')
+        storage = self.parent.Meta.model._meta.get_field(self.image_field).storage
+
+        srcset = {}
+        for variant in sorted(variants, key=lambda v: v['width']):
+            url = storage.url(variant['name'])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            srcset.setdefault(variant['format'], []).append(f"{url} {variant['width']}w")
+        return {fmt: ', '.join(entries) for fmt, entries in srcset.items()}
+
+
+def _image_name(value):
+    return getattr(value, 'name', value) or None
+
+
+def remember_image_names(sender, instance, **kwargs):
+    """post_init: запоминаем исходные имена файлов, чтобы после save понять, что изображение сменилось"""
+    instance._original_images = {
+        field: _image_name(instance.__dict__.get(field)) for field, _ in IMAGE_FIELDS[sender._meta.label]
+    }
+
+
+def image_saved(sender, instance, created=False, raw=False, **kwargs):
+    """
+    post_save: при смене изображения переносим ссылку со старого blob на новый
+    и после коммита ставим задачу нарезки превью.
+    """
+    if raw:
+        return
+    from goods_app.tasks import generate_image_variants
+
+    label = sender._meta.label
+    original = getattr(instance, '_original_images', {})
+    for field, _ in IMAGE_FIELDS[label]:
+        if field not in instance.__dict__:
+            continue
+        current = _image_name(instance.__dict__[field])
+        previous = None if created else original.get(field)
+        if current != previous:
+            retain_blobs([current])
+            release_blobs([previous])
+            transaction.on_commit(
+                lambda field=field: generate_image_variants.delay(label, instance.pk, field)
+            )
+    remember_image_names(sender, instance)
+
+
+def image_deleted(sender, instance, **kwargs):
+    """
+    pre_delete: запись больше не ссылается ни на изображение, ни на его превью.
+    Имена читаем из БД - превью пишутся задачей в обход экземпляра, и он может быть устаревшим.
+    """
+    fields = IMAGE_FIELDS[sender._meta.label]
+    row = sender._base_manager.filter(pk=instance.pk).values(*[f for pair in fields for f in pair]).first()
+    if row is None:
+        return
+    names = []
+    for field, variants_field in fields:
+        names.append(row[field])
+        names += [variant['name'] for variant in (row[variants_field] or {}).get('variants', [])]
+    release_blobs(names)
@@ -0,0 +1,134 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from kdmMarket.storage import cache_headers, is_blob
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def resolve_media_path(path):
+    """Абсолютный путь внутри MEDIA_ROOT; выход за его пределы и каталоги - 404"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден')
+    return full_path
+
+
+def make_etag(path, stat):
+    """Для blob'а ETag - хэш содержимого из имени, для прочих файлов - размер и mtime"""
+    if is_blob(path):
+        return f'"{os.path.splitext(os.path.basename(path))[0]}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    Один диапазон 'bytes=a-b', 'bytes=a-' или 'bytes=-n' -> (start, end) включительно.
+    None - заголовок игнорируется (несколько диапазонов, синтаксическая ошибка) и отдается весь файл.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """If-Range: диапазон отдаем, только если клиент держит ту же версию файла"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def iter_range(full_path, start, length):
+    chunk_size = settings.MEDIA_RANGE_CHUNK_SIZE
+    with open(full_path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Отдает файл из MEDIA_ROOT без чтения в Python: FileResponse передает файл
+    в wsgi.file_wrapper (sendfile у gunicorn/uwsgi), а при MEDIA_ACCEL_REDIRECT_PREFIX
+    отдачу берет на себя nginx. Поддерживает ETag/Last-Modified с ответом 304 и один диапазон байт.
+    """
+    full_path = resolve_media_path(path)
+    stat = os.stat(full_path)
+    etag = make_etag(path, stat)
+    last_modified = int(stat.st_mtime)
+    headers = {'ETag': etag, 'Last-Modified': http_date(last_modified), **cache_headers(path)}
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # Диапазоны и условные запросы к самому файлу nginx обработает сам
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(path)
+        return response
+
+    headers['Accept-Ranges'] = 'bytes'
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and range_applies(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except RangeNotSatisfiable:
+            return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{stat.st_size}'})
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_range(full_path, start, end - start + 1), status=206, content_type=content_type, headers=headers,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,124 @@
+import hashlib
+import logging
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+COUNT_CACHE_TIMEOUT = 5 * 60
+
+
+class KdmCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация по индексированным колонкам.
+
+    Сортировку можно выбрать через ?ordering= (id, created_at, price и т.д.),
+    если такое поле есть у модели. Вью может задать свою сортировку
+    по умолчанию атрибутом cursor_ordering.
+    Общее количество отдается только по запросу (?with_count=true)
+    и берется из кэшированной оценки, а не из COUNT(*) на каждой странице.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+    ordering_query_param = 'ordering'
+    ordering_fields = ('id', 'created_at', 'created_timestamp', 'price')
+    count_query_param = 'with_count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true', 'True'):
+            self.count = get_count_estimate(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering and self._is_valid_ordering(ordering, queryset):
+            return (ordering,)
+        return (getattr(view, 'cursor_ordering', self.ordering),)
+
+    def _is_valid_ordering(self, ordering, queryset):
+        field_name = ordering.lstrip('-')
+        if field_name not in self.ordering_fields:
+            return False
+        try:
+            queryset.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {
+            'type': 'integer',
+            'description': f'Примерное количество записей (только с ?{self.count_query_param}=true)',
+            'example': 123,
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Вернуть примерное общее количество записей',
+            'schema': {'type': 'boolean'},
+        })
+        parameters.append({
+            'name': self.ordering_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Поле сортировки: ' + ', '.join(self.ordering_fields),
+            'schema': {'type': 'string'},
+        })
+        return parameters
+
+
+def get_count_estimate(queryset):
+    """Количество записей из кэша; при промахе - оценка planner'а или COUNT(*)"""
+    queryset = queryset.order_by()
+    try:
+        sql, params = queryset.query.sql_with_params()
+        cache_key = 'pagination_count_' + hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+        count = cache.get(cache_key)
+    except Exception as e:
+        logger.warning('Кэш количества записей недоступен: %s', e)
+        return _estimate_count(queryset)
+
+    if count is None:
+        count = _estimate_count(queryset)
+        try:
+            cache.set(cache_key, count, COUNT_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning('Не удалось сохранить количество записей в кэш: %s', e)
+    return count
+
+
+def _estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    return queryset.count()
@@ -0,0 +1,96 @@
+import logging
+import math
+import time
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from rest_framework.throttling import BaseThrottle
+
+from kdmMarket.redis_queue import run_script
+
+logger = logging.getLogger(__name__)
+
+# Скользящее окно на ZSET для нескольких ключей сразу.
+# KEYS - ключи правил, ARGV: now_ms, member, затем пары limit, window_ms для каждого ключа.
+# Запрос засчитывается во все окна, только если ни одно из них не переполнено.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local member = ARGV[2]
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2 + 1])
+    local window = tonumber(ARGV[i * 2 + 2])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        return {0, i, tonumber(oldest[2]) + window - now}
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, ARGV[i * 2 + 2])
+end
+return {1, 0, 0}
+"""
+
+
+@dataclass
+class RateLimitRule:
+    key: str
+    limit: int
+    window: int  # секунды
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    rule: RateLimitRule = None
+    retry_after: float = None
+
+
+def check_rate_limit(rules):
+    """
+    Атомарно проверяет и засчитывает запрос во все правила за один вызов Redis.
+    Если Redis недоступен, результат зависит от RATE_LIMIT_FAIL_OPEN.
+    """
+    if not rules:
+        return RateLimitResult(True)
+
+    now_ms = int(time.time() * 1000)
+    args = [now_ms, f'{now_ms}-{uuid.uuid4().hex}']
+    for rule in rules:
+        args += [rule.limit, rule.window * 1000]
+
+    try:
+        redis = get_redis_connection('default')
+        allowed, index, retry_after_ms = run_script(
+            redis, SLIDING_WINDOW_SCRIPT, [rule.key for rule in rules], args
+        )
+    except Exception as e:
+        fail_open = getattr(settings, 'RATE_LIMIT_FAIL_OPEN', True)
+        logger.warning(f'Лимитер недоступен ({"пропускаем" if fail_open else "отклоняем"} запрос): {e}')
+        return RateLimitResult(fail_open)
+
+    if allowed:
+        return RateLimitResult(True)
+    return RateLimitResult(False, rules[index - 1], max(retry_after_ms, 0) / 1000)
+
+
+class RedisSlidingWindowThrottle(BaseThrottle):
+    """
+    DRF-throttle поверх check_rate_limit. Наследник определяет get_rules(request, view);
+    при превышении DRF отвечает 429 с заголовком Retry-After.
+    """
+
+    def get_rules(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.result = check_rate_limit(self.get_rules(request, view))
+        return self.result.allowed
+
+    def wait(self):
+        if self.result.retry_after is None:
+            return None
+        return math.ceil(self.result.retry_after)
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+DRAIN_LOCK_TIMEOUT = 5 * 60
+
+_scripts = {}
+
+
+def run_script(redis, source, keys, args):
+    """Lua-скрипт через EVALSHA: регистрируется один раз на соединение и текст скрипта"""
+    script = _scripts.get((id(redis), source))
+    if script is None:
+        script = _scripts[(id(redis), source)] = redis.register_script(source)
+    return script(keys=keys, args=args)
+
+
+@contextmanager
+def drain_lock(lock, timeout=DRAIN_LOCK_TIMEOUT):
+    """
+    Блокировка разбора очереди: отдает True, если взята. Без нее два воркера прочитают одну пачку,
+    обработают ее дважды и срежут LTRIM'ом еще не прочитанные элементы.
+    """
+    acquired = cache.add(lock, 1, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(lock)
+
+
+def drain_queue(queue, lock, handle_batch, batch_size, timeout=DRAIN_LOCK_TIMEOUT):
+    """
+    Разбирает Redis-список пачками под блокировкой. Пачка удаляется из списка только после
+    handle_batch, поэтому при падении воркера она обработается повторно (handle_batch должен быть идемпотентным).
+    Возвращает число разобранных элементов, None - если очередь уже разбирает другой воркер.
+    """
+    with drain_lock(lock, timeout) as acquired:
+        if not acquired:
+            return None
+        redis = get_redis_connection('default')
+        total = 0
+        while True:
+            raw_items = redis.lrange(queue, 0, batch_size - 1)
+            if not raw_items:
+                break
+            handle_batch(raw_items)
+            redis.ltrim(queue, len(raw_items), -1)
+            total += len(raw_items)
+        return total
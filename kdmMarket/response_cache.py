@@ -0,0 +1,149 @@
+import hashlib
+import logging
+from urllib.parse import urlencode
+
+from django.db import transaction
+from django.http import HttpResponse
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from kdmMarket.redis_queue import run_script
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_KEY = 'response_cache_{}_{}'
+RESPONSE_CACHE_TAG = 'response_cache_tag_{}'
+# Поколение сброса: счетчик растет при каждом purge_tags, у тега запоминается поколение его последнего сброса
+RESPONSE_CACHE_GENERATION = 'response_cache_generation'
+RESPONSE_CACHE_TAG_GENERATION = 'response_cache_tag_generation_{}'
+# Запрос не считается дольше этого; затем поколение тега читается как 0
+TAG_GENERATION_TIMEOUT = 60 * 60
+
+# KEYS: ключ ответа, затем N ключей поколений тегов и N ключей тегов;
+# ARGV: поколение на начало запроса, тело, TTL, N.
+# Если какой-то тег сбросили после начала запроса, ответ устарел и не сохраняется (0).
+STORE_SCRIPT = """
+local count = tonumber(ARGV[4])
+local started = tonumber(ARGV[1])
+for i = 2, count + 1 do
+    if tonumber(redis.call('GET', KEYS[i]) or '0') > started then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+for i = count + 2, 2 * count + 1 do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    redis.call('EXPIRE', KEYS[i], ARGV[3])
+end
+return 1
+"""
+
+
+def response_cache_key(prefix, request):
+    """Ключ по хосту (в ответах абсолютные URL), пути и отсортированным query-параметрам"""
+    params = sorted((name, value) for name, values in request.query_params.lists() for value in values)
+    raw = f'{request.get_host()}{request.path}?{urlencode(params)}'
+    return RESPONSE_CACHE_KEY.format(prefix, hashlib.sha1(raw.encode()).hexdigest())
+
+
+def purge_tags(tags):
+    """Удаляет все записи, помеченные хотя бы одним из тегов, и сами теги"""
+    tag_keys = [RESPONSE_CACHE_TAG.format(tag) for tag in set(tags)]
+    if not tag_keys:
+        return 0
+    try:
+        redis = get_redis_connection('default')
+        # Сначала поколение: запрос, начавшийся до сброса, уже не сохранит свой ответ
+        generation = redis.incr(RESPONSE_CACHE_GENERATION)
+        pipe = redis.pipeline()
+        for tag in set(tags):
+            pipe.set(RESPONSE_CACHE_TAG_GENERATION.format(tag), generation, ex=TAG_GENERATION_TIMEOUT)
+        pipe.execute()
+        keys = redis.sunion(tag_keys)
+        redis.delete(*keys, *tag_keys)
+        return len(keys)
+    except Exception as e:
+        logger.warning(f'Не удалось сбросить кэш ответов по тегам {tags}: {e}')
+        return 0
+
+
+def purge_tags_on_commit(tags):
+    # До коммита параллельный запрос успел бы закэшировать еще старые данные
+    tags = list(tags)
+    transaction.on_commit(lambda: purge_tags(tags))
+
+
+class ResponseCacheMixin:
+    """
+    Кэширует JSON ответов list/retrieve в Redis. Попадание отдается готовыми байтами
+    без обращения к ORM и сериализатору. Каждая запись помечается тегами из
+    get_cache_tags(), по ним сигналы сбрасывают ровно затронутые записи (purge_tags).
+    Наследник переопределяет list_uncached/retrieve_uncached, а не list/retrieve.
+    """
+    response_cache_prefix = None
+    response_cache_timeout = 10 * 60
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, self.list_uncached, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, self.retrieve_uncached, *args, **kwargs)
+
+    def list_uncached(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def retrieve_uncached(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_cache_tags(self, data):
+        """Теги записи: '<prefix>_<id>' для каждого объекта и '<prefix>_list' для списков"""
+        tags = [f'{self.response_cache_prefix}_{item["id"]}' for item in self.cached_items(data)]
+        if self.action == 'list':
+            tags.append(f'{self.response_cache_prefix}_list')
+        return tags
+
+    def cached_items(self, data):
+        if isinstance(data, dict):
+            return data['results'] if 'results' in data else [data]
+        return data
+
+    def is_response_cacheable(self, request):
+        # Браузерный API и прочие рендереры отдаем как обычно
+        return request.accepted_renderer.format == 'json'
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key = response_cache_key(self.response_cache_prefix, request)
+        try:
+            redis = get_redis_connection('default')
+            body, generation = redis.mget(key, RESPONSE_CACHE_GENERATION)
+        except Exception as e:
+            logger.warning(f'Кэш ответов недоступен: {e}')
+            return handler(request, *args, **kwargs)
+        if body is not None:
+            response = HttpResponse(body, content_type='application/json')
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        try:
+            tags = sorted(set(self.get_cache_tags(response.data)))
+            run_script(
+                redis,
+                STORE_SCRIPT,
+                [
+                    key,
+                    *(RESPONSE_CACHE_TAG_GENERATION.format(tag) for tag in tags),
+                    *(RESPONSE_CACHE_TAG.format(tag) for tag in tags),
+                ],
+                [int(generation or 0), JSONRenderer().render(response.data), self.response_cache_timeout, len(tags)],
+            )
+        except Exception as e:
+            logger.warning(f'Не удалось сохранить ответ {key} в кэш: {e}')
+        response['X-Cache'] = 'MISS'
+        return response
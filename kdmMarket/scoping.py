@@ -0,0 +1,50 @@
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
+
+
+class UserScopedQuerysetMixin:
+    """
+    Ограничивает queryset вьюсета записями текущего пользователя (персонал видит все).
+    Выборка "мои записи" идет по индексу (user, -created_at) в порядке cursor_ordering.
+    Поле владельца в сериализаторе только для чтения: при создании владельцем
+    становится текущий пользователь, при изменении владелец не меняется.
+    Для дочерних записей (позиции заказа, платежа) задается parent_field: владелец
+    берется у родителя, а писать можно только в своего родителя.
+    """
+    user_field = 'user'
+    parent_field = None
+
+    def get_owner_lookup(self):
+        if self.parent_field:
+            return f'{self.parent_field}__{self.user_field}'
+        return self.user_field
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_staff:
+            return queryset
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(**{self.get_owner_lookup(): user})
+
+    def scope_owner(self, serializer):
+        user = self.request.user
+        if not user.is_authenticated:
+            raise NotAuthenticated()
+        if self.parent_field is None:
+            if serializer.instance is None:
+                serializer.validated_data[self.user_field] = user
+            return
+        if user.is_staff:
+            return
+        parent = serializer.validated_data.get(self.parent_field)
+        if parent is not None and getattr(parent, f'{self.user_field}_id') != user.pk:
+            raise PermissionDenied('Нельзя изменять чужие записи')
+
+    def perform_create(self, serializer):
+        self.scope_owner(serializer)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        self.scope_owner(serializer)
+        super().perform_update(serializer)
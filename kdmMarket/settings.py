@@ -142,6 +142,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Префикс internal-location nginx (например '/protected-media/'): если задан, файл отдает nginx
+# по X-Accel-Redirect, а Django только проверяет путь и условные заголовки
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX')
+# Размер блока при отдаче диапазона байт
+MEDIA_RANGE_CHUNK_SIZE = 64 * 1024
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -150,6 +155,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'user_app.User'
 
 REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'user_app.authentication.CachedJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # или IsAuthenticated, если нужна авторизация
     ],
@@ -164,16 +173,27 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
 
+    'DEFAULT_PAGINATION_CLASS': 'kdmMarket.pagination.KdmCursorPagination',
+    'PAGE_SIZE': 20,
+
+    # Сколько доверенных прокси (nginx) добавляют адрес в X-Forwarded-For: IP клиента для лимитов берется
+    # на столько позиций справа, а левые значения, которые клиент подставляет сам, не учитываются.
+    # 0 - прокси нет, берется REMOTE_ADDR
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
+
 
 }
 
 # smtp-YANDEX+EMAIL connection
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.yandex.ru'
-EMAIL_PORT = 465
+# Для локального SMTP-приемника: EMAIL_HOST=localhost EMAIL_PORT=1025 EMAIL_USE_SSL=false
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.yandex.ru')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 465))
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
-EMAIL_USE_SSL = True
+EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'true').lower() == 'true'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'asadbeklocation@yandex.ru')
 
 
 # CELERY+RabbitMQ(or Redis) connection
@@ -191,6 +211,25 @@ CELERY_TASK_TIME_LIMIT = 300
 
 CELERY_TIMEZONE = 'UTC'  # Или 'Europe/Moscow'
 
+CELERY_BEAT_SCHEDULE = {
+    'process-payment-webhooks': {
+        'task': 'payment_app.tasks.process_payment_webhooks',
+        'schedule': 5.0,
+    },
+    'drain-email-outbox': {
+        'task': 'user_app.tasks.drain_email_outbox',
+        'schedule': 2.0,
+    },
+    'flush-verification-audit': {
+        'task': 'user_app.tasks.flush_verification_audit',
+        'schedule': 10.0,
+    },
+    'delete-expired-verification-codes': {
+        'task': 'user_app.tasks.delete_expired_verification_codes',
+        'schedule': 60 * 60.0,
+    },
+}
+
 # Redis broker and backend
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -207,6 +246,26 @@ CACHES = {
     }
 }
 
+# Платежный провайдер; LocalFakeProvider работает с сервером из run_fake_payment_provider
+PAYMENT_PROVIDER = os.getenv('PAYMENT_PROVIDER', 'payment_app.services.providers.LocalFakeProvider')
+PAYMENT_PROVIDER_URL = os.getenv('PAYMENT_PROVIDER_URL', 'http://localhost:8081')
+PAYMENT_WEBHOOK_SECRET = os.getenv('PAYMENT_WEBHOOK_SECRET', 'local-fake-provider-secret')
+
+# Лимиты отправки кодов подтверждения: (область, количество, окно в секундах)
+VERIFICATION_CODE_RATE_LIMITS = [
+    ('email', 1, 60),
+    ('email', 5, 60 * 60),
+    ('ip', 20, 60 * 60),
+    ('global', 1000, 60),
+]
+# Сколько хранить журнал кодов подтверждения (SMSVerification)
+SMS_VERIFICATION_RETENTION = timedelta(days=1)
+# Пропускать запросы, если Redis лимитера недоступен (False - отклонять)
+RATE_LIMIT_FAIL_OPEN = True
+
+# Сессии в Redis: корзины гостей (carts_app.services.guest_cart) не пишут в основную БД
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+
 # Development-only settings
 CELERY_TASK_ALWAYS_EAGER = True  # True для локального тестирования
 CELERY_TASK_EAGER_PROPAGATES = True
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import tempfile
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOBS_DIR = 'blobs'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранит каждый файл один раз под sha256 содержимого: blobs/ab/cd/<hash><ext>.
+    Хэш считается по мере записи загрузки во временный файл, одинаковые загрузки
+    указывают на один и тот же blob. Файлы не удаляются напрямую: учет ссылок
+    ведет MediaBlob, а удаляет неиспользуемые blob'ы команда gc_media_blobs.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save, суффиксы от коллизий не нужны
+        return name
+
+    def _save(self, name, content):
+        from goods_app.models import MediaBlob
+
+        ext = os.path.splitext(name)[1].lower()
+        blobs_root = self.path(BLOBS_DIR)
+        os.makedirs(blobs_root, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=blobs_root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            hexdigest = digest.hexdigest()
+            final_name = f'{BLOBS_DIR}/{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}{ext}'
+            final_path = self.path(final_name)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        _, created = MediaBlob.objects.get_or_create(name=final_name, defaults={'size': size})
+        if not created:
+            # Повторная загрузка: запись, которая сошлется на blob, еще не закоммичена - сборщик должен подождать
+            MediaBlob.objects.filter(name=final_name).update(last_referenced_at=timezone.now())
+        return final_name
+
+    def delete(self, name):
+        # Blob может использоваться другими записями - удаляет только сборщик мусора
+        if not is_blob(name):
+            super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOBS_DIR}/')
+
+
+def get_content_storage():
+    return content_storage
+
+
+content_storage = ContentAddressedStorage()
+
+
+def _adjust_refcount(names, delta):
+    from goods_app.models import MediaBlob
+
+    counts = Counter(name for name in names if is_blob(name))
+    now = timezone.now()
+    for name, count in counts.items():
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + delta * count, last_referenced_at=now)
+
+
+def retain_blobs(names):
+    _adjust_refcount(names, 1)
+
+
+def release_blobs(names):
+    _adjust_refcount(names, -1)
+
+
+def cache_headers(name):
+    """Blob никогда не меняется под тем же именем - его можно кэшировать навсегда"""
+    if is_blob(name):
+        return {'Cache-Control': IMMUTABLE_CACHE_CONTROL}
+    return {}
@@ -0,0 +1,15 @@
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# Очереди, версии ресурсов и кэш ответов работают напрямую с Redis - в тестах его заменяет fakeredis
+FAKE_REDIS_CACHES = {'default': {
+    'BACKEND': 'django_redis.cache.RedisCache',
+    'LOCATION': 'redis://localhost:6379/15',
+    'OPTIONS': {
+        'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection} if fakeredis else {},
+    },
+}}
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path,include
 from rest_framework import routers
+from kdmMarket.media import serve_media
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from goods_app.urls import router as goods_router
 from carts_app.urls import router as carts_router
@@ -24,6 +26,7 @@ router.registry.extend(user_router.registry)
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/", include(router.urls)),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media, name='media'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     # Optional UI:
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders_app', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_timestamp'], name='order_user_created_idx'),
+        ),
+    ]
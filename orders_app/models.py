@@ -23,6 +23,13 @@ class Order(models.Model):
 
 
     total_price = models.DecimalField(max_digits=10,decimal_places=2,default=0.00)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    class Meta:
+        indexes = [
+            # Заказы пользователя, новые сверху (OrderView.cursor_ordering)
+            models.Index(fields=['user', '-created_timestamp'], name='order_user_created_idx'),
+        ]
 
 ''' 
 class Order(models.Model):
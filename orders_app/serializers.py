@@ -1,4 +1,6 @@
 from rest_framework import serializers
+
+from kdmMarket.expand import ExpandableSerializerMixin
 from orders_app.models import Order, OrderItem
 
 
@@ -6,14 +8,34 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model= Order
         fields = '__all__'
+        # Владельца задает UserScopedQuerysetMixin.scope_owner
+        read_only_fields = ['user']
+
 class OrderUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['status']
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'order': OrderSerializer,
+        'product': 'goods_app.serializers.ProductSerializer',
+    }
+
     class Meta:
         model = OrderItem ##закзанный товар
         fields = '__all__'
 
 
+class CheckoutItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CheckoutSerializer(serializers.ModelSerializer):
+    items = CheckoutItemSerializer(many=True, required=False, allow_empty=False)
+
+    class Meta:
+        model = Order
+        fields = ['items', 'requires_delivery', 'delivery_address', 'pickup_point', 'payment_method']
+        extra_kwargs = {'delivery_address': {'required': False}}
@@ -0,0 +1,85 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from carts_app.models import Cart
+from carts_app.services.cart import invalidate_cart_summary
+from goods_app.models import Product
+from goods_app.services.price_index import compute_final_price
+from orders_app.models import Order, OrderItem
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCartError(CheckoutError):
+    pass
+
+
+class OutOfStockError(CheckoutError):
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f'Недостаточно товара на складе: {self.product_ids}')
+
+
+def checkout(user, items=None, **order_fields):
+    """
+    Оформляет заказ одной транзакцией.
+    items - [{'product': id, 'quantity': n}]; если не передан, берется корзина пользователя.
+    Строки товаров блокируются в порядке id (одинаковый порядок у всех заказов - нет дедлоков),
+    остаток списывается условным UPDATE, цены фиксируются на момент оформления.
+    """
+    from_cart = items is None
+    with transaction.atomic():
+        quantities = defaultdict(int)
+        cart_line_ids = []
+        if from_cart:
+            # Строки корзины блокируются: параллельный checkout ждет и видит уже пустую корзину,
+            # а строка, добавленная во время оформления, не удаляется вместе с оформленными
+            cart_lines = (
+                Cart.objects.select_for_update().filter(user=user).values_list('pk', 'product_id', 'quantity')
+            )
+            for line_id, product_id, quantity in cart_lines:
+                cart_line_ids.append(line_id)
+                quantities[product_id] += quantity
+        else:
+            for item in items:
+                quantities[item['product']] += item['quantity']
+        if not quantities:
+            raise EmptyCartError('Корзина пуста')
+
+        products = list(Product.objects.select_for_update().filter(pk__in=quantities).order_by('pk'))
+        missing = set(quantities) - {product.pk for product in products}
+        short = [product.pk for product in products if product.quantity < quantities[product.pk]]
+        if missing or short:
+            raise OutOfStockError([*missing, *short])
+
+        for product in products:
+            # Строка заблокирована выше - остаток до и после известен, повторно товар не читаем
+            remaining = product.quantity - quantities[product.pk]
+            updated = Product.objects.filter(pk=product.pk, quantity__gte=quantities[product.pk]).update(
+                quantity=F('quantity') - quantities[product.pk], touched={product.pk: (product.quantity, remaining)},
+            )
+            if not updated:
+                raise OutOfStockError([product.pk])
+
+        prices = {product.pk: compute_final_price(product) for product in products}
+        total_price = sum(
+            (Decimal(str(prices[product_id])) * quantity for product_id, quantity in quantities.items()),
+            Decimal('0.00'),
+        ).quantize(Decimal('0.01'))
+
+        order = Order.objects.create(user=user, total_price=total_price, **order_fields)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=quantity, price=prices[product_id])
+            for product_id, quantity in quantities.items()
+        ])
+
+        if from_cart:
+            Cart.objects.filter(pk__in=cart_line_ids).delete()
+            transaction.on_commit(lambda: invalidate_cart_summary(user.pk))
+
+    return order
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from kdmMarket.conditional import bump_versions_on_commit, delete_versions_on_commit
+from .models import Order
+
+
+@receiver(post_save, sender=Order)
+def bump_order_version(sender, instance, **kwargs):
+    bump_versions_on_commit([f'order_{instance.pk}'], instance.updated_at)
+
+
+@receiver(post_delete, sender=Order)
+def delete_order_version(sender, instance, **kwargs):
+    delete_versions_on_commit([f'order_{instance.pk}'])
@@ -1,3 +1,279 @@
-from django.test import TestCase
+import threading
+from unittest import skipUnless
 
-# Create your tests here.
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django_redis import get_redis_connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from carts_app.models import Cart
+from goods_app.models import Product, Category, Brand
+from kdmMarket.testing import FAKE_REDIS_CACHES, LOCMEM_CACHES, fakeredis
+from orders_app.models import Order, OrderItem
+from orders_app.services.checkout import checkout, OutOfStockError
+from user_app.models import User
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderItemExpandQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='buyer@example.com')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(slug='c', name='Категория')
+
+    def create_items(self, count):
+        order = Order.objects.create(user=self.user)
+        for i in range(count):
+            brand = Brand.objects.create(slug=f'b{i}', name=f'Бренд {i}', description='')
+            product = Product.objects.create(
+                name=f'Товар {i}', description='', price=10, category=self.category, brand=brand, image='a.jpg',
+            )
+            OrderItem.objects.create(order=order, product=product, price=10)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_order_items_expand_order_product(self):
+        url = '/api/orderItem/?expand=order,product,brand'
+        self.create_items(2)
+        small, _ = self.count_queries(url)
+        self.create_items(10)
+        large, data = self.count_queries(url)
+
+        self.assertEqual(small, large)
+        item = data['results'][0]
+        self.assertEqual(item['order']['user'], self.user.pk)
+        self.assertIn('name', item['product']['brand'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderScopingTests(TestCase):
+    """Заказы и позиции заказов видны и изменяемы только владельцем"""
+
+    def setUp(self):
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.product = Product.objects.create(
+            name='Товар', description='', price=10, category=category, brand=brand, image='a.jpg',
+        )
+        self.alice = User.objects.create_user(email='alice@example.com')
+        self.bob = User.objects.create_user(email='bob@example.com')
+        self.alice_order = Order.objects.create(user=self.alice)
+        self.alice_item = OrderItem.objects.create(order=self.alice_order, product=self.product, price=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def test_create_order_without_user(self):
+        response = self.client.post('/api/order/', {'delivery_address': 'Москва'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['user'], self.bob.pk)
+
+    def test_create_order_ignores_foreign_user(self):
+        response = self.client.post('/api/order/', {'user': self.alice.pk, 'delivery_address': 'Москва'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get(pk=response.json()['id']).user, self.bob)
+
+    def test_order_items_of_other_user_are_hidden(self):
+        response = self.client.get('/api/orderItem/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()['results'], [])
+        self.assertEqual(self.client.get(f'/api/orderItem/{self.alice_item.pk}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/orderItem/{self.alice_item.pk}/').status_code, 404)
+
+    def test_cannot_add_item_to_foreign_order(self):
+        response = self.client.post('/api/orderItem/', {
+            'order': self.alice_order.pk, 'product': self.product.pk, 'quantity': 1, 'price': 10,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+    def test_anonymous_cannot_write_order_items(self):
+        response = APIClient().post('/api/orderItem/', {
+            'order': self.alice_order.pk, 'product': self.product.pk, 'quantity': 1, 'price': 10,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES)
+class OrderConditionalGetTests(TestCase):
+    """304 отдается только владельцу существующего заказа"""
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.redis.flushdb()
+        self.alice = User.objects.create_user(email='alice@example.com')
+        self.bob = User.objects.create_user(email='bob@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = Order.objects.create(user=self.alice)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def get_etag(self):
+        response = self.client_for(self.alice).get(f'/api/order/{self.order.pk}/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_owner_gets_not_modified(self):
+        etag = self.get_etag()['ETag']
+        response = self.client_for(self.alice).get(
+            f'/api/order/{self.order.pk}/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_changes_etag(self):
+        etag = self.get_etag()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = 'processing'
+            self.order.save()
+        response = self.client_for(self.alice).get(
+            f'/api/order/{self.order.pk}/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_foreign_order_is_not_found(self):
+        first = self.get_etag()
+        for headers in ({'HTTP_IF_NONE_MATCH': first['ETag']}, {'HTTP_IF_MODIFIED_SINCE': first['Last-Modified']}):
+            response = self.client_for(self.bob).get(
+                f'/api/order/{self.order.pk}/', HTTP_ACCEPT='application/json', **headers,
+            )
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn('Last-Modified', response)
+
+    def test_missing_order_is_not_found_and_creates_no_keys(self):
+        keys = set(self.redis.keys('*'))
+        response = self.client_for(self.alice).get(
+            '/api/order/999999/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH='*',
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(set(self.redis.keys('*')), keys)
+
+    def test_deleted_order_is_not_found(self):
+        etag = self.get_etag()['ETag']
+        order_id = self.order.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        response = self.client_for(self.alice).get(
+            f'/api/order/{order_id}/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+def create_catalog_product(quantity, price=10):
+    category, _ = Category.objects.get_or_create(slug='c', defaults={'name': 'Категория'})
+    brand, _ = Brand.objects.get_or_create(slug='b', defaults={'name': 'Бренд', 'description': ''})
+    return Product.objects.create(
+        name='Товар', description='', price=price, quantity=quantity, category=category, brand=brand, image='a.jpg',
+    )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CheckoutTests(TestCase):
+    """Списание остатков при оформлении заказа"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_checkout_does_not_oversell(self):
+        product = create_catalog_product(quantity=3)
+        Cart.objects.create(user=self.user, product=product, quantity=2)
+        self.assertEqual(self.client.post('/api/order/checkout/', {}, format='json').status_code, 201)
+        Cart.objects.create(user=self.user, product=product, quantity=2)
+
+        response = self.client.post('/api/order/checkout/', {}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['products'], [product.pk])
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+    def test_out_of_stock_rolls_back_whole_order(self):
+        available = create_catalog_product(quantity=5)
+        scarce = create_catalog_product(quantity=1)
+        Cart.objects.create(user=self.user, product=available, quantity=2)
+        Cart.objects.create(user=self.user, product=scarce, quantity=2)
+
+        with self.assertRaises(OutOfStockError):
+            checkout(self.user)
+
+        available.refresh_from_db()
+        self.assertEqual(available.quantity, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 2)
+
+    def test_checkout_does_not_reread_locked_products(self):
+        product = create_catalog_product(quantity=5)
+        Cart.objects.create(user=self.user, product=product, quantity=2)
+
+        with CaptureQueriesContext(connection) as queries:
+            checkout(self.user)
+
+        product_selects = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'FROM "goods_app_product"' in query['sql']
+        ]
+        self.assertEqual(len(product_selects), 1)
+
+    def test_checkout_deletes_only_checked_out_lines(self):
+        product = create_catalog_product(quantity=5)
+        Cart.objects.create(user=self.user, product=product, quantity=2)
+        other_user = User.objects.create_user(email='other@example.com')
+        Cart.objects.create(user=other_user, product=product, quantity=1)
+
+        order = checkout(self.user)
+
+        self.assertEqual(list(order.orderitem_set.values_list('product', 'quantity')), [(product.pk, 2)])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertTrue(Cart.objects.filter(user=other_user).exists())
+
+
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Параллельные заказы последней единицы товара: проходит ровно один"""
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        product = create_catalog_product(quantity=1)
+        users = [User.objects.create_user(email=f'buyer{i}@example.com') for i in range(5)]
+        for user in users:
+            Cart.objects.create(user=user, product=product, quantity=1)
+        barrier = threading.Barrier(len(users))
+        results = []
+
+        def run(user):
+            try:
+                barrier.wait()
+                checkout(user)
+                results.append('ok')
+            except OutOfStockError:
+                results.append('out_of_stock')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), ['ok'] + ['out_of_stock'] * (len(users) - 1))
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(Order.objects.count(), 1)
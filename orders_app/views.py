@@ -1,12 +1,18 @@
 from django.shortcuts import render
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.types import OpenApiTypes
-from rest_framework import viewsets
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample, OpenApiResponse
 from rest_framework.response import Response
 
+from kdmMarket.conditional import ConditionalGetMixin
+from kdmMarket.expand import ExpandQuerysetMixin
+from kdmMarket.scoping import UserScopedQuerysetMixin
 from orders_app.models import Order, OrderItem
-from orders_app.serializers import OrderSerializer, OrderItemSerializer, OrderUpdateSerializer
+from orders_app.serializers import OrderSerializer, OrderItemSerializer, OrderUpdateSerializer, CheckoutSerializer
+from orders_app.services.checkout import checkout, EmptyCartError, OutOfStockError
 
 #SWAGGER-OrderView
 @extend_schema_view(
@@ -292,9 +298,6 @@ class OrderItemView(viewsets.ModelViewSet):
 
 
 
-class OrderCreateSerializer:
-    pass
-
 #swagger->OrderView
 
 @extend_schema_view(
@@ -313,7 +316,7 @@ class OrderCreateSerializer:
     ),
     create=extend_schema(
         summary="Создание заказа",
-        request=OrderCreateSerializer,
+        request=OrderSerializer,
         responses={201: OrderSerializer, 400: OpenApiResponse(description="Ошибка валидации")}
     ),
     update=extend_schema(
@@ -331,22 +334,30 @@ class OrderCreateSerializer:
         responses={204: OpenApiResponse(description="Удалено")}
     )
 )
-class OrderView(viewsets.ModelViewSet):
+class OrderView(ConditionalGetMixin, UserScopedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     filterset_fields = ['user', 'status']
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = '-created_timestamp'
+    conditional_per_user = True
+
+    def get_version_resources(self):
+        if self.action == 'retrieve':
+            return [f'order_{self.kwargs[self.lookup_field]}']
+        return None
 
     def get_serializer_class(self):
-        if self.action == 'create':
-            return OrderCreateSerializer
-        elif self.action in ['update', 'partial_update']:
+        if self.action in ['update', 'partial_update']:
             return OrderUpdateSerializer
         return OrderSerializer
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        order = serializer.save()
+        # perform_create подставляет владельцем текущего пользователя
+        self.perform_create(serializer)
+        order = serializer.instance
 
         # Пример логики: отправить уведомление или списать со склада
         # notify_user(order.user)
@@ -354,6 +365,34 @@ class OrderView(viewsets.ModelViewSet):
 
         return Response(OrderSerializer(order).data, status=201)
 
+    @extend_schema(
+        summary="Оформление заказа",
+        description="Создает заказ из корзины пользователя (или из переданного списка items) одной транзакцией: "
+                    "списывает остатки, создает позиции заказа и считает итоговую сумму по текущим ценам.",
+        request=CheckoutSerializer,
+        responses={
+            201: OrderSerializer,
+            400: OpenApiResponse(description="Корзина пуста или некорректные данные"),
+            409: OpenApiResponse(description="Недостаточно товара на складе"),
+        }
+    )
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def checkout(self, request):
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_fields = dict(serializer.validated_data)
+        items = order_fields.pop('items', None)
+
+        try:
+            order = checkout(request.user, items=items, **order_fields)
+        except EmptyCartError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except OutOfStockError as e:
+            return Response({'error': 'Недостаточно товара на складе', 'products': e.product_ids},
+                            status=status.HTTP_409_CONFLICT)
+
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
 
 #swagger->OrderItemView
 
@@ -416,11 +455,13 @@ class OrderView(viewsets.ModelViewSet):
         }
     )
 )
-class OrderItemView(viewsets.ModelViewSet):
+class OrderItemView(UserScopedQuerysetMixin, ExpandQuerysetMixin, viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['order', 'product']
+    permission_classes = [IsAuthenticated]
+    parent_field = 'order'
 #?????????????????????????????????????
 #class Order(models.Model):
 #    user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from payment_app.services.reconcile import run_reconciliation
+
+
+class Command(BaseCommand):
+    help = 'Сверяет платежи с заказами и позициями платежей, расхождения пишет в CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', default='reconcile_report.csv', help='Файл отчета о расхождениях')
+        parser.add_argument('--checkpoint', default='reconcile_checkpoint.json', help='Файл чекпоинта')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--resume', action='store_true', help='Продолжить с последнего чекпоинта')
+
+    def handle(self, *args, **options):
+        def on_progress(state):
+            self.stdout.write(f"{state['pass']}: проверено {state['checked'][state['pass']]}, id <= {state['last_id']}")
+
+        state = run_reconciliation(
+            options['report'], options['checkpoint'],
+            chunk_size=options['chunk_size'], resume=options['resume'], on_progress=on_progress,
+        )
+        checked = ', '.join(f'{name}: {count}' for name, count in state['checked'].items())
+        mismatches = ', '.join(f'{check}: {count}' for check, count in state['mismatches'].items()) or 'нет'
+        self.stdout.write(self.style.SUCCESS(f'Проверено {checked}. Расхождения: {mismatches}'))
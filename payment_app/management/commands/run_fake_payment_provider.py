@@ -0,0 +1,76 @@
+import json
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payment_app.services.providers import SIGNATURE_HEADER, TIMESTAMP_HEADER, sign
+
+
+class Command(BaseCommand):
+    help = 'Запускает локальную заглушку платежного провайдера, которая присылает подписанные уведомления'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--delay', type=float, default=1.0, help='Через сколько секунд отправить уведомление')
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Доля неуспешных платежей (0..1)')
+        parser.add_argument('--duplicates', type=int, default=1, help='Сколько раз повторить каждое уведомление')
+
+    def handle(self, *args, **options):
+        secret = settings.PAYMENT_WEBHOOK_SECRET
+        command = self
+
+        def send_webhook(payment):
+            if random.random() < options['fail_rate']:
+                event = {'status': 'failed', 'error': 'Платеж отклонен банком'}
+            else:
+                event = {'status': 'succeeded'}
+            event.update(event_id=uuid.uuid4().hex, transition_id=payment['transition_id'])
+            body = json.dumps(event).encode()
+
+            time.sleep(options['delay'])
+            for _ in range(options['duplicates']):
+                timestamp = str(int(time.time()))
+                request = urllib.request.Request(payment['webhook_url'], data=body, method='POST', headers={
+                    'Content-Type': 'application/json',
+                    SIGNATURE_HEADER: sign(secret, timestamp, body),
+                    TIMESTAMP_HEADER: timestamp,
+                })
+                try:
+                    with urllib.request.urlopen(request, timeout=5) as response:
+                        command.stdout.write(f"{payment['transition_id']}: {event['status']} -> {response.status}")
+                except OSError as e:
+                    command.stderr.write(f"{payment['transition_id']}: не удалось доставить уведомление: {e}")
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != '/payments':
+                    self.send_error(404)
+                    return
+                payment = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                threading.Thread(target=send_webhook, args=(payment,), daemon=True).start()
+
+                body = json.dumps({'id': uuid.uuid4().hex, 'status': 'pending'}).encode()
+                self.send_response(201)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(self.style.SUCCESS(f"Заглушка провайдера: http://{options['host']}:{options['port']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -41,6 +41,12 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add = True)
     updated_at = models.DateTimeField(auto_now=True,verbose_name ="Обновлено")
 
+    class Meta:
+        indexes = [
+            # Платежи пользователя, новые сверху (PaymentView.cursor_ordering)
+            models.Index(fields=['user', '-created_at'], name='payment_user_created_idx'),
+        ]
+
 
 class PaymentItem(models.Model):
     payment= models.ForeignKey(Payment,on_delete=models.CASCADE,verbose_name ="Платеж")
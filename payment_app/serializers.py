@@ -1,16 +1,47 @@
 from rest_framework import serializers
+
+from kdmMarket.expand import ExpandableSerializerMixin
 from .models import Payment
 from .models import PaymentItem
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'order': 'orders_app.serializers.OrderSerializer',
+    }
+
     class Meta:
         model = Payment
         fields ='__all__'
+        # Владельца задает UserScopedQuerysetMixin.scope_owner
+        read_only_fields = ['user']
+
 
 
+class PaymentItemSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'payment': PaymentSerializer,
+        'product': 'goods_app.serializers.ProductSerializer',
+    }
+
+    class Meta:
+        model = PaymentItem
+        fields = '__all__'
 
-class PaymentItemSerializer(serializers.ModelSerializer):
+class PaymentBulkItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = PaymentItem
-        fields = '__all__'
\ No newline at end of file
+        fields = ['id', 'product', 'quantity', 'total_price']
+
+
+class PaymentBulkSerializer(serializers.ModelSerializer):
+    """Платеж вместе со всеми позициями одним запросом"""
+    items = PaymentBulkItemSerializer(many=True, source='paymentitem_set')
+
+    class Meta:
+        model = Payment
+        fields = ['id', 'transition_id', 'user', 'order', 'amount', 'payment_method', 'currency',
+                  'status', 'is_paid', 'items']
+        read_only_fields = ['user', 'status', 'is_paid']
+        # Повтор с тем же transition_id обрабатывается как идемпотентный, а не как ошибка валидации
+        extra_kwargs = {'transition_id': {'validators': []}}
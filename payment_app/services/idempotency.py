@@ -0,0 +1,72 @@
+import functools
+import logging
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TIMEOUT = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def get_idempotency_key(request):
+    """Ключ из заголовка Idempotency-Key, иначе transition_id из тела запроса"""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key and hasattr(request.data, 'get'):
+        key = request.data.get('transition_id')
+    return str(key) if key else None
+
+
+def idempotency_cache_key(scope, request, key):
+    user_id = request.user.pk if request.user.is_authenticated else 'anon'
+    return f'idempotency_{scope}_{user_id}_{key}'
+
+
+def idempotent(scope):
+    """
+    Декоратор для POST-методов ViewSet: успешный ответ кэшируется по ключу идемпотентности,
+    повтор с тем же ключом отдается из кэша без обращения к БД.
+    Пока первый запрос выполняется, параллельный повтор получает 409.
+    Если кэш недоступен, запрос выполняется как обычно.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = get_idempotency_key(request)
+            if not key:
+                return method(self, request, *args, **kwargs)
+
+            cache_key = idempotency_cache_key(scope, request, key)
+            lock_key = f'{cache_key}_lock'
+            try:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    response = Response(cached['data'], status=cached['status'])
+                    response['Idempotent-Replayed'] = 'true'
+                    return response
+                if not cache.add(lock_key, 1, IDEMPOTENCY_LOCK_TIMEOUT):
+                    return Response({'error': 'Запрос с этим ключом уже обрабатывается'},
+                                    status=status.HTTP_409_CONFLICT)
+            except Exception as e:
+                logger.warning(f'Кэш идемпотентности недоступен: {e}')
+                return method(self, request, *args, **kwargs)
+
+            try:
+                response = method(self, request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    try:
+                        cache.set(cache_key, {'status': response.status_code, 'data': response.data},
+                                  IDEMPOTENCY_TIMEOUT)
+                    except Exception as e:
+                        logger.warning(f'Не удалось сохранить ответ {cache_key}: {e}')
+                return response
+            finally:
+                try:
+                    cache.delete(lock_key)
+                except Exception as e:
+                    logger.warning(f'Не удалось снять блокировку {lock_key}: {e}')
+        return wrapper
+    return decorator
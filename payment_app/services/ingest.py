@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from orders_app.models import Order
+from payment_app.models import Payment, PaymentItem
+
+
+class PaymentValidationError(Exception):
+    pass
+
+
+class PaymentConflictError(Exception):
+    """transition_id уже занят платежом другого пользователя"""
+
+
+def get_order_for_payment(order_id):
+    """Заказ вместе с уже оплаченной суммой (без неуспешных платежей) - одним запросом"""
+    paid = (
+        Payment.objects.filter(order=OuterRef('pk')).exclude(status='failed')
+        .values('order').annotate(total=Sum('amount')).values('total')
+    )
+    return (
+        Order.objects.filter(pk=order_id)
+        .annotate(already_paid=Coalesce(Subquery(paid), Value(Decimal('0')),
+                                        output_field=DecimalField(max_digits=10, decimal_places=2)))
+        .first()
+    )
+
+
+def validate_payment_amounts(order, user, amount, items):
+    if order is None:
+        raise PaymentValidationError('Заказ не найден')
+    if order.user_id != user.pk:
+        raise PaymentValidationError('Заказ принадлежит другому пользователю')
+    items_total = sum((item['total_price'] for item in items), Decimal('0'))
+    if items and items_total != amount:
+        raise PaymentValidationError(f'Сумма позиций ({items_total}) не совпадает с суммой платежа ({amount})')
+    if order.already_paid + amount > order.total_price:
+        raise PaymentValidationError(
+            f'Сумма платежа превышает остаток по заказу ({order.total_price - order.already_paid})'
+        )
+
+
+def create_payment_with_items(items, **payment_fields):
+    """
+    Создает платеж и все его позиции: один INSERT платежа и один bulk_create позиций.
+    Возвращает (payment, created); при повторе с тем же transition_id - уже существующий платеж
+    этого пользователя, для чужого transition_id - PaymentConflictError.
+    """
+    order = get_order_for_payment(payment_fields['order'].pk)
+    validate_payment_amounts(order, payment_fields['user'], payment_fields['amount'], items)
+
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(**payment_fields)
+            PaymentItem.objects.bulk_create([PaymentItem(payment=payment, **item) for item in items])
+    except IntegrityError:
+        payment = Payment.objects.filter(transition_id=payment_fields['transition_id']).first()
+        if payment is None:
+            raise
+        # Повтором считается только свой платеж - чужой по transition_id не отдаем
+        if payment.user_id != payment_fields['user'].pk:
+            raise PaymentConflictError('Платеж с таким transition_id уже существует')
+        return payment, False
+    return payment, True
@@ -0,0 +1,93 @@
+import hashlib
+import hmac
+import json
+import time
+import urllib.request
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SIGNATURE_HEADER = 'X-Signature'
+TIMESTAMP_HEADER = 'X-Signature-Timestamp'
+
+# Статус события провайдера -> (Payment.status, Payment.is_paid)
+PAYMENT_STATUSES = {
+    'succeeded': ('paid', True),
+    'failed': ('failed', False),
+    'canceled': ('canceled', False),
+}
+
+
+class ProviderError(Exception):
+    pass
+
+
+class InvalidSignature(ProviderError):
+    pass
+
+
+class PaymentProvider:
+    """
+    Интерфейс платежного провайдера.
+    create_payment регистрирует платеж у провайдера, verify_webhook проверяет подпись
+    входящего уведомления и возвращает событие {'event_id', 'transition_id', 'status', 'error'}.
+    """
+
+    def create_payment(self, payment, webhook_url):
+        raise NotImplementedError
+
+    def verify_webhook(self, body, headers):
+        raise NotImplementedError
+
+
+def sign(secret, timestamp, body):
+    message = f'{timestamp}.'.encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class LocalFakeProvider(PaymentProvider):
+    """
+    Заглушка провайдера для локальной разработки и нагрузочных прогонов,
+    сервер поднимается командой run_fake_payment_provider.
+    Уведомления подписываются HMAC-SHA256 от "timestamp.body" общим секретом.
+    """
+    tolerance = 5 * 60
+
+    def __init__(self, url=None, secret=None):
+        self.url = (url or settings.PAYMENT_PROVIDER_URL).rstrip('/')
+        self.secret = secret or settings.PAYMENT_WEBHOOK_SECRET
+
+    def create_payment(self, payment, webhook_url):
+        body = json.dumps({
+            'transition_id': payment.transition_id,
+            'amount': str(payment.amount),
+            'currency': payment.currency,
+            'webhook_url': webhook_url,
+        }).encode()
+        request = urllib.request.Request(
+            f'{self.url}/payments', data=body, method='POST', headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return json.loads(response.read())
+        except OSError as e:
+            raise ProviderError(f'Провайдер недоступен: {e}') from e
+
+    def verify_webhook(self, body, headers):
+        signature = headers.get(SIGNATURE_HEADER, '')
+        timestamp = headers.get(TIMESTAMP_HEADER, '')
+        if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > self.tolerance:
+            raise InvalidSignature('Устаревшая или отсутствующая метка времени')
+        if not hmac.compare_digest(sign(self.secret, timestamp, body), signature):
+            raise InvalidSignature('Неверная подпись')
+        try:
+            event = json.loads(body)
+        except ValueError as e:
+            raise InvalidSignature('Некорректное тело уведомления') from e
+        if event.get('status') not in PAYMENT_STATUSES or not event.get('transition_id'):
+            raise InvalidSignature('Неизвестное событие')
+        return event
+
+
+def get_provider():
+    return import_string(settings.PAYMENT_PROVIDER)()
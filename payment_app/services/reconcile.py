@@ -0,0 +1,178 @@
+import csv
+import json
+import os
+from decimal import Decimal
+
+from orders_app.models import Order
+from payment_app.models import Payment, PaymentItem
+
+REPORT_FIELDS = ['check', 'order_id', 'payment_id', 'expected', 'actual', 'detail']
+
+
+def amount_cap():
+    """Максимальная сумма, которая помещается в Payment.amount (для max_digits=6 - 9999.99)"""
+    field = Payment._meta.get_field('amount')
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+
+def stream(queryset, chunk_size):
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def group_by(rows, key):
+    """Группирует отсортированный поток по ключу, не держа в памяти больше одной группы"""
+    group, current = [], None
+    for row in rows:
+        if group and row[key] != current:
+            yield current, group
+            group = []
+        current = row[key]
+        group.append(row)
+    if group:
+        yield current, group
+
+
+def merge(left, right_groups, key):
+    """Merge join двух потоков, отсортированных по одному ключу: (строка слева, группа справа или [])"""
+    right = next(right_groups, None)
+    for row in left:
+        while right is not None and right[0] < row[key]:
+            right = next(right_groups, None)
+        if right is not None and right[0] == row[key]:
+            yield row, right[1]
+            right = next(right_groups, None)
+        else:
+            yield row, []
+
+
+def reconcile_orders(after_id, chunk_size, cap):
+    """Проход A: заказы и их платежи, упорядоченные по order_id"""
+    orders = stream(
+        Order.objects.filter(pk__gt=after_id).order_by('pk').values('pk', 'total_price', 'is_paid'), chunk_size
+    )
+    payments = stream(
+        Payment.objects.filter(order_id__gt=after_id).order_by('order_id', 'pk')
+        .values('pk', 'order_id', 'amount', 'is_paid'),
+        chunk_size,
+    )
+    for order, order_payments in merge(orders, group_by(payments, 'order_id'), 'pk'):
+        mismatches = []
+        paid = sum((payment['amount'] for payment in order_payments if payment['is_paid']), Decimal('0'))
+        if paid > order['total_price']:
+            mismatches.append(('overpaid', None, order['total_price'], paid, ''))
+        if order['is_paid'] and paid < order['total_price']:
+            mismatches.append(('marked_paid_underpaid', None, order['total_price'], paid, ''))
+        if not order['is_paid'] and order_payments and paid >= order['total_price']:
+            mismatches.append(('paid_not_marked', None, order['total_price'], paid, ''))
+        for payment in order_payments:
+            if payment['amount'] >= cap:
+                mismatches.append(('amount_at_cap', payment['pk'], cap, payment['amount'],
+                                   'сумма упирается в max_digits поля Payment.amount'))
+        yield order['pk'], [
+            {'check': check, 'order_id': order['pk'], 'payment_id': payment_id,
+             'expected': expected, 'actual': actual, 'detail': detail}
+            for check, payment_id, expected, actual, detail in mismatches
+        ]
+
+
+def reconcile_payments(after_id, chunk_size, cap):
+    """Проход B: платежи и их позиции, упорядоченные по payment_id"""
+    payments = stream(
+        Payment.objects.filter(pk__gt=after_id).order_by('pk').values('pk', 'order_id', 'amount'), chunk_size
+    )
+    items = stream(
+        PaymentItem.objects.filter(payment_id__gt=after_id).order_by('payment_id', 'pk')
+        .values('payment_id', 'total_price'),
+        chunk_size,
+    )
+    for payment, payment_items in merge(payments, group_by(items, 'payment_id'), 'pk'):
+        mismatches = []
+        if payment_items:
+            items_total = sum((item['total_price'] for item in payment_items), Decimal('0'))
+            if items_total != payment['amount']:
+                detail = 'сумма позиций больше лимита поля amount' if items_total > cap else ''
+                mismatches.append({'check': 'items_total_mismatch', 'order_id': payment['order_id'],
+                                   'payment_id': payment['pk'], 'expected': items_total,
+                                   'actual': payment['amount'], 'detail': detail})
+        yield payment['pk'], mismatches
+
+
+PASSES = [
+    ('orders', reconcile_orders),
+    ('payments', reconcile_payments),
+]
+
+
+class Checkpoint:
+    """Состояние сверки в JSON-файле: текущий проход, последний обработанный id и счетчики"""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {'pass': PASSES[0][0], 'last_id': 0, 'checked': {}, 'mismatches': {}}
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            self.state = json.load(f)
+
+    def save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def run_reconciliation(report_path, checkpoint_path, chunk_size=2000, resume=False, on_progress=None):
+    """
+    Проходы выполняются по очереди, каждый - потоковый merge join по id.
+    Отчет дописывается и чекпоинт сохраняется раз в chunk_size записей,
+    поэтому прерванную сверку можно продолжить с resume=True. Чекпоинт хранит
+    длину отчета: строки, записанные после него, при продолжении отрезаются
+    и пишутся заново, без дублей.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    if resume and os.path.exists(checkpoint_path):
+        checkpoint.load()
+        if checkpoint.state['pass'] == 'done':
+            return checkpoint.state
+    else:
+        resume = False
+    cap = amount_cap()
+
+    with open(report_path, 'r+' if resume else 'w', newline='', encoding='utf-8') as report:
+        writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS)
+        if resume:
+            # Строки, дописанные после последнего чекпоинта, будут записаны заново
+            report.seek(checkpoint.state['report_offset'])
+            report.truncate()
+        else:
+            writer.writeheader()
+
+        def save_checkpoint():
+            report.flush()
+            checkpoint.state['report_offset'] = report.tell()
+            checkpoint.save()
+
+        pass_names = [name for name, _ in PASSES]
+        for name, reconcile in PASSES[pass_names.index(checkpoint.state['pass']):]:
+            if checkpoint.state['pass'] != name:
+                checkpoint.state.update({'pass': name, 'last_id': 0})
+            state = checkpoint.state
+            state['checked'].setdefault(name, 0)
+
+            processed = 0
+            for last_id, mismatches in reconcile(state['last_id'], chunk_size, cap):
+                writer.writerows(mismatches)
+                for mismatch in mismatches:
+                    state['mismatches'][mismatch['check']] = state['mismatches'].get(mismatch['check'], 0) + 1
+                state['last_id'] = last_id
+                state['checked'][name] += 1
+                processed += 1
+                if processed % chunk_size == 0:
+                    save_checkpoint()
+                    if on_progress:
+                        on_progress(state)
+            save_checkpoint()
+
+        checkpoint.state['pass'] = 'done'
+        save_checkpoint()
+    return checkpoint.state
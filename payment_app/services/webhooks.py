@@ -0,0 +1,101 @@
+import json
+import logging
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from kdmMarket.conditional import bump_versions_on_commit
+from kdmMarket.redis_queue import drain_queue
+from orders_app.models import Order
+from payment_app.models import Payment
+from payment_app.services.providers import PAYMENT_STATUSES
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_QUEUE = 'payment_webhooks'
+WEBHOOK_DEAD_LETTER = 'payment_webhooks_dead'
+WEBHOOK_LOCK = 'payment_webhooks_lock'
+WEBHOOK_BATCH_SIZE = 500
+# Финальные статусы не перезаписываются поздними или повторными уведомлениями
+FINAL_STATUSES = {'paid', 'canceled'}
+
+
+def enqueue_webhook_event(event):
+    get_redis_connection('default').rpush(WEBHOOK_QUEUE, json.dumps(event))
+
+
+def apply_events(events):
+    """
+    Применяет пачку событий: по каждому transition_id берется последнее событие (но не после финального),
+    платежи обновляются одним bulk_update, заказы, оплаченные полностью, - одним UPDATE.
+    """
+    latest = {}
+    for event in events:
+        previous = latest.get(event['transition_id'])
+        if previous is None or PAYMENT_STATUSES[previous['status']][0] not in FINAL_STATUSES:
+            latest[event['transition_id']] = event
+    now = timezone.now()
+
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update().filter(transition_id__in=latest).order_by('pk')
+        )
+        changed = []
+        for payment in payments:
+            if payment.status in FINAL_STATUSES:
+                continue
+            event = latest[payment.transition_id]
+            payment.status, payment.is_paid = PAYMENT_STATUSES[event['status']]
+            payment.transition_error = event.get('error') or None
+            payment.updated_at = now
+            changed.append(payment)
+        Payment.objects.bulk_update(changed, ['status', 'is_paid', 'transition_error', 'updated_at'])
+
+        paid_order_ids = {payment.order_id for payment in changed if payment.is_paid}
+        paid = (
+            Payment.objects.filter(order=OuterRef('pk'), is_paid=True)
+            .values('order').annotate(total=Sum('amount')).values('total')
+        )
+        orders = (
+            Order.objects.filter(pk__in=paid_order_ids, is_paid=False)
+            .annotate(paid=Coalesce(Subquery(paid), Value(0),
+                                    output_field=DecimalField(max_digits=10, decimal_places=2)))
+            .filter(paid__gte=F('total_price'))
+        )
+        paid_orders = list(orders.values_list('pk', flat=True))
+        orders_paid = Order.objects.filter(pk__in=paid_orders).update(is_paid=True, status='paid', updated_at=now)
+        # update() не вызывает сигналы save - версии заказов для ETag обновляем сами
+        bump_versions_on_commit([f'order_{pk}' for pk in paid_orders], now)
+
+    unknown = set(latest) - {payment.transition_id for payment in payments}
+    if unknown:
+        logger.warning(f'Уведомления по неизвестным платежам: {sorted(unknown)}')
+    return {'payments': len(changed), 'orders': orders_paid}
+
+
+def process_webhook_queue(batch_size=WEBHOOK_BATCH_SIZE):
+    """Разбирает очередь пачками, некорректные уведомления уходят в dead letter"""
+    totals = {'events': 0, 'payments': 0, 'orders': 0}
+
+    def handle_batch(raw_events):
+        redis = get_redis_connection('default')
+        events = []
+        for raw in raw_events:
+            try:
+                event = json.loads(raw)
+                if event.get('status') not in PAYMENT_STATUSES:
+                    raise ValueError(event.get('status'))
+                events.append(event)
+            except (ValueError, AttributeError) as e:
+                logger.error(f'Некорректное уведомление {raw!r}: {e}')
+                redis.rpush(WEBHOOK_DEAD_LETTER, raw)
+        if events:
+            result = apply_events(events)
+            totals['payments'] += result['payments']
+            totals['orders'] += result['orders']
+
+    totals['events'] = drain_queue(WEBHOOK_QUEUE, WEBHOOK_LOCK, handle_batch, batch_size) or 0
+    return totals
@@ -0,0 +1,16 @@
+import logging
+
+from celery import shared_task
+
+from payment_app.services.webhooks import process_webhook_queue
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_payment_webhooks():
+    totals = process_webhook_queue()
+    if totals['events']:
+        logger.info(f"Обработано уведомлений: {totals['events']}, платежей: {totals['payments']}, "
+                    f"заказов оплачено: {totals['orders']}")
+    return totals
@@ -1,3 +1,199 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+
+from goods_app.models import Product, Category, Brand
+from kdmMarket.testing import FAKE_REDIS_CACHES, LOCMEM_CACHES, fakeredis
+from orders_app.models import Order
+from payment_app.models import Payment, PaymentItem
+from payment_app.services.providers import sign
+from payment_app.services.reconcile import run_reconciliation
+from payment_app.services.webhooks import WEBHOOK_DEAD_LETTER, WEBHOOK_QUEUE, apply_events, process_webhook_queue
+from user_app.models import User
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PaymentReplayTests(TestCase):
+    """Повтор платежа по transition_id/Idempotency-Key и чужие transition_id"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='c', name='Категория')
+        brand = Brand.objects.create(slug='b', name='Бренд', description='')
+        self.product = Product.objects.create(
+            name='Товар', description='', price=50, category=category, brand=brand, image='a.jpg',
+        )
+        self.alice = User.objects.create_user(email='alice@example.com')
+        self.bob = User.objects.create_user(email='bob@example.com')
+        self.alice_order = Order.objects.create(user=self.alice, total_price=Decimal('100.00'))
+        self.bob_order = Order.objects.create(user=self.bob, total_price=Decimal('100.00'))
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def bulk_payload(self, order, transition_id='tx-1'):
+        return {
+            'transition_id': transition_id,
+            'user': order.user_id,
+            'order': order.pk,
+            'amount': '100.00',
+            'items': [{'product': self.product.pk, 'quantity': 2, 'total_price': '100.00'}],
+        }
+
+    def test_bulk_replay_returns_same_payment(self):
+        client = self.client_for(self.alice)
+        first = client.post('/api/payment/bulk/', self.bulk_payload(self.alice_order), format='json')
+        # Без кэша идемпотентности повтор находится в БД по transition_id
+        cache.clear()
+        second = client.post('/api/payment/bulk/', self.bulk_payload(self.alice_order), format='json')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(PaymentItem.objects.count(), 1)
+
+    def test_idempotency_key_replays_cached_response(self):
+        client = self.client_for(self.alice)
+        payload = self.bulk_payload(self.alice_order)
+        first = client.post('/api/payment/bulk/', payload, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        second = client.post('/api/payment/bulk/', payload, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(first.json(), second.json())
+
+    def test_foreign_transition_id_is_conflict(self):
+        self.client_for(self.alice).post('/api/payment/bulk/', self.bulk_payload(self.alice_order), format='json')
+
+        response = self.client_for(self.bob).post(
+            '/api/payment/bulk/', self.bulk_payload(self.bob_order), format='json',
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn('items', response.json())
+        self.assertFalse(Payment.objects.filter(user=self.bob).exists())
+
+    def test_foreign_transition_id_not_replayed_by_create(self):
+        self.client_for(self.alice).post('/api/payment/bulk/', self.bulk_payload(self.alice_order), format='json')
+        payload = self.bulk_payload(self.bob_order)
+        payload.pop('items')
+
+        response = self.client_for(self.bob).post('/api/payment/', payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Payment.objects.get().user, self.alice)
+
+
+# Сигналы заказов обновляют версии ресурсов в Redis
+@override_settings(CACHES=FAKE_REDIS_CACHES)
+class ReconciliationResumeTests(TestCase):
+    """Продолжение сверки с чекпоинта не дублирует строки отчета"""
+
+    class Interrupted(Exception):
+        pass
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        user = User.objects.create_user(email='buyer@example.com')
+        for _ in range(3):
+            Order.objects.create(user=user, total_price=Decimal('100.00'), is_paid=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read(self, name):
+        with open(self.path(name), encoding='utf-8') as f:
+            return f.read()
+
+    def interrupt(self, state):
+        raise self.Interrupted
+
+    def test_resume_truncates_rows_after_checkpoint(self):
+        run_reconciliation(self.path('full.csv'), self.path('full.json'), chunk_size=1)
+
+        with self.assertRaises(self.Interrupted):
+            run_reconciliation(self.path('report.csv'), self.path('report.json'), chunk_size=1,
+                               on_progress=self.interrupt)
+        # Строка, записанная после чекпоинта до падения
+        with open(self.path('report.csv'), 'a', encoding='utf-8') as f:
+            f.write('marked_paid_underpaid,0,,100.00,0,\r\n')
+        state = run_reconciliation(self.path('report.csv'), self.path('report.json'), chunk_size=1, resume=True)
+
+        self.assertEqual(self.read('report.csv'), self.read('full.csv'))
+        self.assertEqual(state['mismatches'], {'marked_paid_underpaid': 3})
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES, PAYMENT_WEBHOOK_SECRET='test-secret')
+class PaymentWebhookTests(TestCase):
+    """Уведомления провайдера: проверка подписи, очередь и применение пачкой"""
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.redis.flushdb()
+        user = User.objects.create_user(email='buyer@example.com')
+        self.order = Order.objects.create(user=user, total_price=Decimal('100.00'))
+        self.payment = Payment.objects.create(
+            transition_id='tx-1', user=user, order=self.order, amount=Decimal('100.00'),
+        )
+
+    def post_event(self, event, secret='test-secret'):
+        body = json.dumps(event).encode()
+        timestamp = str(int(time.time()))
+        return APIClient().post(
+            '/api/payment/webhook/', body, content_type='application/json',
+            HTTP_X_SIGNATURE=sign(secret, timestamp, body), HTTP_X_SIGNATURE_TIMESTAMP=timestamp,
+        )
+
+    def test_bad_signature_is_rejected(self):
+        response = self.post_event({'transition_id': 'tx-1', 'status': 'succeeded'}, secret='wrong')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.redis.llen(WEBHOOK_QUEUE), 0)
+
+    def test_signed_event_is_queued_then_applied(self):
+        response = self.post_event({'event_id': 'e1', 'transition_id': 'tx-1', 'status': 'succeeded'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.redis.llen(WEBHOOK_QUEUE), 1)
+        self.assertEqual(process_webhook_queue(), {'events': 1, 'payments': 1, 'orders': 1})
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.is_paid), ('paid', True))
+        self.assertTrue(self.order.is_paid)
+        self.assertEqual(self.redis.llen(WEBHOOK_QUEUE), 0)
+
+    def test_late_event_does_not_regress_final_status(self):
+        apply_events([
+            {'transition_id': 'tx-1', 'status': 'succeeded'},
+            {'transition_id': 'tx-1', 'status': 'failed'},
+        ])
+        apply_events([{'transition_id': 'tx-1', 'status': 'failed', 'error': 'late'}])
+
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.is_paid), ('paid', True))
+        self.assertIsNone(self.payment.transition_error)
+
+    def test_malformed_event_goes_to_dead_letter(self):
+        self.redis.rpush(WEBHOOK_QUEUE, 'not json', json.dumps({'transition_id': 'tx-1', 'status': 'failed'}))
+
+        with self.assertLogs('payment_app.services.webhooks', 'ERROR'):
+            self.assertEqual(process_webhook_queue()['events'], 2)
+
+        self.assertEqual(self.redis.lrange(WEBHOOK_DEAD_LETTER, 0, -1), [b'not json'])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'failed')
@@ -1,9 +1,24 @@
+import logging
+
+from django.db import IntegrityError, transaction
 from django.shortcuts import render
+from django.urls import reverse
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiResponse, OpenApiExample, extend_schema, extend_schema_view, OpenApiParameter
-from rest_framework import viewsets
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from kdmMarket.expand import ExpandQuerysetMixin
+from kdmMarket.scoping import UserScopedQuerysetMixin
 from payment_app.models import Payment, PaymentItem
-from payment_app.serializers import PaymentSerializer, PaymentItemSerializer
+from payment_app.serializers import PaymentSerializer, PaymentItemSerializer, PaymentBulkSerializer
+from payment_app.services.idempotency import idempotent
+from payment_app.services.ingest import create_payment_with_items, PaymentConflictError, PaymentValidationError
+from payment_app.services.providers import get_provider, InvalidSignature, ProviderError
+from payment_app.services.webhooks import enqueue_webhook_event
+
+logger = logging.getLogger(__name__)
 
 #SWAGGER-PaymentView
 @extend_schema_view(
@@ -34,9 +49,16 @@ from payment_app.serializers import PaymentSerializer, PaymentItemSerializer
     ),
     create=extend_schema(
         summary='Создание платежа',
-        description='Создает новый платеж на основе предоставленных данных.',
+        description='Создает новый платеж на основе предоставленных данных. '
+                    'Повтор с тем же transition_id или заголовком Idempotency-Key возвращает уже созданный платеж.',
+        parameters=[
+            OpenApiParameter(name='Idempotency-Key', location=OpenApiParameter.HEADER, required=False,
+                             description='Ключ идемпотентности (по умолчанию - transition_id)', type=OpenApiTypes.STR),
+        ],
         responses={
             201: PaymentSerializer,
+            200: OpenApiResponse(response=PaymentSerializer, description='Повторный запрос, платеж уже создан'),
+            409: OpenApiResponse(description='Запрос с этим ключом еще обрабатывается'),
             400: OpenApiResponse(description='Ошибка валидации', examples=[
                 OpenApiExample('Ошибка', value={'error': 'Неверные данные при создании'})
             ]),
@@ -77,10 +99,113 @@ from payment_app.serializers import PaymentSerializer, PaymentItemSerializer
         }
     )
 )
-class PaymentView(viewsets.ModelViewSet):
+class PaymentView(UserScopedQuerysetMixin, ExpandQuerysetMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     filterset_fields = ['id', 'user', 'status']
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = '-created_at'
+
+    def get_existing_payment(self, request):
+        transition_id = request.data.get('transition_id')
+        if not transition_id:
+            return None
+        # Только среди платежей текущего пользователя - чужой платеж повтором не получить
+        return self.get_queryset().filter(transition_id=transition_id).first()
+
+    @idempotent('payment')
+    def create(self, request, *args, **kwargs):
+        existing = self.get_existing_payment(request)
+        if existing is not None:
+            return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            # Параллельный повтор успел создать платеж между проверкой и INSERT
+            existing = self.get_existing_payment(request)
+            if existing is None:
+                raise
+            return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary='Создание платежа с позициями',
+        description='Создает платеж и все его позиции одним запросом. Суммы сверяются с заказом, '
+                    'позиции записываются через bulk_create. Запрос идемпотентен по transition_id/Idempotency-Key.',
+        request=PaymentBulkSerializer,
+        responses={
+            201: PaymentBulkSerializer,
+            200: OpenApiResponse(response=PaymentBulkSerializer, description='Повторный запрос, платеж уже создан'),
+            400: OpenApiResponse(description='Ошибка валидации или суммы не сходятся с заказом'),
+            409: OpenApiResponse(description='Запрос с этим ключом еще обрабатывается или transition_id занят'),
+        }
+    )
+    @action(detail=False, methods=['post'])
+    @idempotent('payment_bulk')
+    def bulk(self, request):
+        existing = self.get_existing_payment(request)
+        if existing is not None:
+            return Response(PaymentBulkSerializer(existing).data, status=status.HTTP_200_OK)
+        serializer = PaymentBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.scope_owner(serializer)
+        payment_fields = dict(serializer.validated_data)
+        items = payment_fields.pop('paymentitem_set')
+
+        try:
+            payment, created = create_payment_with_items(items, **payment_fields)
+        except PaymentValidationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PaymentConflictError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        return Response(PaymentBulkSerializer(payment).data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @extend_schema(
+        summary='Оплата через провайдера',
+        description='Регистрирует платеж у платежного провайдера. Итоговый статус придет уведомлением на webhook.',
+        request=None,
+        responses={
+            200: OpenApiResponse(description='Ответ провайдера'),
+            409: OpenApiResponse(description='Платеж уже завершен'),
+            502: OpenApiResponse(description='Провайдер недоступен'),
+        }
+    )
+    @action(detail=True, methods=['post'])
+    def pay(self, request, pk=None):
+        payment = self.get_object()
+        if payment.status != 'pending':
+            return Response({'error': 'Платеж уже завершен'}, status=status.HTTP_409_CONFLICT)
+        try:
+            result = get_provider().create_payment(payment, request.build_absolute_uri(reverse('payment-webhook')))
+        except ProviderError as e:
+            return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response(result)
+
+    @extend_schema(
+        summary='Уведомление платежного провайдера',
+        description='Проверяет подпись и ставит событие в очередь. '
+                    'Статусы платежа и заказа обновляет фоновая задача process_payment_webhooks пачками.',
+        request=None,
+        responses={
+            200: OpenApiResponse(description='Событие принято'),
+            400: OpenApiResponse(description='Неверная подпись или событие'),
+            503: OpenApiResponse(description='Очередь недоступна, провайдер повторит отправку'),
+        }
+    )
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny], authentication_classes=[])
+    def webhook(self, request):
+        try:
+            event = get_provider().verify_webhook(request.body, request.headers)
+        except InvalidSignature as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            enqueue_webhook_event(event)
+        except Exception as e:
+            logger.warning(f'Очередь уведомлений недоступна: {e}')
+            return Response({'error': 'Очередь временно недоступна'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'status': 'queued'})
 
 
 #SWAGGER-PaymentItemView
@@ -93,7 +218,7 @@ class PaymentView(viewsets.ModelViewSet):
             OpenApiParameter(name='id', description='ID элемента платежа', required=False, type=OpenApiTypes.INT),
             OpenApiParameter(name='payment', description='Фильтр по ID платежа', required=False, type=OpenApiTypes.INT),
             OpenApiParameter(name='product', description='Фильтр по ID товара или услуги', required=False, type=OpenApiTypes.INT),
-            OpenApiParameter(name='amount', description='Фильтр по сумме', required=False, type=OpenApiTypes.NUMBER),
+            OpenApiParameter(name='total_price', description='Фильтр по сумме', required=False, type=OpenApiTypes.NUMBER),
         ],
         responses={
             200: PaymentItemSerializer,
@@ -157,10 +282,12 @@ class PaymentView(viewsets.ModelViewSet):
         }
     )
 )
-class PaymentItemView(viewsets.ModelViewSet):
+class PaymentItemView(UserScopedQuerysetMixin, ExpandQuerysetMixin, viewsets.ModelViewSet):
     queryset = PaymentItem.objects.all()
     serializer_class = PaymentItemSerializer
-    filterset_fields = ['id', 'payment', 'product', 'amount']
+    filterset_fields = ['id', 'payment', 'product', 'total_price']
+    permission_classes = [IsAuthenticated]
+    parent_field = 'payment'
 
 
 
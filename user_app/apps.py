@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class UsersAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'user_app'
\ No newline at end of file
+    name = 'user_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
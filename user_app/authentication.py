@@ -0,0 +1,101 @@
+import copy
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TIMEOUT = 5 * 60
+# Локальный кэш процесса не сбрасывается из других процессов, поэтому живет недолго
+LOCAL_CACHE_TIMEOUT = 5
+LOCAL_CACHE_MAX_SIZE = 10000
+TOKEN_VERSION_CLAIM = 'ver'
+
+_local_cache = {}
+_local_lock = threading.Lock()
+
+
+def user_cache_key(user_id, version):
+    return f'jwt_user_{user_id}_{version}'
+
+
+def invalidate_user_cache(user_id, *versions):
+    keys = [user_cache_key(user_id, version) for version in set(versions) if version is not None]
+    with _local_lock:
+        for key in keys:
+            _local_cache.pop(key, None)
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(f'Не удалось сбросить кэш пользователя {user_id}: {e}')
+
+
+class VersionedRefreshToken(RefreshToken):
+    """Refresh/access токены с версией токенов пользователя в claim 'ver'"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без запроса к таблице пользователей на каждый запрос:
+    пользователь берется из кэша процесса (несколько секунд), затем из Redis,
+    и только потом из БД. Ключ включает версию токенов, поэтому revoke_tokens()
+    отзывает все ранее выданные токены.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed('Токен не содержит идентификатор пользователя', code='token_not_valid')
+        version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        key = user_cache_key(user_id, version)
+
+        now = time.monotonic()
+        with _local_lock:
+            entry = _local_cache.get(key)
+        if entry is not None and entry[0] > now:
+            return copy.copy(entry[1])
+
+        try:
+            user = cache.get(key)
+        except Exception as e:
+            logger.warning(f'Кэш пользователей недоступен: {e}')
+            user = None
+
+        if user is None:
+            user = self.get_user_from_db(user_id, version)
+            try:
+                cache.set(key, user, USER_CACHE_TIMEOUT)
+            except Exception as e:
+                logger.warning(f'Кэш пользователей недоступен: {e}')
+
+        with _local_lock:
+            if len(_local_cache) >= LOCAL_CACHE_MAX_SIZE:
+                _local_cache.clear()
+            _local_cache[key] = (now + LOCAL_CACHE_TIMEOUT, user)
+        return copy.copy(user)
+
+    def get_user_from_db(self, user_id, version):
+        try:
+            user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed('Пользователь не найден', code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed('Пользователь неактивен', code='user_inactive')
+        if user.token_version != version:
+            raise AuthenticationFailed('Токен отозван', code='token_revoked')
+        return user
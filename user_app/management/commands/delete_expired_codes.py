@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from user_app.services.cleanup_codes import delete_expired_codes
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные коды подтверждения (SMSVerification) порциями по первичному ключу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--older-than-hours', type=float, default=None,
+                            help='По умолчанию - SMS_VERIFICATION_RETENTION')
+        parser.add_argument('--pause', type=float, default=0.0, help='Пауза между порциями, секунды')
+
+    def handle(self, *args, **options):
+        retention = timedelta(hours=options['older_than_hours']) if options['older_than_hours'] else None
+        stats = delete_expired_codes(options['chunk_size'], retention, options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Удалено {stats['deleted']} записей за {stats['duration_s']} с "
+            f"({stats['chunks']} порций, {stats['rows_per_s']} строк/с)"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user_app.services.mailer import get_email_metrics
+
+
+class Command(BaseCommand):
+    help = 'Показывает очередь писем и счетчики отправки (sent/failed/retried/dead, средняя задержка)'
+
+    def handle(self, *args, **options):
+        for name, value in sorted(get_email_metrics().items()):
+            self.stdout.write(f'{name}: {value}')
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='smsverification',
+            index=models.Index(fields=['created_at'], name='smsverification_created_idx'),
+        ),
+    ]
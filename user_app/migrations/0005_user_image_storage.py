@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:17
+
+import kdmMarket.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_app', '0004_user_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=kdmMarket.storage.get_content_storage, upload_to='user_image/'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_app', '0005_user_image_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='smsverification',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
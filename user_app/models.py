@@ -4,6 +4,8 @@ from django.utils import timezone
 from datetime import timedelta
 from django.utils.translation import gettext_lazy as _
 
+from kdmMarket.storage import get_content_storage
+
 
 class UserManager(BaseUserManager):
     def create_user(self, email=None, password=None):
@@ -30,8 +32,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True, verbose_name=_('Email'))
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
-    image = models.ImageField(upload_to='user_image/', blank=True, null=True)
+    image = models.ImageField(upload_to='user_image/', storage=get_content_storage, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name=_('Превью изображения'))
     username = models.CharField(max_length=210, blank=True, null=True)
+    # Версия токенов: увеличение отзывает все выданные JWT пользователя
+    token_version = models.PositiveIntegerField(default=0, verbose_name=_('Версия токенов'))
 
     USERNAME_FIELD = 'email'  # Основное поле для входа - phone_number
     REQUIRED_FIELDS = []  # Нет обязательных дополнительных полей
@@ -41,6 +46,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return str(self.email)
 
+    def revoke_tokens(self):
+        self.token_version += 1
+        self.save(update_fields=['token_version'])
+
     class Meta:
         indexes = [
             # models.Index(fields=['phone_number']),
@@ -53,7 +62,8 @@ class SMSVerification(models.Model):
     email = models.EmailField(verbose_name=_('Email'))
     code = models.CharField(max_length=4)
     is_used = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Не auto_now_add: журнал пишется пачками, время берется из события
+    created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f'Пользователь: {self.email}, Код: {self.code}'
@@ -67,6 +77,8 @@ class SMSVerification(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['email', 'code']),
+            # Для чистки просроченных записей (delete_expired_codes)
+            models.Index(fields=['created_at'], name='smsverification_created_idx'),
         ]
 
 
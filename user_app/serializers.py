@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from kdmMarket.images import ImageSrcsetField
 from .models import User, SMSVerification
 
 
@@ -8,6 +9,7 @@ class UserSerializer(serializers.ModelSerializer):
         required=True,
         error_messages={'required': 'Необходимо указать email.'}
     )
+    image_srcset = ImageSrcsetField(source='image_variants')
 
     class Meta:
         model = User
@@ -18,6 +20,7 @@ class UserSerializer(serializers.ModelSerializer):
             'is_active',
             'is_staff',
             'image',
+            'image_srcset',
         ]
 
     def validate_email_exists(self, value):
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from user_app.models import SMSVerification
+
+
+def delete_expired_codes(chunk_size=5000, retention=None, pause=0.0):
+    """
+    Удаляет записи SMSVerification старше retention диапазонами первичного ключа.
+    Граница ищется по индексу created_at, каждый диапазон - отдельный короткий DELETE,
+    поэтому блокировки не держатся долго.
+    """
+    retention = retention or settings.SMS_VERIFICATION_RETENTION
+    cutoff = timezone.now() - retention
+    started = time.perf_counter()
+    stats = {'deleted': 0, 'chunks': 0}
+
+    expired = SMSVerification.objects.filter(created_at__lt=cutoff)
+    # Границы по pk, а не по created_at: время записи берется из события и не обязано расти вместе с pk
+    bounds = expired.aggregate(first_pk=Min('pk'), last_pk=Max('pk'))
+    first_pk, last_pk = bounds['first_pk'], bounds['last_pk']
+    if last_pk is not None:
+        for low in range(first_pk, last_pk + 1, chunk_size):
+            deleted, _ = expired.filter(pk__gte=low, pk__lt=low + chunk_size).delete()
+            stats['deleted'] += deleted
+            stats['chunks'] += 1
+            if pause:
+                time.sleep(pause)
+
+    stats['duration_s'] = round(time.perf_counter() - started, 3)
+    stats['rows_per_s'] = round(stats['deleted'] / stats['duration_s'], 1) if stats['duration_s'] else None
+    return stats
@@ -1,9 +1,21 @@
+from django.conf import settings
 
+from kdmMarket.ratelimit import RateLimitRule, RedisSlidingWindowThrottle
 
-def is_code_limited(email):
-    pass
 
+def verification_code_rules(email, ip=None):
+    """Правила из VERIFICATION_CODE_RATE_LIMITS: (область, лимит, окно в секундах)"""
+    idents = {'email': (email or '').strip().lower(), 'ip': ip, 'global': 'all'}
+    rules = []
+    for scope, limit, window in settings.VERIFICATION_CODE_RATE_LIMITS:
+        ident = idents.get(scope)
+        if ident:
+            rules.append(RateLimitRule(f'rl_code_{scope}_{ident}_{window}', limit, window))
+    return rules
 
 
-def set_code_limited(email):
-    pass
\ No newline at end of file
+class VerificationCodeThrottle(RedisSlidingWindowThrottle):
+    """Лимит отправки кодов подтверждения: по email, по IP и общий"""
+
+    def get_rules(self, request, view):
+        return verification_code_rules(request.data.get('email'), self.get_ident(request))
@@ -0,0 +1,167 @@
+import json
+import logging
+import smtplib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django_redis import get_redis_connection
+
+from kdmMarket.redis_queue import drain_lock, run_script
+
+logger = logging.getLogger(__name__)
+
+OUTBOX = 'email_outbox'
+RETRY_QUEUE = 'email_outbox_retry'
+# Взятая в работу пачка: остается здесь, пока письмо не отправлено или не ушло на повтор,
+# поэтому пачка воркера, убитого по time limit, дошлется следующим запуском
+PROCESSING = 'email_outbox_processing'
+DRAIN_LOCK = 'email_outbox_lock'
+DEAD_LETTER = 'email_outbox_dead'
+METRICS = 'email_metrics'
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 5
+# Через сколько секунд простоя проверять соединение NOOP перед отправкой
+IDLE_CHECK = 30
+
+# KEYS: отложенные повторы, очередь; ARGV: текущее время. Перенос одним скриптом - письмо не попадет в очередь дважды
+RELEASE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, message in ipairs(due) do
+    redis.call('ZREM', KEYS[1], message)
+    redis.call('RPUSH', KEYS[2], message)
+end
+return #due
+"""
+
+# KEYS: очередь, список в работе; ARGV: размер пачки. Перекладывает пачку из очереди в работу атомарно
+TAKE_SCRIPT = """
+local batch = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #batch > 0 then
+    redis.call('LTRIM', KEYS[1], #batch, -1)
+    redis.call('RPUSH', KEYS[2], unpack(batch))
+end
+return batch
+"""
+
+# Соединение живет все время жизни процесса воркера и переиспользуется между пачками
+_connection = None
+_last_used = 0.0
+
+
+def build_email(to, subject, body):
+    return json.dumps({'id': uuid.uuid4().hex, 'to': to, 'subject': subject, 'body': body, 'attempts': 0})
+
+
+def get_smtp_connection():
+    global _connection, _last_used
+    if _connection is not None and time.monotonic() - _last_used > IDLE_CHECK:
+        try:
+            if _connection.connection.noop()[0] != 250:
+                raise smtplib.SMTPServerDisconnected('NOOP failed')
+        except (smtplib.SMTPException, OSError, AttributeError):
+            close_smtp_connection()
+    if _connection is None:
+        connection = get_connection(fail_silently=False)
+        connection.open()
+        _connection = connection
+    _last_used = time.monotonic()
+    return _connection
+
+
+def close_smtp_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+        _connection = None
+
+
+def send_one(message):
+    email = EmailMessage(message['subject'], message['body'], settings.DEFAULT_FROM_EMAIL, [message['to']])
+    try:
+        get_smtp_connection().send_messages([email])
+    except (smtplib.SMTPServerDisconnected, ConnectionError):
+        # Сервер закрыл простаивающее соединение - переподключаемся один раз
+        close_smtp_connection()
+        get_smtp_connection().send_messages([email])
+
+
+def release_due_retries(redis):
+    """Переносит письма, у которых истекла задержка повтора, обратно в очередь"""
+    return run_script(redis, RELEASE_SCRIPT, [RETRY_QUEUE, OUTBOX], [time.time()])
+
+
+def take_batch(redis, batch_size):
+    """Пачка для отправки: сначала недосланное прошлым запуском, затем новая из очереди"""
+    return redis.lrange(PROCESSING, 0, -1) or run_script(redis, TAKE_SCRIPT, [OUTBOX, PROCESSING], [batch_size])
+
+
+def schedule_retry(redis, message, error):
+    message['attempts'] += 1
+    message['error'] = str(error)
+    # Адрес отклонен сервером - повтор не поможет
+    if message['attempts'] >= MAX_ATTEMPTS or isinstance(error, smtplib.SMTPRecipientsRefused):
+        redis.rpush(DEAD_LETTER, json.dumps(message))
+        return 'dead'
+    delay = RETRY_BASE_DELAY * 2 ** (message['attempts'] - 1)
+    redis.zadd(RETRY_QUEUE, {json.dumps(message): time.time() + delay})
+    return 'retried'
+
+
+def drain_outbox(batch_size=BATCH_SIZE, max_batches=10):
+    """
+    Отправляет письма из очереди пачками через одно SMTP-соединение процесса.
+    Неудачные письма уходят на повтор с экспоненциальной задержкой, после MAX_ATTEMPTS - в dead letter.
+    """
+    stats = {'sent': 0, 'failed': 0, 'retried': 0, 'dead': 0, 'latency_ms': 0}
+    redis = get_redis_connection('default')
+    # Список в работе у очереди один - второй воркер разослал бы ту же пачку повторно
+    with drain_lock(DRAIN_LOCK, settings.CELERY_TASK_TIME_LIMIT) as acquired:
+        if not acquired:
+            return stats
+        release_due_retries(redis)
+        for _ in range(max_batches):
+            batch = take_batch(redis, batch_size)
+            if not batch:
+                break
+            for raw in batch:
+                message = json.loads(raw)
+                started = time.perf_counter()
+                try:
+                    send_one(message)
+                except Exception as e:
+                    logger.warning(f"Не удалось отправить письмо {message['id']} на {message['to']}: {e}")
+                    stats['failed'] += 1
+                    stats[schedule_retry(redis, message, e)] += 1
+                    # Ответ сервера об ошибке письма соединение не ломает, сетевая ошибка - ломает
+                    if isinstance(e, OSError) and not isinstance(e, smtplib.SMTPResponseException):
+                        close_smtp_connection()
+                else:
+                    stats['sent'] += 1
+                    stats['latency_ms'] += int((time.perf_counter() - started) * 1000)
+                redis.lrem(PROCESSING, 1, raw)
+
+    if any(stats.values()):
+        pipe = redis.pipeline()
+        for name, value in stats.items():
+            if value:
+                pipe.hincrby(METRICS, name, value)
+        pipe.execute()
+    return stats
+
+
+def get_email_metrics():
+    """Счетчики отправки и размеры очередей; latency_avg_ms - средняя задержка отправки одного письма"""
+    redis = get_redis_connection('default')
+    metrics = {key.decode(): int(value) for key, value in redis.hgetall(METRICS).items()}
+    metrics['latency_avg_ms'] = round(metrics.get('latency_ms', 0) / metrics['sent'], 2) if metrics.get('sent') else None
+    metrics['queued'] = redis.llen(OUTBOX)
+    metrics['processing'] = redis.llen(PROCESSING)
+    metrics['retry_queued'] = redis.zcard(RETRY_QUEUE)
+    metrics['dead_queued'] = redis.llen(DEAD_LETTER)
+    return metrics
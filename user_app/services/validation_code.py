@@ -1,4 +1,116 @@
+import json
+import logging
+
+from django.db import transaction
+from django.db.models import Q, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from kdmMarket.redis_queue import drain_queue, run_script
+from user_app.models import SMSVerification
+from user_app.services.mailer import OUTBOX, build_email
+
+logger = logging.getLogger(__name__)
+
+CODE_TIMEOUT = 5 * 60
+MAX_ATTEMPTS = 5
+AUDIT_QUEUE = 'sms_verification_audit'
+AUDIT_BATCH_SIZE = 1000
+AUDIT_LOCK = 'sms_verification_audit_lock'
+
+# KEYS: код, счетчик попыток; ARGV: введенный код, лимит попыток.
+# 1 - код верный (ключи удаляются), 0 - неверный или истек, -1 - попытки исчерпаны (код сгорает).
+VERIFY_SCRIPT = """
+local code = redis.call('GET', KEYS[1])
+if not code then
+    return 0
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 1
+end
+local attempts = redis.call('INCR', KEYS[2])
+if attempts == 1 then
+    redis.call('PEXPIRE', KEYS[2], math.max(redis.call('PTTL', KEYS[1]), 1))
+end
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return -1
+end
+return 0
+"""
+
+
+def code_key(email):
+    return f'sms_code_{email}'
+
+
+def attempts_key(email):
+    return f'sms_code_attempts_{email}'
+
+
+def issue_code(email, code):
+    """
+    Одна транзакция MULTI/EXEC: код с TTL, сброс счетчика попыток,
+    событие sent для журнала и письмо в очередь отправки.
+    """
+    pipe = get_redis_connection('default').pipeline(transaction=True)
+    pipe.set(code_key(email), code, ex=CODE_TIMEOUT)
+    pipe.delete(attempts_key(email))
+    pipe.rpush(AUDIT_QUEUE, code_event(email, code, 'sent'))
+    pipe.rpush(OUTBOX, build_email(email, f'Код подтверждения для {email}', f'Ваш код подтверждения: {code}'))
+    pipe.execute()
 
 
 def code_valid(email, code):
-    pass
\ No newline at end of file
+    """Проверка кода только по Redis: атомарно сверяет и удаляет код, считает неудачные попытки"""
+    try:
+        redis = get_redis_connection('default')
+        result = run_script(redis, VERIFY_SCRIPT, [code_key(email), attempts_key(email)], [str(code), MAX_ATTEMPTS])
+    except Exception as e:
+        logger.warning(f'Не удалось проверить код для {email}: {e}')
+        return False
+    if result == -1:
+        logger.info(f'Исчерпаны попытки ввода кода для {email}')
+    return result == 1
+
+
+def code_event(email, code, event):
+    return json.dumps({'email': email, 'code': code, 'event': event, 'at': timezone.now().isoformat()})
+
+
+def record_code_event(email, code, event):
+    """Событие для журнала SMSVerification (sent/used), в БД пишется пачками задачей flush"""
+    try:
+        get_redis_connection('default').rpush(AUDIT_QUEUE, code_event(email, code, event))
+    except Exception as e:
+        logger.warning(f'Не удалось записать событие {event} для {email}: {e}')
+
+
+def flush_code_events(batch_size=AUDIT_BATCH_SIZE):
+    """Переносит события из Redis в SMSVerification: bulk_create для sent, один UPDATE на пачку для used"""
+    return drain_queue(AUDIT_QUEUE, AUDIT_LOCK, save_code_events, batch_size) or 0
+
+
+def save_code_events(raw_events):
+    """
+    created_at берется из времени события, а не записи пачки. Использованной помечается только
+    последняя неиспользованная запись с этим кодом - повторно выданный тот же код остается в журнале как был.
+    """
+    events = [json.loads(raw) for raw in raw_events]
+    with transaction.atomic():
+        SMSVerification.objects.bulk_create([
+            SMSVerification(email=event['email'], code=event['code'], created_at=parse_datetime(event['at']))
+            for event in events if event['event'] == 'sent'
+        ])
+        used = Q()
+        for event in events:
+            if event['event'] == 'used':
+                newest = (
+                    SMSVerification.objects.filter(email=event['email'], code=event['code'], is_used=False)
+                    .order_by('-created_at', '-pk').values('pk')[:1]
+                )
+                used |= Q(pk=Subquery(newest))
+        if used:
+            SMSVerification.objects.filter(used).update(is_used=True)
@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from kdmMarket.images import remember_image_names, image_saved, image_deleted
+from .authentication import invalidate_user_cache
+from .models import User
+
+
+@receiver(post_init, sender=User)
+def remember_token_version(sender, instance, **kwargs):
+    # Через __dict__, чтобы не подгружать отложенное поле (.only()/.defer())
+    instance._original_token_version = instance.__dict__.get('token_version')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Сбрасываем и старую, и новую версию: после revoke_tokens старые токены не должны пройти по кэшу.
+    # Повторяем после коммита: иначе параллельный запрос успеет закэшировать еще не измененного пользователя
+    versions = (instance._original_token_version, instance.token_version)
+    invalidate_user_cache(instance.pk, *versions)
+    transaction.on_commit(lambda: invalidate_user_cache(instance.pk, *versions))
+    instance._original_token_version = instance.token_version
+
+
+post_init.connect(remember_image_names, sender=User, dispatch_uid='remember_images_User')
+post_save.connect(image_saved, sender=User, dispatch_uid='image_saved_User')
+pre_delete.connect(image_deleted, sender=User, dispatch_uid='image_deleted_User')
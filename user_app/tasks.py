@@ -1,10 +1,11 @@
 import random
 import logging
 from celery import shared_task
-from django.core.cache import cache
-from .models import SMSVerification
+from celery.signals import worker_process_shutdown
+from .services.validation_code import issue_code, flush_code_events
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from .services.mailer import drain_outbox, close_smtp_connection
+from .services.cleanup_codes import delete_expired_codes
 
 
 User = get_user_model()
@@ -13,38 +14,39 @@ User = get_user_model()
 logger = logging.getLogger(__name__)
 
 @shared_task
-def send_code(email, code):
-    try:
-        send_mail(
-            f'Код подтверждения для {email}',
-            f'Ваш код подтверждения: {code}',
-            'asadbeklocation@yandex.ru',
-            [email]
-        )
-    except Exception as e:
-        print('Произошла ошибка:', e)
+def drain_email_outbox():
+    stats = drain_outbox()
+    if stats['sent'] or stats['failed']:
+        logger.info(f"Письма: отправлено {stats['sent']}, ошибок {stats['failed']}, "
+                    f"на повтор {stats['retried']}, в dead letter {stats['dead']}")
+    return stats
 
 
-@shared_task
-def save_code_in_db(email, code=None):
-    sms_verification, created = SMSVerification.objects.get_or_create(
-        email=email,
-        code=code
-    )
-
-    if created:
-        logger.info(f"Создана запись в БД для {email}")
-    else:
-        logger.info(f"Запись для {email} обновлена с новым кодом")
+@worker_process_shutdown.connect
+def close_email_connection(**kwargs):
+    close_smtp_connection()
 
 
 @shared_task
 def generate_and_save_and_send_code(email):
     code = f"{random.randint(1000, 9999)}"
 
-    send_code.delay(email, code)
-    cache.set(f'sms_code_{email}', code, timeout=300)
-    save_code_in_db.delay(email, code)
+    # Код, запись журнала и письмо - одним MULTI в Redis, без дополнительных задач в брокере
+    issue_code(email, code)
     logger.info(f"Код {code} сгенерирован и отправлен для {email}.")
     return code  # Возвращаем сгенерированный код
 
+
+@shared_task
+def flush_verification_audit():
+    total = flush_code_events()
+    if total:
+        logger.info(f"В журнал SMSVerification записано событий: {total}")
+    return total
+
+
+@shared_task
+def delete_expired_verification_codes():
+    stats = delete_expired_codes()
+    logger.info(f"Удалено кодов подтверждения: {stats['deleted']} ({stats['rows_per_s']} строк/с)")
+    return stats
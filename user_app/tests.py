@@ -1,4 +1,252 @@
-from django.test import TestCase
+from unittest import skipUnless
 
+import json
+import time
+from unittest.mock import patch
+from datetime import datetime, timedelta, timezone as dt_timezone
 
+from celery import Task
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
 
+from kdmMarket.testing import FAKE_REDIS_CACHES, LOCMEM_CACHES, fakeredis
+from user_app import authentication
+from user_app.authentication import VersionedRefreshToken, user_cache_key
+from user_app.models import User, SMSVerification
+from user_app.services.cleanup_codes import delete_expired_codes
+from user_app.services.mailer import (
+    OUTBOX, PROCESSING, RETRY_QUEUE, build_email, close_smtp_connection, drain_outbox, release_due_retries,
+)
+from user_app.services.validation_code import (
+    AUDIT_LOCK, AUDIT_QUEUE, attempts_key, code_key, code_valid, flush_code_events, issue_code, record_code_event,
+)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CachedUserInvalidationTests(TestCase):
+    """Кэш пользователя сбрасывается после коммита изменений"""
+
+    def setUp(self):
+        cache.clear()
+        authentication._local_cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com')
+        self.client = APIClient()
+        token = VersionedRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get('/api/order/').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.client.get('/api/order/').status_code, 401)
+
+    def test_cache_filled_before_commit_is_dropped_after_commit(self):
+        key = user_cache_key(self.user.pk, self.user.token_version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # Параллельный запрос до коммита кладет в кэш старого пользователя
+            cache.set(key, User.objects.get(pk=self.user.pk))
+
+        self.assertIsNone(cache.get(key))
+        authentication._local_cache.clear()
+        self.assertEqual(self.client.get('/api/order/').status_code, 401)
+
+    def test_revoked_tokens_are_rejected(self):
+        self.assertEqual(self.client.get('/api/order/').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.revoke_tokens()
+
+        self.assertEqual(self.client.get('/api/order/').status_code, 401)
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES)
+class CodeEventsFlushTests(TestCase):
+
+    def setUp(self):
+        get_redis_connection('default').flushdb()
+
+    def test_flush_writes_events(self):
+        record_code_event('buyer@example.com', '1234', 'sent')
+        record_code_event('buyer@example.com', '1234', 'used')
+
+        self.assertEqual(flush_code_events(), 2)
+
+        self.assertTrue(SMSVerification.objects.get(email='buyer@example.com').is_used)
+        self.assertEqual(get_redis_connection('default').llen(AUDIT_QUEUE), 0)
+
+    def test_flush_keeps_event_time(self):
+        redis = get_redis_connection('default')
+        redis.rpush(AUDIT_QUEUE, json.dumps({
+            'email': 'buyer@example.com', 'code': '1234', 'event': 'sent', 'at': '2026-01-01T10:00:00+00:00',
+        }))
+
+        flush_code_events()
+
+        self.assertEqual(
+            SMSVerification.objects.get().created_at, datetime(2026, 1, 1, 10, tzinfo=dt_timezone.utc),
+        )
+
+    def test_used_marks_only_newest_row(self):
+        older = SMSVerification.objects.create(
+            email='buyer@example.com', code='1234', created_at=timezone.now() - timedelta(hours=1),
+        )
+        record_code_event('buyer@example.com', '1234', 'sent')
+        record_code_event('buyer@example.com', '1234', 'used')
+
+        flush_code_events()
+
+        older.refresh_from_db()
+        self.assertFalse(older.is_used)
+        self.assertTrue(SMSVerification.objects.exclude(pk=older.pk).get().is_used)
+
+    def test_flush_skipped_while_locked(self):
+        record_code_event('buyer@example.com', '1234', 'sent')
+        cache.add(AUDIT_LOCK, 1)
+
+        self.assertEqual(flush_code_events(), 0)
+
+        self.assertFalse(SMSVerification.objects.exists())
+        self.assertEqual(get_redis_connection('default').llen(AUDIT_QUEUE), 1)
+
+
+class ExpiredCodesCleanupTests(TestCase):
+    """Чистка журнала кодов диапазонами pk"""
+
+    def create(self, age):
+        return SMSVerification.objects.create(email='buyer@example.com', code='1234', created_at=timezone.now() - age)
+
+    def test_every_expired_row_is_deleted_in_chunks(self):
+        expired = [self.create(timedelta(days=2, minutes=i)) for i in range(7)]
+        fresh = self.create(timedelta(minutes=5))
+        # Событие, записанное позже остальных, но с более старым временем
+        expired.append(self.create(timedelta(days=3)))
+
+        stats = delete_expired_codes(chunk_size=3, retention=timedelta(days=1))
+
+        self.assertEqual(stats['deleted'], len(expired))
+        self.assertEqual(stats['chunks'], 3)
+        self.assertEqual(list(SMSVerification.objects.values_list('pk', flat=True)), [fresh.pk])
+
+    def test_nothing_expired(self):
+        self.create(timedelta(minutes=5))
+
+        self.assertEqual(delete_expired_codes(retention=timedelta(days=1))['chunks'], 0)
+        self.assertEqual(SMSVerification.objects.count(), 1)
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES)
+class IssueCodeTests(TestCase):
+    """Выдача кода - одна задача в брокере и одна транзакция в Redis"""
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.redis.flushdb()
+
+    def test_code_request_publishes_one_task(self):
+        with patch.object(Task, 'apply_async', autospec=True, side_effect=Task.apply_async) as apply_async:
+            response = APIClient().post('/api/user-sign/', {'email': 'buyer@example.com'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(self.redis.llen(OUTBOX), 1)
+        self.assertEqual(self.redis.llen(AUDIT_QUEUE), 1)
+        self.assertIsNotNone(self.redis.get(code_key('buyer@example.com')))
+
+    def test_issue_code_resets_attempts(self):
+        self.redis.set(attempts_key('buyer@example.com'), 4)
+
+        issue_code('buyer@example.com', '1234')
+
+        self.assertIsNone(self.redis.get(attempts_key('buyer@example.com')))
+        self.assertEqual(json.loads(self.redis.lindex(OUTBOX, 0))['to'], 'buyer@example.com')
+        self.assertTrue(code_valid('buyer@example.com', '1234'))
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTests(TestCase):
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.redis.flushdb()
+        close_smtp_connection()
+
+    def tearDown(self):
+        close_smtp_connection()
+
+    def test_drain_sends_and_clears_processing(self):
+        self.redis.rpush(
+            OUTBOX, build_email('a@example.com', 'Тема', 'Текст'), build_email('b@example.com', 'Тема', 'Текст'),
+        )
+
+        stats = drain_outbox()
+
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.redis.llen(OUTBOX), 0)
+        self.assertEqual(self.redis.llen(PROCESSING), 0)
+
+    def test_batch_of_killed_worker_is_sent_next_run(self):
+        self.redis.rpush(PROCESSING, build_email('a@example.com', 'Тема', 'Текст'))
+
+        self.assertEqual(drain_outbox()['sent'], 1)
+
+        self.assertEqual(mail.outbox[0].to, ['a@example.com'])
+        self.assertEqual(self.redis.llen(PROCESSING), 0)
+
+    def test_due_retry_is_released_once(self):
+        message = json.loads(build_email('a@example.com', 'Тема', 'Текст'))
+        self.redis.zadd(RETRY_QUEUE, {json.dumps(message): time.time() - 1})
+
+        self.assertEqual(release_due_retries(self.redis), 1)
+        self.assertEqual(release_due_retries(self.redis), 0)
+
+        self.assertEqual(self.redis.llen(OUTBOX), 1)
+        self.assertEqual(self.redis.zcard(RETRY_QUEUE), 0)
+
+
+@skipUnless(fakeredis, 'нужен fakeredis')
+@override_settings(CACHES=FAKE_REDIS_CACHES, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class VerificationCodeRateLimitTests(TestCase):
+
+    def setUp(self):
+        get_redis_connection('default').flushdb()
+        self.client = APIClient()
+
+    def request_code(self, email):
+        return self.client.post('/api/user-sign/', {'email': email}, format='json')
+
+    def test_second_code_within_minute_is_throttled(self):
+        self.assertEqual(self.request_code('buyer@example.com').status_code, 201)
+
+        response = self.request_code('Buyer@Example.com ')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(VERIFICATION_CODE_RATE_LIMITS=[('ip', 1, 60)])
+    def test_spoofed_forwarded_for_does_not_bypass_ip_limit(self):
+        with patch('rest_framework.settings.api_settings.NUM_PROXIES', 1):
+            self.client.post('/api/user-sign/', {'email': 'a@example.com'}, format='json',
+                             HTTP_X_FORWARDED_FOR='1.1.1.1, 203.0.113.7')
+            response = self.client.post('/api/user-sign/', {'email': 'b@example.com'}, format='json',
+                                        HTTP_X_FORWARDED_FOR='2.2.2.2, 203.0.113.7')
+
+        self.assertEqual(response.status_code, 429)
+
+    def test_other_email_is_not_throttled(self):
+        self.request_code('buyer@example.com')
+
+        self.assertEqual(self.request_code('other@example.com').status_code, 201)
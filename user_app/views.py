@@ -1,24 +1,23 @@
 from http.client import responses
 from importlib.metadata import requires
 
-from django.core.cache import cache
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
 from django.template.context_processors import request
 from drf_spectacular.types import OpenApiTypes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.utils.representation import serializer_repr
-from rest_framework_simplejwt.tokens import RefreshToken
 from yaml import serialize
 
-from .services.limit_code import set_code_limited, is_code_limited
+from carts_app.services.guest_cart import merge_guest_cart
+from .authentication import VersionedRefreshToken
+from .services.limit_code import VerificationCodeThrottle
 from .serializers import SMSVerificationSerializer
 from .models import User, SMSVerification
 from .serializers import UserSerializer
 from rest_framework import viewsets
 from rest_framework import status
-from .services.validation_code import code_valid
+from .services.validation_code import code_valid, record_code_event
 from .tasks import generate_and_save_and_send_code
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample, OpenApiResponse
 
@@ -52,6 +51,7 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiPara
         responses={
             201: OpenApiExample('Код отправлен', value={'message': 'Код отправлен'}),
             400: OpenApiExample('Ошибка валидации', value={'error': 'Некорректные данные'}),
+            429: OpenApiExample('Превышен лимит', value={'detail': 'Запрос был проигнорирован.'}),
         }
     ),
     update=extend_schema(
@@ -88,6 +88,12 @@ class UserApiView(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     filterset_fields = ['id', 'email', 'username']
 
+    def get_throttles(self):
+        # Лимит по email/IP/общий проверяется до отправки кода одним вызовом Redis
+        if self.action == 'create':
+            return [VerificationCodeThrottle()]
+        return super().get_throttles()
+
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -95,11 +101,7 @@ class UserApiView(viewsets.ModelViewSet):
 
         email = serializer.validated_data.get('email')
 
-        if is_code_limited(email):
-            return Response({'error': 'Превышен лимит отправки кодов.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
-
         generate_and_save_and_send_code.delay(email)
-        set_code_limited(email)
 
         return Response({'message': 'Код отправлен.'}, status=status.HTTP_201_CREATED)
 
@@ -212,39 +214,32 @@ class SMSVerificationApiView(viewsets.ModelViewSet):
         if not code:
             return Response({'error': 'Необходим код подтверждения.'}, status.HTTP_400_BAD_REQUEST)
 
-        # Проверяем код из кэша
+        # Код проверяется и гасится в Redis, журнал SMSVerification пишется фоновой задачей
         if not code_valid(email, code):
             return Response({'error': 'Код не валиден или истек.'}, status.HTTP_400_BAD_REQUEST)
+        record_code_event(email, code, 'used')
 
-        try:
-            # Проверяем запись SMS
-            verification = SMSVerification.objects.get(email=email, code=code, is_used=False)
-            verification.is_used = True
-            verification.save()
-
-            # Проверяем или создаем пользователя
-            user, created = User.objects.get_or_create(email=email)
-
-            cache.delete(f'sms_code_{email}')
+        # Проверяем или создаем пользователя
+        user, created = User.objects.get_or_create(email=email)
 
-            refresh = RefreshToken.for_user(user)
+        # Корзина, собранная до входа, переезжает в корзину пользователя
+        merge_guest_cart(request.session.session_key, user)
 
-            # Генерация токенов
-            if created:
-                return Response({
-                    'message': 'Успешный вход!, хотите дополнить профиль?',
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                }, status.HTTP_201_CREATED)
+        refresh = VersionedRefreshToken.for_user(user)
 
+        # Генерация токенов
+        if created:
             return Response({
-                'message': 'Успешный вход!',
+                'message': 'Успешный вход!, хотите дополнить профиль?',
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
-            }, status.HTTP_200_OK)
+            }, status.HTTP_201_CREATED)
 
-        except ObjectDoesNotExist:
-            return Response({'error': 'Код не найден или уже использован.'}, status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'message': 'Успешный вход!',
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }, status.HTTP_200_OK)
 
 #Документация (swagger-drd-spectecular)API->UserProfileApiView(0:18)
 @extend_schema_view(